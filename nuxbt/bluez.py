@@ -4,9 +4,12 @@ import os
 import time
 import socket
 import struct
+import fcntl
+import errno
 import logging
 from shutil import which
 import random
+import threading
 from pathlib import Path
 
 import dbus
@@ -17,6 +20,37 @@ BLUEZ_OBJECT_PATH = "/org/bluez"
 ADAPTER_INTERFACE = SERVICE_NAME + ".Adapter1"
 PROFILEMANAGER_INTERFACE = SERVICE_NAME + ".ProfileManager1"
 DEVICE_INTERFACE = SERVICE_NAME + ".Device1"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+OBJECT_MANAGER_INTERFACE = "org.freedesktop.DBus.ObjectManager"
+
+# HCI packet types, events and ioctls, see hci_command
+HCI_COMMAND_PKT = 0x01
+HCI_EVENT_PKT = 0x04
+EVT_CMD_COMPLETE = 0x0E
+EVT_CMD_STATUS = 0x0F
+SOL_HCI = getattr(socket, "SOL_HCI", 0)
+HCI_FILTER = getattr(socket, "HCI_FILTER", 2)
+HCIDEVUP = 0x400448C9
+HCIDEVDOWN = 0x400448CA
+HCI_TIMEOUT = 2
+
+# HCI commands as (OGF, OCF) pairs
+HCI_RESET = (0x03, 0x0003)
+HCI_READ_CLASS_OF_DEVICE = (0x03, 0x0023)
+HCI_WRITE_CLASS_OF_DEVICE = (0x03, 0x0024)
+# Vendor-specific BD_ADDR write, supported by most
+# Ericsson/ST derived and Broadcom/CSR compatible controllers
+HCI_VENDOR_WRITE_BD_ADDR = (0x3F, 0x0001)
+
+# The signal bus connection of this process, see get_signal_bus
+_signal_bus = None
+_signal_bus_pid = None
+_signal_bus_lock = threading.Lock()
+
+# The signal-driven device index of this process, see get_device_index
+_device_index = None
+_device_index_pid = None
+_device_index_lock = threading.Lock()
 
 
 def find_object_path(bus, service_name, interface_name, object_name=None):
@@ -95,6 +129,267 @@ def find_objects(bus, service_name, interface_name):
     return paths
 
 
+def get_signal_bus():
+    """Gets a private system bus connection whose signals are dispatched
+    by a GLib main loop running in a daemon thread. Controller processes
+    don't run a main loop of their own, so this connection is used to
+    receive BlueZ signals (PropertiesChanged, InterfacesAdded, etc.)
+    without polling.
+
+    The connection is created once per process, on first use, and must
+    only be requested by the process that consumes its signals. The main
+    loop thread owns GLib's default main context, which can't be used
+    again in a forked child, so children of a process with a signal bus
+    don't get one.
+
+    :return: The signal bus connection or None, if GLib is unavailable
+    or the process was forked from one with a signal bus
+    :rtype: dbus.bus.BusConnection
+    """
+
+    global _signal_bus, _signal_bus_pid
+
+    with _signal_bus_lock:
+        if _signal_bus is not None:
+            if _signal_bus_pid == os.getpid():
+                return _signal_bus
+            return None
+
+        try:
+            from gi.repository import GLib
+            import dbus.mainloop.glib
+        except ImportError:
+            return None
+
+        dbus.mainloop.glib.threads_init()
+        _signal_bus = dbus.SystemBus(
+            mainloop=dbus.mainloop.glib.DBusGMainLoop(),
+            private=True)
+        _signal_bus_pid = os.getpid()
+
+        loop = threading.Thread(target=GLib.MainLoop().run, daemon=True)
+        loop.start()
+
+        return _signal_bus
+
+
+class DeviceIndex():
+    """An index of the Bluetooth devices known to BlueZ, keyed by
+    object path, address and alias. Addresses and aliases are
+    uppercased, as BlueZ usually converts aliases to uppercase.
+
+    :param devices: The device properties keyed by object path,
+    defaults to None
+    :type devices: dict, optional
+    """
+
+    def __init__(self, devices=None):
+
+        self.lock = threading.RLock()
+        self.load(devices or {})
+
+    def load(self, devices):
+        """Replaces the indexed devices.
+
+        :param devices: The device properties keyed by object path
+        :type devices: dict
+        """
+
+        with self.lock:
+            self.devices = {}
+            self.by_address = {}
+            self.by_alias = {}
+            for path, properties in devices.items():
+                self.add(path, properties)
+
+    def add(self, path, properties):
+        """Adds a device to the index or replaces its properties.
+
+        :param path: The D-Bus object path of the device
+        :type path: string
+        :param properties: The device's properties
+        :type properties: dict
+        """
+
+        path = str(path)
+        with self.lock:
+            self.remove(path)
+            properties = dict(properties)
+            self.devices[path] = properties
+            if "Address" in properties:
+                self.by_address[properties["Address"].upper()] = path
+            if "Alias" in properties:
+                alias = properties["Alias"].upper()
+                self.by_alias.setdefault(alias, []).append(path)
+
+    def update(self, path, changed, invalidated=()):
+        """Updates the properties of an indexed device.
+
+        :param path: The D-Bus object path of the device
+        :type path: string
+        :param changed: The changed properties and their new values
+        :type changed: dict
+        :param invalidated: The names of properties without a known value,
+        defaults to ()
+        :type invalidated: iterable, optional
+        """
+
+        path = str(path)
+        with self.lock:
+            properties = dict(self.devices.get(path, {}))
+            properties.update(changed)
+            for name in invalidated:
+                properties.pop(name, None)
+            self.add(path, properties)
+
+    def remove(self, path):
+        """Removes a device from the index.
+
+        :param path: The D-Bus object path of the device
+        :type path: string
+        """
+
+        path = str(path)
+        with self.lock:
+            properties = self.devices.pop(path, None)
+            if properties is None:
+                return
+            address = properties.get("Address", "").upper()
+            if self.by_address.get(address) == path:
+                del self.by_address[address]
+            alias = properties.get("Alias", "").upper()
+            paths = self.by_alias.get(alias, [])
+            if path in paths:
+                paths.remove(path)
+                if not paths:
+                    del self.by_alias[alias]
+
+    def find_by_address(self, address):
+        """Finds the object path of the device with an address.
+
+        :param address: The Bluetooth MAC address
+        :type address: string
+        :return: The path to the D-Bus object or None
+        :rtype: string or None
+        """
+
+        with self.lock:
+            return self.by_address.get(address.upper())
+
+    def find_by_alias(self, alias):
+        """Finds the object paths and addresses of devices with an alias.
+
+        :param alias: The device alias
+        :type alias: string
+        :return: The matching addresses and paths
+        :rtype: tuple of (list, list)
+        """
+
+        with self.lock:
+            paths = list(self.by_alias.get(alias.upper(), []))
+            addresses = [self.devices[path].get("Address", "").upper()
+                         for path in paths]
+        return addresses, paths
+
+
+def load_device_index(bus):
+    """Indexes the Bluetooth devices known to BlueZ with a single
+    GetManagedObjects call.
+
+    :param bus: A DBus object used to access the DBus.
+    :type bus: DBus
+    :return: The device index
+    :rtype: DeviceIndex
+    """
+
+    return DeviceIndex(_get_managed_devices(bus))
+
+
+def _get_managed_devices(bus):
+    manager = dbus.Interface(
+        bus.get_object(SERVICE_NAME, "/"),
+        OBJECT_MANAGER_INTERFACE)
+
+    devices = {}
+    for path, interfaces in manager.GetManagedObjects().items():
+        if DEVICE_INTERFACE in interfaces:
+            devices[str(path)] = interfaces[DEVICE_INTERFACE]
+
+    return devices
+
+
+def get_device_index():
+    """Gets a device index that is kept up to date with BlueZ's
+    InterfacesAdded, InterfacesRemoved and PropertiesChanged signals.
+    The index is loaded once per process, on first use, and is reloaded
+    if the BlueZ service restarts.
+
+    :return: The device index or None, if no signal bus is available
+    :rtype: DeviceIndex or None
+    """
+
+    global _device_index, _device_index_pid
+
+    with _device_index_lock:
+        if _device_index is not None and _device_index_pid == os.getpid():
+            return _device_index
+
+        bus = get_signal_bus()
+        if bus is None:
+            return None
+
+        index = DeviceIndex()
+
+        def on_interfaces_added(path, interfaces):
+            if DEVICE_INTERFACE in interfaces:
+                index.add(path, interfaces[DEVICE_INTERFACE])
+
+        def on_interfaces_removed(path, interfaces):
+            if DEVICE_INTERFACE in interfaces:
+                index.remove(path)
+
+        def on_properties_changed(interface, changed, invalidated, path=None):
+            # Only devices that have been added are tracked
+            with index.lock:
+                if str(path) in index.devices:
+                    index.update(path, changed, invalidated)
+
+        owner = [None]
+
+        def on_owner_changed(new_owner):
+            # BlueZ restarted, so all object paths are stale
+            if owner[0] is not None and new_owner != owner[0]:
+                index.load(_get_managed_devices(bus) if new_owner else {})
+            owner[0] = new_owner
+
+        bus.add_signal_receiver(
+            on_interfaces_added,
+            signal_name="InterfacesAdded",
+            dbus_interface=OBJECT_MANAGER_INTERFACE,
+            bus_name=SERVICE_NAME)
+        bus.add_signal_receiver(
+            on_interfaces_removed,
+            signal_name="InterfacesRemoved",
+            dbus_interface=OBJECT_MANAGER_INTERFACE,
+            bus_name=SERVICE_NAME)
+        bus.add_signal_receiver(
+            on_properties_changed,
+            signal_name="PropertiesChanged",
+            dbus_interface=PROPERTIES_INTERFACE,
+            bus_name=SERVICE_NAME,
+            arg0=DEVICE_INTERFACE,
+            path_keyword="path")
+        bus.watch_name_owner(SERVICE_NAME, on_owner_changed)
+
+        # Subscribing before loading ensures no change is missed
+        index.load(_get_managed_devices(bus))
+
+        _device_index = index
+        _device_index_pid = os.getpid()
+
+        return _device_index
+
+
 def get_bluez_service_path():
     """Finds the path to the bluetooth.service file."""
     service_path = None
@@ -352,6 +647,144 @@ def _run_command(command):
     return result
 
 
+def _hci_device_id(adapter_id):
+    return int(adapter_id.replace("hci", ""))
+
+
+def hci_command(adapter_id, ogf, ocf, data=b'', wait=True, timeout=HCI_TIMEOUT):
+    """Sends a raw HCI command to an adapter and, optionally, waits for
+    the controller to complete it.
+
+    :param adapter_id: The adapter's ID, eg: "hci0"
+    :type adapter_id: string
+    :param ogf: The command's opcode group field
+    :type ogf: int
+    :param ocf: The command's opcode command field
+    :type ocf: int
+    :param data: The command's parameters, defaults to b''
+    :type data: bytes, optional
+    :param wait: Whether to wait for the command to complete,
+    defaults to True
+    :type wait: bool, optional
+    :param timeout: How long to wait for completion, in seconds,
+    defaults to HCI_TIMEOUT
+    :type timeout: float, optional
+    :raises PermissionError: If raw HCI access isn't permitted
+    :raises TimeoutError: If the command doesn't complete in time
+    :raises Exception: If the controller reports a failure status
+    :return: The command's return parameters, without the status
+    :rtype: bytes or None
+    """
+
+    opcode = (ogf << 10) | ocf
+    packet = struct.pack("<BHB", HCI_COMMAND_PKT, opcode, len(data)) + data
+
+    sock = socket.socket(
+        socket.AF_BLUETOOTH, socket.SOCK_RAW, socket.BTPROTO_HCI)
+    try:
+        sock.bind((_hci_device_id(adapter_id),))
+        if wait:
+            # Only receive completion events for this command
+            event_mask = (1 << EVT_CMD_COMPLETE) | (1 << EVT_CMD_STATUS)
+            sock.setsockopt(SOL_HCI, HCI_FILTER, struct.pack(
+                "<IIIH", 1 << HCI_EVENT_PKT, event_mask, 0, opcode))
+        sock.send(packet)
+        if not wait:
+            return None
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise socket.timeout()
+                sock.settimeout(remaining)
+                event = sock.recv(260)
+            except socket.timeout:
+                raise TimeoutError(
+                    f"HCI command 0x{opcode:04x} timed out on {adapter_id}")
+
+            status, params = _parse_hci_completion(event, opcode)
+            if status is None:
+                continue
+            if status != 0:
+                raise Exception(
+                    f"HCI command 0x{opcode:04x} failed on {adapter_id} " +
+                    f"with status 0x{status:02x}")
+            return params
+    finally:
+        sock.close()
+
+
+def _parse_hci_completion(event, opcode):
+    """Parses a Command Complete or Command Status event.
+
+    :return: The status and return parameters, or (None, None) if the
+    event doesn't belong to the command
+    :rtype: tuple
+    """
+
+    if len(event) < 3 or event[0] != HCI_EVENT_PKT:
+        return None, None
+
+    if event[1] == EVT_CMD_COMPLETE and len(event) >= 7:
+        # Number of allowed packets, opcode, then the return parameters
+        if struct.unpack_from("<H", event, 4)[0] != opcode:
+            return None, None
+        return event[6], bytes(event[7:])
+    elif event[1] == EVT_CMD_STATUS and len(event) >= 7:
+        # Status, number of allowed packets, then the opcode
+        if struct.unpack_from("<H", event, 5)[0] != opcode:
+            return None, None
+        # A pending command only fails here, otherwise it's
+        # completed by a later event
+        if event[3] == 0:
+            return None, None
+        return event[3], b''
+
+    return None, None
+
+
+def reset_hci_device(adapter_id):
+    """Brings an HCI device down and back up, reinitializing the
+    controller and reloading its address.
+
+    :param adapter_id: The adapter's ID, eg: "hci0"
+    :type adapter_id: string
+    :raises PermissionError: If the process lacks CAP_NET_ADMIN
+    """
+
+    device_id = _hci_device_id(adapter_id)
+    sock = socket.socket(
+        socket.AF_BLUETOOTH, socket.SOCK_RAW, socket.BTPROTO_HCI)
+    try:
+        fcntl.ioctl(sock.fileno(), HCIDEVDOWN, device_id)
+        try:
+            fcntl.ioctl(sock.fileno(), HCIDEVUP, device_id)
+        except OSError as e:
+            if e.errno != errno.EALREADY:
+                raise
+    finally:
+        sock.close()
+
+
+def write_bd_address(adapter_id, mac):
+    """Writes a new Bluetooth MAC address to an adapter with
+    a vendor-specific HCI command and resets the adapter to apply it.
+
+    :param adapter_id: The adapter's ID, eg: "hci0"
+    :type adapter_id: string
+    :param mac: A Bluetooth MAC address in
+    the form of "XX:XX:XX:XX:XX:XX"
+    :type mac: string
+    """
+
+    # HCI expects the address in little endian byte order
+    address = bytes.fromhex(mac.replace(":", ""))[::-1]
+    hci_command(adapter_id, *HCI_VENDOR_WRITE_BD_ADDR, address)
+    reset_hci_device(adapter_id)
+
+
 def get_random_controller_mac():
     """Generates a random Switch-compliant MAC address
     """
@@ -377,72 +810,57 @@ def replace_mac_addresses(adapter_paths, addresses):
     defaults to False
     :type addresses: bool, optional
     """
-    if which("hcitool") is None:
-        raise Exception("hcitool is not available on this system." +
-                        "If you can, please install this tool, as " +
-                        "it is required for proper functionality.")
-    if which("hciconfig") is None:
-        raise Exception("hciconfig is not available on this system." +
-                        "If you can, please install this tool, as " +
-                        "it is required for proper functionality.")
-
     if addresses:
         assert len(addresses) == len(adapter_paths)
 
     for i in range(len(adapter_paths)):
         adapter_id = adapter_paths[i].split('/')[-1]
-        mac = addresses[i].split(':')
-        cmds = ['hcitool', '-i', adapter_id, 'cmd', '0x3f', '0x001',
-                f'0x{mac[5]}',f'0x{mac[4]}',f'0x{mac[3]}',f'0x{mac[2]}',
-                f'0x{mac[1]}',f'0x{mac[0]}']
-        _run_command(cmds)
-        _run_command(['hciconfig', adapter_id, 'reset'])
+        write_bd_address(adapter_id, addresses[i])
+
+
+def _find_device_index(bus=None, cached=False):
+    """Gets the signal-driven device index if a cached index was
+    requested and is available, or loads a fresh one otherwise.
+    """
+
+    index = get_device_index() if cached else None
+    if index is not None:
+        return index
+
+    if bus is not None:
+        return load_device_index(bus)
+
+    bus = dbus.SystemBus()
+    try:
+        return load_device_index(bus)
+    finally:
+        bus.close()
 
 
-def find_devices_by_alias(alias, return_path=False, created_bus=None):
+def find_devices_by_alias(alias, return_path=False, created_bus=None,
+                          cached=False):
     """Finds the Bluetooth addresses of devices
     that have a specified Bluetooth alias. Aliases
     are converted to uppercase before comparison
     as BlueZ usually converts aliases to uppercase.
 
-    :param address: The Bluetooth MAC address
-    :type address: string
-    :return: The path to the D-Bus object or None
-    :rtype: string or None
+    :param alias: The device alias
+    :type alias: string
+    :param return_path: Whether to also return the D-Bus object paths,
+    defaults to False
+    :type return_path: bool, optional
+    :param created_bus: An existing D-Bus connection, defaults to None
+    :type created_bus: DBus, optional
+    :param cached: Whether to use the signal-driven device index,
+    defaults to False
+    :type cached: bool, optional
+    :return: The matching addresses or, if return_path is set,
+    the matching addresses and paths
+    :rtype: list or tuple of (list, list)
     """
 
-    if created_bus is not None:
-        bus = created_bus
-    else:
-        bus = dbus.SystemBus()
-    # Find all connected/paired/discovered devices
-    devices = find_objects(
-        bus,
-        SERVICE_NAME,
-        DEVICE_INTERFACE)
-
-    addresses = []
-    matching_paths = []
-    for path in devices:
-        # Get the device's address and paired status
-        device_props = dbus.Interface(
-            bus.get_object(SERVICE_NAME, path),
-            "org.freedesktop.DBus.Properties")
-        device_alias = device_props.Get(
-            DEVICE_INTERFACE,
-            "Alias").upper()
-        device_addr = device_props.Get(
-            DEVICE_INTERFACE,
-            "Address").upper()
-
-        # Check for an address match
-        if device_alias.upper() == alias.upper():
-            addresses.append(device_addr)
-            matching_paths.append(path)
-
-    # Close the dbus connection if we created one
-    if created_bus is None:
-        bus.close()
+    index = _find_device_index(created_bus, cached)
+    addresses, matching_paths = index.find_by_alias(alias)
 
     if return_path:
         return addresses, matching_paths
@@ -450,43 +868,33 @@ def find_devices_by_alias(alias, return_path=False, created_bus=None):
         return addresses
 
 
-def disconnect_devices_by_alias(alias, created_bus=None):
+def disconnect_devices_by_alias(alias, created_bus=None, cached=False):
     """Disconnects all devices matching an alias.
 
     :param alias: The device's alias
     :type alias: string
+    :param created_bus: An existing D-Bus connection, defaults to None
+    :type created_bus: DBus, optional
+    :param cached: Whether to use the signal-driven device index,
+    defaults to False
+    :type cached: bool, optional
     """
 
     if created_bus is not None:
         bus = created_bus
     else:
         bus = dbus.SystemBus()
-    # Find all connected/paired/discovered devices
-    devices = find_objects(
-        bus,
-        SERVICE_NAME,
-        DEVICE_INTERFACE)
-
-    addresses = []
-    matching_paths = []
-    for path in devices:
-        # Get the device's address and paired status
-        device_props = dbus.Interface(
+
+    index = _find_device_index(bus, cached)
+    _, matching_paths = index.find_by_alias(alias)
+    for path in matching_paths:
+        device = dbus.Interface(
             bus.get_object(SERVICE_NAME, path),
-            "org.freedesktop.DBus.Properties")
-        device_alias = device_props.Get(
-            DEVICE_INTERFACE,
-            "Alias").upper()
-
-        # Check for an alias match
-        if device_alias.upper() == alias.upper():
-            device = dbus.Interface(
-                bus.get_object(SERVICE_NAME, path),
-                DEVICE_INTERFACE)
-            try:
-                device.Disconnect()
-            except Exception as e:
-                print(e)
+            DEVICE_INTERFACE)
+        try:
+            device.Disconnect()
+        except Exception as e:
+            print(e)
 
     # Close the dbus connection if we created one
     if created_bus is None:
@@ -525,7 +933,7 @@ class BlueZ():
             self.bus.get_object(
                 SERVICE_NAME,
                 self.device_path),
-            "org.freedesktop.DBus.Properties")
+            PROPERTIES_INTERFACE)
 
         self.device_id = self.device_path.split("/")[-1]
 
@@ -540,6 +948,149 @@ class BlueZ():
                 self.device_path),
             ADAPTER_INTERFACE)
 
+        # Adapter properties can be cached and kept up to date with
+        # PropertiesChanged signals, see enable_property_cache. Without
+        # a signal bus, we can't tell when BlueZ changes a property,
+        # so every read goes to D-Bus.
+        self._properties = None
+        self._properties_lock = threading.Lock()
+        self._signal_pid = None
+        self.signal_bus = None
+
+    def enable_property_cache(self):
+        """Caches the adapter's properties, keeping them up to date with
+        PropertiesChanged signals. This starts the process's signal bus,
+        so it must be called by the process that uses this object,
+        after any fork.
+        """
+
+        with self._properties_lock:
+            self._attach_signal_bus()
+        if self.signal_bus is not None:
+            # Warm up the cache with a single GetAll call
+            self.refresh_properties()
+
+    def _attach_signal_bus(self):
+        """Subscribes to the adapter's PropertiesChanged signals on
+        this process's signal bus.
+        """
+
+        self._properties = None
+        self._signal_pid = os.getpid()
+        self.signal_bus = get_signal_bus()
+        if self.signal_bus is not None:
+            self.signal_bus.add_signal_receiver(
+                self._on_properties_changed,
+                signal_name="PropertiesChanged",
+                dbus_interface=PROPERTIES_INTERFACE,
+                bus_name=SERVICE_NAME,
+                path=self.device_path,
+                arg0=ADAPTER_INTERFACE)
+
+    def _check_signal_bus(self):
+        """Reattaches the property cache if it was enabled before a fork,
+        since signals are dispatched per process.
+        """
+
+        if self._signal_pid is not None and self._signal_pid != os.getpid():
+            with self._properties_lock:
+                self._attach_signal_bus()
+
+    def _on_properties_changed(self, interface, changed, invalidated):
+        """Applies a PropertiesChanged signal to the property cache.
+        """
+
+        with self._properties_lock:
+            if self._properties is None:
+                return
+            self._properties.update(changed)
+            for name in invalidated:
+                self._properties.pop(name, None)
+
+    def refresh_properties(self):
+        """Reloads all adapter properties with a single GetAll call.
+
+        :return: The adapter's properties
+        :rtype: dict
+        """
+
+        self._check_signal_bus()
+        properties = dict(self.device.GetAll(ADAPTER_INTERFACE))
+        if self.signal_bus is not None:
+            with self._properties_lock:
+                self._properties = properties
+
+        return properties
+
+    def invalidate_properties(self):
+        """Drops the cached adapter properties. The next property read
+        reloads them from BlueZ.
+        """
+
+        with self._properties_lock:
+            self._properties = None
+
+    def _get_property(self, name):
+        """Gets an adapter property, from the cache if possible.
+
+        :param name: The name of the property
+        :type name: string
+        :return: The property's value
+        """
+
+        self._check_signal_bus()
+        if self.signal_bus is None:
+            return self.device.Get(ADAPTER_INTERFACE, name)
+
+        with self._properties_lock:
+            properties = self._properties
+            if properties is not None and name in properties:
+                return properties[name]
+
+        if properties is None:
+            return self.refresh_properties()[name]
+
+        value = self.device.Get(ADAPTER_INTERFACE, name)
+        with self._properties_lock:
+            if self._properties is not None:
+                self._properties[name] = value
+        return value
+
+    def _set_property(self, name, value):
+        """Sets an adapter property and updates the cache with the
+        new value.
+
+        :param name: The name of the property
+        :type name: string
+        :param value: The new value of the property
+        """
+
+        self.device.Set(ADAPTER_INTERFACE, name, value)
+        with self._properties_lock:
+            if self._properties is not None:
+                self._properties[name] = value
+
+    def set_properties(self, properties):
+        """Sets multiple adapter properties at once. If the property
+        cache is enabled, properties whose cached values already match
+        are skipped.
+
+        :param properties: The property names and their new D-Bus values
+        :type properties: dict
+        :raises dbus.exceptions.DBusException: If a property can't be set
+        """
+
+        self._check_signal_bus()
+        for name, value in properties.items():
+            if self.signal_bus is not None:
+                try:
+                    if self._get_property(name) == value:
+                        continue
+                except (KeyError, dbus.exceptions.DBusException):
+                    pass
+            self.logger.debug(f"Setting adapter property {name} to {value}")
+            self._set_property(name, value)
+
     @property
     def address(self):
         """Gets the Bluetooth MAC address of the Bluetooth adapter.
@@ -548,46 +1099,27 @@ class BlueZ():
         :rtype: string
         """
 
-        return self.device.Get(ADAPTER_INTERFACE, "Address").upper()
+        return self._get_property("Address").upper()
 
     def set_address(self, mac):
         """Sets the Bluetooth MAC address of the Bluetooth adapter.
-        The hciconfig CLI is required for setting the address.
-        For changes to apply, the Bluetooth interface needs to be
-        restarted.
+        The address is written with a vendor-specific HCI command and
+        the adapter is reset to apply it.
 
         :param mac: A Bluetooth MAC address in 
         the form of "XX:XX:XX:XX:XX:XX
         :type mac: str
         :raises PermissionError: On run as non-root user
-        :raises Exception: On CLI errors
+        :raises Exception: On HCI errors
         """
         self.logger.info(f"Setting adapter address to {mac}")
-        if which("hcitool") is None:
-            raise Exception("hcitool is not available on this system." +
-                            "If you can, please install this tool, as " +
-                            "it is required for proper functionality.")
-        # Reverse MAC (element position-wise) for use with hcitool
-        mac = mac.split(":")
-        cmds = ['hcitool', '-i', self.device_id, 'cmd', '0x3f', '0x001',
-                f'0x{mac[5]}',f'0x{mac[4]}',f'0x{mac[3]}',f'0x{mac[2]}',
-                f'0x{mac[1]}',f'0x{mac[0]}']
-        _run_command(cmds)
-        _run_command(['hciconfig', self.device_id, 'reset'])
+        write_bd_address(self.device_id, mac)
+        self.invalidate_properties()
 
     def _send_hci_command(self, ogf, ocf, data=b''):
         """Sends a raw HCI command to the adapter.
         """
-        opcode = (ogf << 10) | ocf
-        cmd_hdr = struct.pack("<HB", opcode, len(data))
-        pkt = bytes([0x01]) + cmd_hdr + data
-        
-        dev_id = int(self.device_id.replace("hci", ""))
-        
-        sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_RAW, socket.BTPROTO_HCI)
-        sock.bind((dev_id,))
-        sock.send(pkt)
-        sock.close()
+        hci_command(self.device_id, ogf, ocf, data, wait=False)
 
     def set_class(self, device_class):
         self.logger.info(f"Setting adapter class to {device_class}")
@@ -601,14 +1133,13 @@ class BlueZ():
         # "002508" -> 0x00, 0x25, 0x08.
         # HCI expects Little Endian: 08 25 00
         cls_bytes = bytes.fromhex(cls_hex)[::-1]
-        
-        # Opcode for Write Class of Device: OGF=0x03, OCF=0x0024
-        self._send_hci_command(0x03, 0x0024, cls_bytes)
+
+        self._send_hci_command(*HCI_WRITE_CLASS_OF_DEVICE, cls_bytes)
 
     def reset_adapter(self):
         self.logger.info("Resetting adapter...")
-        # Opcode for Reset: OGF=0x03, OCF=0x0003
-        self._send_hci_command(0x03, 0x0003)
+        hci_command(self.device_id, *HCI_RESET)
+        self.invalidate_properties()
 
     @property
     def name(self):
@@ -618,7 +1149,7 @@ class BlueZ():
         :rtype: string
         """
 
-        return self.device.Get(ADAPTER_INTERFACE, "Name")
+        return self._get_property("Name")
 
     @property
     def alias(self):
@@ -630,7 +1161,7 @@ class BlueZ():
         :rtype: string
         """
 
-        return self.device.Get(ADAPTER_INTERFACE, "Alias")
+        return self._get_property("Alias")
 
     def set_alias(self, value):
         """Asynchronously sets the alias of the Bluetooth adapter.
@@ -641,7 +1172,7 @@ class BlueZ():
         :type value: string
         """
         self.logger.debug(f"Setting alias to {value}")
-        self.device.Set(ADAPTER_INTERFACE, "Alias", value)
+        self._set_property("Alias", value)
 
     @property
     def pairable(self):
@@ -652,7 +1183,7 @@ class BlueZ():
         :rtype: boolean
         """
 
-        return bool(self.device.Get(ADAPTER_INTERFACE, "Pairable"))
+        return bool(self._get_property("Pairable"))
 
     def set_pairable(self, value):
         """Sets the pariable boolean status of the Bluetooth adapter.
@@ -663,7 +1194,7 @@ class BlueZ():
         """
         self.logger.debug(f"Setting pairable to {value}")
         dbus_value = dbus.Boolean(value)
-        self.device.Set(ADAPTER_INTERFACE, "Pairable", dbus_value)
+        self._set_property("Pairable", dbus_value)
 
     @property
     def pairable_timeout(self):
@@ -674,7 +1205,7 @@ class BlueZ():
         :rtype: int
         """
 
-        return self.device.Get(ADAPTER_INTERFACE, "PairableTimeout")
+        return self._get_property("PairableTimeout")
 
     def set_pairable_timeout(self, value):
         """Sets the timeout time (in seconds) for the pairable property.
@@ -684,7 +1215,7 @@ class BlueZ():
         """
 
         dbus_value = dbus.UInt32(value)
-        self.device.Set(ADAPTER_INTERFACE, "PairableTimeout", dbus_value)
+        self._set_property("PairableTimeout", dbus_value)
 
     @property
     def discoverable(self):
@@ -694,7 +1225,7 @@ class BlueZ():
         :rtype: boolean
         """
 
-        return bool(self.device.Get(ADAPTER_INTERFACE, "Discoverable"))
+        return bool(self._get_property("Discoverable"))
 
     def set_discoverable(self, value):
         """Sets the discoverable boolean status of the Bluetooth adapter.
@@ -705,7 +1236,7 @@ class BlueZ():
         """
         self.logger.debug(f"Setting discoverable to {value}")
         dbus_value = dbus.Boolean(value)
-        self.device.Set(ADAPTER_INTERFACE, "Discoverable", dbus_value)
+        self._set_property("Discoverable", dbus_value)
 
     @property
     def discoverable_timeout(self):
@@ -716,7 +1247,7 @@ class BlueZ():
         :rtype: int
         """
 
-        return self.device.Get(ADAPTER_INTERFACE, "DiscoverableTimeout")
+        return self._get_property("DiscoverableTimeout")
 
     def set_discoverable_timeout(self, value):
         """Sets the discoverable time (in seconds) for the discoverable
@@ -728,10 +1259,7 @@ class BlueZ():
         """
 
         dbus_value = dbus.UInt32(value)
-        self.device.Set(
-            ADAPTER_INTERFACE,
-            "DiscoverableTimeout",
-            dbus_value)
+        self._set_property("DiscoverableTimeout", dbus_value)
 
     @property
     def device_class(self):
@@ -743,15 +1271,10 @@ class BlueZ():
         :rtype: string
         """
 
-        # This is another hacky bit. We're using hciconfig here instead
-        # of the D-Bus API so that results match the setter. See the
-        # setter for further justification on using hciconfig.
-        result = subprocess.run(
-            ["hciconfig", self.device_id, "class"],
-            stdout=subprocess.PIPE)
-        device_class = result.stdout.decode("utf-8").split("Class: ")[1][0:8]
+        params = hci_command(self.device_id, *HCI_READ_CLASS_OF_DEVICE)
+        device_class = int.from_bytes(params[0:3], "little")
 
-        return device_class
+        return f"0x{device_class:06x}"
 
     def set_device_class(self, device_class):
         """Sets the Bluetooth class of the device. This represents what type
@@ -772,17 +1295,10 @@ class BlueZ():
         if len(device_class) != 8:
             raise ValueError("Device class must be length 8")
 
-        # This is a bit of a hack. BlueZ allows you to set this value, however,
-        # a config file needs to filled and the BT daemon restarted. This is a
-        # good compromise but requires super user privileges. Not ideal.
-        result = subprocess.run(
-            ["hciconfig", self.device_id, "class", device_class],
-            stderr=subprocess.PIPE)
-
-        # Checking if there was a problem setting the device class
-        cmd_err = result.stderr.decode("utf-8").replace("\n", "")
-        if cmd_err != "":
-            raise Exception(cmd_err)
+        # BlueZ only allows setting the class through its config file,
+        # so the class is written directly to the controller instead.
+        class_bytes = int(device_class, 16).to_bytes(3, "little")
+        hci_command(self.device_id, *HCI_WRITE_CLASS_OF_DEVICE, class_bytes)
 
     @property
     def powered(self):
@@ -792,7 +1308,7 @@ class BlueZ():
         :rtype: boolean
         """
 
-        return bool(self.device.Get(ADAPTER_INTERFACE, "Powered"))
+        return bool(self._get_property("Powered"))
 
     def set_powered(self, value):
         """Switches the adapter on or off.
@@ -802,7 +1318,7 @@ class BlueZ():
         """
 
         dbus_value = dbus.Boolean(value)
-        self.device.Set(ADAPTER_INTERFACE, "Powered", dbus_value)
+        self._set_property("Powered", dbus_value)
 
     def register_profile(self, profile_path, uuid, opts):
         """Registers an SDP record on the BlueZ SDP server.
@@ -863,7 +1379,8 @@ class BlueZ():
             self.bus.get_object(
                 SERVICE_NAME,
                 self.device_path),
-            "org.freedesktop.DBus.Properties")
+            PROPERTIES_INTERFACE)
+        self.invalidate_properties()
         self.profile_manager = dbus.Interface(
             self.bus.get_object(
                 SERVICE_NAME,
@@ -887,17 +1404,7 @@ class BlueZ():
         :rtype: dictionary
         """
 
-        bluez_objects = dbus.Interface(
-            self.bus.get_object(SERVICE_NAME, "/"),
-            "org.freedesktop.DBus.ObjectManager")
-
-        devices = {}
-        objects = bluez_objects.GetManagedObjects()
-        for path, interfaces in list(objects.items()):
-            if DEVICE_INTERFACE in interfaces:
-                devices[str(path)] = interfaces[DEVICE_INTERFACE]
-
-        return devices
+        return _get_managed_devices(self.bus)
 
     def discover_devices(self, alias=None, timeout=10, callback=None):
         """Runs a device discovery of the timeout length (in seconds)
@@ -1011,68 +1518,39 @@ class BlueZ():
         self.adapter.RemoveDevice(
             self.bus.get_object(SERVICE_NAME, path))
 
-    def find_device_by_address(self, address):
+    def find_device_by_address(self, address, cached=False):
         """Finds the D-Bus path to a device that contains the
         specified address.
 
         :param address: The Bluetooth MAC address
         :type address: string
+        :param cached: Whether to use the signal-driven device index,
+        defaults to False
+        :type cached: bool, optional
         :return: The path to the D-Bus object or None
         :rtype: string or None
         """
 
-        # Find all connected/paired/discovered devices
-        devices = find_objects(
-            self.bus,
-            SERVICE_NAME,
-            DEVICE_INTERFACE)
-        for path in devices:
-            # Get the device's address and paired status
-            device_props = dbus.Interface(
-                self.bus.get_object(SERVICE_NAME, path),
-                "org.freedesktop.DBus.Properties")
-            device_addr = device_props.Get(
-                DEVICE_INTERFACE,
-                "Address").upper()
-
-            # Check for an address match
-            if device_addr != address.upper():
-                continue
-            return path
+        index = _find_device_index(self.bus, cached)
+        return index.find_by_address(address)
 
-        return None
-    
     def find_connected_devices(self, alias_filter=False):
-        """Finds the D-Bus path to a device that contains the
-        specified address.
+        """Finds the D-Bus paths to all connected devices.
 
-        :param address: The Bluetooth MAC address
-        :type address: string
-        :return: The path to the D-Bus object or None
-        :rtype: string or None
+        :param alias_filter: Only find devices with this alias,
+        defaults to False
+        :type alias_filter: string, optional
+        :return: The paths to the D-Bus objects
+        :rtype: list
         """
 
-        devices = find_objects(
-            self.bus,
-            SERVICE_NAME,
-            DEVICE_INTERFACE)
         conn_devices = []
-        for path in devices:
-            # Get the device's connection status
-            device_props = dbus.Interface(
-                self.bus.get_object(SERVICE_NAME, path),
-                "org.freedesktop.DBus.Properties")
-            device_conn_status = device_props.Get(
-                DEVICE_INTERFACE,
-                "Connected")
-            device_alias = device_props.Get(
-                DEVICE_INTERFACE,
-                "Alias").upper()
-
-            if device_conn_status:
-                if alias_filter and device_alias == alias_filter.upper():
-                    conn_devices.append(path)
-                else:
-                    conn_devices.append(path)
+        for path, properties in _get_managed_devices(self.bus).items():
+            if not properties.get("Connected"):
+                continue
+            device_alias = properties.get("Alias", "").upper()
+            if alias_filter and device_alias != alias_filter.upper():
+                continue
+            conn_devices.append(path)
 
         return conn_devices
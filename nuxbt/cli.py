@@ -192,8 +192,11 @@ def toggle(ctx):
               help="""Specifies the folder location for SSL certificates used
                     in the webapp. Certificates in this folder should be in the form of
                     a 'cert.pem' and 'key.pem' pair.""")
+@click.option('--native-socketio', is_flag=True, default=False,
+              help="""Serves Socket.IO from an ASGI-native server, allowing browsers
+                    to send input over a WebSocket instead of HTTP long-polling""")
 @pass_context
-def webapp(ctx, ip, port, usessl, certpath):
+def webapp(ctx, ip, port, usessl, certpath, native_socketio):
     """Runs web server and allows for controller/macro input from a web browser."""
     ensure_plugin_enabled()
     # We need to set up logging here if we want it for the webapp process
@@ -204,7 +207,8 @@ def webapp(ctx, ip, port, usessl, certpath):
     # or pass it if it accepts arguments. Checking app.py would be good if we can,
     # but based on previous cli, it didn't pass logging to start_web_app directly
     # except maybe via global config? No, it just called start_web_app.
-    start_web_app(ip=ip, port=port, usessl=usessl, cert_path=certpath, debug=ctx.debug)
+    start_web_app(ip=ip, port=port, usessl=usessl, cert_path=certpath, debug=ctx.debug,
+                  native_socketio=native_socketio)
 
 
 @main.command()
@@ -1,4 +1,6 @@
 from .server import ControllerServer
+from .server import ControllerTasks
+from .engine import ControllerEngine
 from .controller import ControllerTypes
 from .controller import Controller
 from .protocol import ControllerProtocol
@@ -39,13 +39,14 @@ class Controller():
         specified controller.
         """
 
-        # Setting up Bluetooth adapter options
-        self.bt.set_powered(True)
-        self.bt.set_pairable(True)
-        self.bt.set_pairable_timeout(0)
-        self.bt.set_discoverable_timeout(180)
-
-        self.bt.set_alias(self.alias)
+        # Setting up Bluetooth adapter options in one batch
+        self.bt.set_properties({
+            "Powered": dbus.Boolean(True),
+            "Pairable": dbus.Boolean(True),
+            "PairableTimeout": dbus.UInt32(0),
+            "DiscoverableTimeout": dbus.UInt32(180),
+            "Alias": self.alias,
+        })
 
         # Adding the SDP record
         sdp_record_path = os.path.join(
@@ -0,0 +1,112 @@
+import struct
+from multiprocessing import shared_memory
+
+from .input import DIRECT_INPUT_IDLE
+
+
+class DirectInputSlot():
+    """A shared memory slot holding the latest direct input of a
+    single controller. Callers in any process write packed input
+    (see nuxbt.controller.input.pack_controller_input) into the slot
+    and the controller server reads it once per frame, without any
+    IPC round trips.
+
+    Reads and writes are synchronized with a sequence lock. The sequence
+    number is odd while a write is in progress and increases by two with
+    every completed write, allowing readers to detect torn reads and retry.
+
+    Slot layout (little endian):
+    - Bytes 0-3: The sequence number (uint32)
+    - Bytes 8-15: The packed direct input (uint64)
+    """
+
+    SEQUENCE = struct.Struct("<I")
+    INPUT = struct.Struct("<Q")
+    INPUT_OFFSET = 8
+    SIZE = 16
+
+    # Number of attempts a reader makes before falling
+    # back to the last consistent read.
+    READ_ATTEMPTS = 100
+
+    def __init__(self, name=None, create=False, lock=None):
+        """Creates or attaches to a direct input slot.
+
+        :param name: The name of an existing slot to attach to,
+        defaults to None
+        :type name: str, optional
+        :param create: Whether or not to create a new slot,
+        defaults to False
+        :type create: bool, optional
+        :param lock: A lock shared by all writers of the slot. Only
+        required if the slot is written to by multiple threads or
+        processes, defaults to None
+        :type lock: multiprocessing.Lock, optional
+        """
+
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.SIZE)
+            self.shm.buf[:self.SIZE] = bytes(self.SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.name = self.shm.name
+        self.lock = lock
+        self._buf = self.shm.buf
+
+        # The last consistent read
+        self._last_sequence = 0
+        self._last_input = DIRECT_INPUT_IDLE
+
+    def write(self, packed_input):
+        """Writes packed direct input into the slot.
+
+        :param packed_input: The packed direct input
+        :type packed_input: int
+        """
+
+        if self.lock:
+            self.lock.acquire()
+        try:
+            buf = self._buf
+            sequence = self.SEQUENCE.unpack_from(buf, 0)[0]
+            # Mark the write as in progress
+            self.SEQUENCE.pack_into(buf, 0, (sequence + 1) & 0xFFFFFFFF)
+            self.INPUT.pack_into(buf, self.INPUT_OFFSET, packed_input)
+            self.SEQUENCE.pack_into(buf, 0, (sequence + 2) & 0xFFFFFFFF)
+        finally:
+            if self.lock:
+                self.lock.release()
+
+    def read(self):
+        """Reads the latest packed direct input from the slot.
+
+        :return: The sequence number of the write and the packed input
+        :rtype: tuple
+        """
+
+        buf = self._buf
+        for _ in range(self.READ_ATTEMPTS):
+            sequence = self.SEQUENCE.unpack_from(buf, 0)[0]
+            if sequence & 1:
+                continue
+            packed_input = self.INPUT.unpack_from(buf, self.INPUT_OFFSET)[0]
+            if self.SEQUENCE.unpack_from(buf, 0)[0] == sequence:
+                self._last_sequence = sequence
+                self._last_input = packed_input
+                break
+
+        return self._last_sequence, self._last_input
+
+    def close(self):
+        """Closes this process' access to the slot."""
+
+        self._buf = None
+        self.shm.close()
+
+    def unlink(self):
+        """Destroys the slot. Should only be called by the
+        creator of the slot.
+        """
+
+        self.shm.unlink()
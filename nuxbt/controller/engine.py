@@ -0,0 +1,322 @@
+import socket
+import selectors
+import time
+import queue
+import logging
+import traceback
+from threading import Thread, Lock
+
+from .server import ControllerServer
+from .utils import format_msg_switch
+
+
+class ControllerEngine():
+    """Runs many controller servers in a single process. The interrupt
+    sockets of all connected controllers are driven by one selectors
+    event loop, with a frame deadline per controller.
+
+    Connecting and reconnecting to a Switch blocks, so each controller
+    does so in its own thread and its sockets are handed to the event
+    loop once connected. Frames are processed with the controller
+    server's own protocol and input parser, exactly as in the
+    process-per-controller model.
+
+    The engine is controlled through a command queue. Commands are
+    dicts with a "command" key of "create", "task" or "remove":
+
+    - create: Creates a controller with the "index" key and passes
+      the remaining keys as arguments to ControllerServer.
+    - task: Passes the "task" key to the task queue of the controller
+      at "index".
+    - remove: Removes the controller at "index".
+    """
+
+    def __init__(self, command_queue, lock=None, macro_completion_queue=None):
+        """Creates a controller engine.
+
+        :param command_queue: The queue engine commands are read from
+        :type command_queue: multiprocessing.Queue
+        :param lock: A lock shared by all controllers to prevent them
+        from initializing at the same time, defaults to None
+        :type lock: multiprocessing.Lock, optional
+        :param macro_completion_queue: A queue that the IDs of finished
+        macros are reported on, defaults to None
+        :type macro_completion_queue: multiprocessing.Queue, optional
+        """
+
+        self.logger = logging.getLogger('nuxbt')
+
+        self.command_queue = command_queue
+        self.lock = lock
+        self.macro_completion_queue = macro_completion_queue
+
+        # All controller servers, keyed by index
+        self._servers = {}
+        # The locks held by controllers while pairing, keyed by adapter path
+        self._adapter_locks = {}
+        self._controller_adapters = {}
+        # The connected controllers' interrupt and control sockets,
+        # and the last non-subcommand message from the Switch.
+        self._connections = {}
+
+        # Work posted to the event loop by other threads
+        self._pending = queue.Queue()
+
+        self._selector = None
+        self._wake_reader = None
+        self._wake_writer = None
+
+    def run(self):
+        """Runs the engine. Commands are read from the command queue
+        on a separate thread while the calling thread runs the
+        event loop.
+        """
+
+        self._selector = selectors.DefaultSelector()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+
+        dispatcher = Thread(target=self._dispatch_commands, daemon=True)
+        dispatcher.start()
+
+        try:
+            self._event_loop()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._selector.close()
+
+    def _event_loop(self):
+
+        selector = self._selector
+        connections = self._connections
+        while True:
+            # Sleep until the earliest frame deadline
+            timeout = None
+            scheduler = None
+            if connections:
+                scheduler = min(
+                    (self._servers[index].scheduler for index in connections),
+                    key=lambda candidate: candidate.deadline)
+                timeout = max(
+                    scheduler.time_until_deadline() - scheduler.spin_time, 0)
+
+            events = selector.select(timeout)
+            for key, _ in events:
+                if key.data is None:
+                    self._run_pending()
+                else:
+                    self._read(key.data)
+
+            # Busy wait the last stretch before the deadline, if enabled
+            if not events and scheduler and scheduler.spin_time:
+                scheduler.wait()
+
+            now = time.perf_counter()
+            for index in list(connections):
+                server = self._servers[index]
+                if server.scheduler.deadline > now:
+                    continue
+
+                server.scheduler.next_frame()
+                reply = connections[index][2]
+                connections[index][2] = None
+                if self._process_frame(index, reply):
+                    server.publish_frame_timing()
+
+    def _read(self, index):
+
+        connection = self._connections.get(index)
+        if connection is None:
+            return
+
+        server = self._servers[index]
+        try:
+            reply = server.receive(connection[0])
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._reconnect(index, e)
+            return
+
+        # An empty message means the connection was closed,
+        # which is handled when the next report fails to send.
+        if not reply:
+            self._selector.unregister(connection[0])
+            return
+
+        if server.logger_level <= logging.DEBUG and len(reply) > 40:
+            self.logger.debug(format_msg_switch(reply))
+
+        # Subcommands are answered right away. Since the receive
+        # buffer is reused, any earlier message is dropped.
+        if len(reply) > 45:
+            connection[2] = None
+            self._process_frame(index, reply, frame_due=False)
+        else:
+            connection[2] = reply
+
+    def _process_frame(self, index, reply, frame_due=True):
+
+        server = self._servers[index]
+        try:
+            server.process_frame(self._connections[index][0], reply, frame_due)
+        except OSError as e:
+            self._reconnect(index, e)
+            return False
+        except Exception:
+            self._crash(index)
+            return False
+
+        return True
+
+    def _dispatch_commands(self):
+
+        while True:
+            try:
+                msg = self.command_queue.get()
+            except (EOFError, OSError):
+                return
+
+            command = msg.pop("command")
+            if command == "create":
+                self._create_controller(msg)
+            elif command == "task":
+                server = self._servers.get(msg["index"])
+                if server:
+                    server.task_queue.put(msg["task"])
+            elif command == "remove":
+                self._post(self._remove_controller, msg["index"])
+
+    def _create_controller(self, arguments):
+
+        index = arguments.pop("index")
+        reconnect_address = arguments.pop("reconnect_address", None)
+
+        adapter_path = arguments.get("adapter_path")
+        adapter_lock = self._adapter_locks.setdefault(adapter_path, Lock())
+        self._controller_adapters[index] = adapter_path
+
+        try:
+            server = ControllerServer(
+                task_queue=queue.Queue(),
+                lock=self.lock,
+                adapter_lock=adapter_lock,
+                macro_completion_queue=self.macro_completion_queue,
+                **arguments)
+        except Exception:
+            state = arguments.get("state")
+            if state is not None:
+                state["state"] = "crashed"
+                state["errors"] = traceback.format_exc()
+            return
+
+        self._servers[index] = server
+        Thread(target=self._connect,
+               args=(index, server, reconnect_address),
+               daemon=True).start()
+
+    def _connect(self, index, server, reconnect_address):
+
+        try:
+            itr, ctrl = server.connect_to_switch(reconnect_address)
+        except Exception:
+            # The controller was removed while it was connecting
+            if server.stopped:
+                return
+            server.state["state"] = "crashed"
+            server.state["errors"] = traceback.format_exc()
+            return
+
+        self._post(self._add_connection, index, itr, ctrl)
+
+    def _reconnect(self, index, error):
+
+        server = self._servers[index]
+        itr, ctrl, _ = self._connections.pop(index)
+        try:
+            self._selector.unregister(itr)
+        except (KeyError, ValueError):
+            pass
+
+        def reconnect():
+            try:
+                itr, ctrl = server.save_connection(error)
+            except Exception:
+                server.state["state"] = "crashed"
+                server.state["errors"] = traceback.format_exc()
+                return
+            self._post(self._add_connection, index, itr, ctrl)
+
+        Thread(target=reconnect, daemon=True).start()
+
+    def _add_connection(self, index, itr, ctrl):
+
+        # The controller was removed while it was connecting
+        if index not in self._servers or index in self._connections:
+            itr.close()
+            ctrl.close()
+            return
+
+        self._connections[index] = [itr, ctrl, None]
+        self._selector.register(itr, selectors.EVENT_READ, data=index)
+        self._servers[index].scheduler.start()
+        self._servers[index].frame_start = None
+
+    def _remove_controller(self, index):
+
+        connection = self._connections.pop(index, None)
+        if connection:
+            try:
+                self._selector.unregister(connection[0])
+            except (KeyError, ValueError):
+                pass
+            connection[0].close()
+            connection[1].close()
+
+        # A controller removed while pairing never releases its
+        # adapter's lock, so the next controller gets a new one
+        adapter_path = self._controller_adapters.pop(index, None)
+        self._adapter_locks.pop(adapter_path, None)
+
+        server = self._servers.pop(index, None)
+        if server:
+            # Unlike a terminated process, a connecting thread keeps
+            # its sockets bound to the adapter until it's stopped
+            server.stop()
+            # Release anyone waiting on the controller's macros
+            server.input.clear_macros()
+            server._on_exit()
+
+    def _crash(self, index):
+
+        server = self._servers[index]
+        server.state["state"] = "crashed"
+        server.state["errors"] = traceback.format_exc()
+        self._remove_controller(index)
+
+    def _post(self, function, *args):
+        """Runs a function on the event loop thread.
+
+        :param function: The function to run
+        :type function: callable
+        """
+
+        self._pending.put((function, args))
+        self._wake_writer.send(b"\0")
+
+    def _run_pending(self):
+
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        while True:
+            try:
+                function, args = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            function(*args)
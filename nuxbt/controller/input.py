@@ -1,5 +1,5 @@
 from time import perf_counter
-from json import dumps
+from collections import deque
 
 
 DIRECT_INPUT_IDLE_PACKET = {
@@ -52,6 +52,314 @@ DIRECT_INPUT_IDLE_PACKET = {
 }
 
 
+# Maps each button to its (report byte, bit mask) location within
+# the 3 button bytes of the standard input report.
+# Byte 0 is the upper byte, 1 is the shared byte and 2 is the lower byte.
+BUTTON_BITS = {
+    # Upper Byte
+    "Y": (0, 0x01),
+    "X": (0, 0x02),
+    "B": (0, 0x04),
+    "A": (0, 0x08),
+    "JCL_SR": (0, 0x10),
+    "JCL_SL": (0, 0x20),
+    "R": (0, 0x40),
+    "ZR": (0, 0x80),
+    # Shared byte
+    "MINUS": (1, 0x01),
+    "PLUS": (1, 0x02),
+    "R_STICK_PRESS": (1, 0x04),
+    "L_STICK_PRESS": (1, 0x08),
+    "HOME": (1, 0x10),
+    "CAPTURE": (1, 0x20),
+    # Lower byte
+    "DPAD_DOWN": (2, 0x01),
+    "DPAD_UP": (2, 0x02),
+    "DPAD_RIGHT": (2, 0x04),
+    "DPAD_LEFT": (2, 0x08),
+    "JCR_SR": (2, 0x10),
+    "JCR_SL": (2, 0x20),
+    "L": (2, 0x40),
+    "ZL": (2, 0x80),
+}
+
+# Button bits that close the "Change Grip/Order" menu (A, B and HOME)
+GRIP_MENU_UPPER_MASK = 0x08 | 0x04
+GRIP_MENU_SHARED_MASK = 0x10
+
+# Packed direct input layout. Bits 0-23 hold the 3 button bytes
+# (upper, shared, lower) and the following 4 bytes hold the left X/Y
+# and right X/Y stick values (-100 to 100) as signed 8-bit integers.
+# An idle input packet always packs to 0.
+DIRECT_INPUT_IDLE = 0
+DIRECT_INPUT_LX_SHIFT = 24
+DIRECT_INPUT_LY_SHIFT = 32
+DIRECT_INPUT_RX_SHIFT = 40
+DIRECT_INPUT_RY_SHIFT = 48
+
+# Packed bits of the buttons found at the top level of an input packet
+_DIRECT_INPUT_BUTTONS = [
+    (button, bit[1] << (bit[0] * 8))
+    for button, bit in BUTTON_BITS.items()
+    if button in DIRECT_INPUT_IDLE_PACKET]
+_L_STICK_PRESS_BIT = BUTTON_BITS["L_STICK_PRESS"][1] << 8
+_R_STICK_PRESS_BIT = BUTTON_BITS["R_STICK_PRESS"][1] << 8
+
+
+def _pack_axis(value):
+
+    value = int(round(value))
+    if value > 100:
+        value = 100
+    elif value < -100:
+        value = -100
+    return value & 0xFF
+
+
+def _unpack_axis(packed, shift):
+
+    value = (packed >> shift) & 0xFF
+    if value > 127:
+        value -= 256
+    return value
+
+
+def pack_controller_input(controller_input):
+    """Packs an input packet dictionary (see nuxbt.DIRECT_INPUT_PACKET)
+    into a single integer. Buttons are stored as the 3 button bytes
+    of the standard input report, followed by the stick values.
+
+    :param controller_input: An input packet
+    :type controller_input: dict
+    :return: The packed input
+    :rtype: int
+    """
+
+    packed = 0
+    for button, bit in _DIRECT_INPUT_BUTTONS:
+        if controller_input[button]:
+            packed |= bit
+
+    left = controller_input["L_STICK"]
+    right = controller_input["R_STICK"]
+    if left["PRESSED"]:
+        packed |= _L_STICK_PRESS_BIT
+    if right["PRESSED"]:
+        packed |= _R_STICK_PRESS_BIT
+
+    packed |= _pack_axis(left["X_VALUE"]) << DIRECT_INPUT_LX_SHIFT
+    packed |= _pack_axis(left["Y_VALUE"]) << DIRECT_INPUT_LY_SHIFT
+    packed |= _pack_axis(right["X_VALUE"]) << DIRECT_INPUT_RX_SHIFT
+    packed |= _pack_axis(right["Y_VALUE"]) << DIRECT_INPUT_RY_SHIFT
+
+    return packed
+
+
+def unpack_controller_input(packed):
+    """Unpacks a packed input (see pack_controller_input) into an
+    input packet dictionary.
+
+    :param packed: The packed input
+    :type packed: int
+    :return: An input packet
+    :rtype: dict
+    """
+
+    controller_input = {
+        button: bool(packed & bit) for button, bit in _DIRECT_INPUT_BUTTONS}
+    controller_input["L_STICK"] = {
+        "PRESSED": bool(packed & _L_STICK_PRESS_BIT),
+        "X_VALUE": _unpack_axis(packed, DIRECT_INPUT_LX_SHIFT),
+        "Y_VALUE": _unpack_axis(packed, DIRECT_INPUT_LY_SHIFT),
+        "LS_UP": False,
+        "LS_LEFT": False,
+        "LS_RIGHT": False,
+        "LS_DOWN": False
+    }
+    controller_input["R_STICK"] = {
+        "PRESSED": bool(packed & _R_STICK_PRESS_BIT),
+        "X_VALUE": _unpack_axis(packed, DIRECT_INPUT_RX_SHIFT),
+        "Y_VALUE": _unpack_axis(packed, DIRECT_INPUT_RY_SHIFT),
+        "RS_UP": False,
+        "RS_LEFT": False,
+        "RS_RIGHT": False,
+        "RS_DOWN": False
+    }
+
+    return controller_input
+
+
+class MacroLoop():
+    """A LOOP block within a compiled macro program. The body is kept
+    as a compiled program and is only repeated at execution time.
+    """
+
+    def __init__(self, count, body):
+
+        self.count = count
+        self.body = body
+
+
+class MacroExecutor():
+    """Lazily walks a compiled macro program, producing one macro step
+    at a time. Loops are tracked as (body, position, remaining count)
+    frames on a stack rather than being multiplied out, so memory use
+    does not depend on loop counts.
+
+    The executor is truthy while steps remain.
+    """
+
+    def __init__(self, program):
+
+        self._stack = [[program, 0, 1]]
+        self._next_step = self._advance()
+
+    def __bool__(self):
+
+        return self._next_step is not None
+
+    def __iter__(self):
+
+        return self
+
+    def __next__(self):
+
+        step = self.next_step()
+        if step is None:
+            raise StopIteration
+        return step
+
+    def next_step(self):
+        """Gets the next step of the macro.
+
+        :return: The next compiled macro step or None if the
+        macro has been completed
+        :rtype: tuple or None
+        """
+
+        step = self._next_step
+        if step is not None:
+            self._next_step = self._advance()
+        return step
+
+    def _advance(self):
+
+        stack = self._stack
+        while stack:
+            frame = stack[-1]
+            nodes = frame[0]
+            index = frame[1]
+            if index < len(nodes):
+                frame[1] = index + 1
+                node = nodes[index]
+                if type(node) is MacroLoop:
+                    stack.append([node.body, 0, node.count])
+                else:
+                    return node
+            else:
+                # Repeat the block until its count runs out
+                frame[2] -= 1
+                if frame[2] > 0:
+                    frame[1] = 0
+                else:
+                    stack.pop()
+
+        return None
+
+
+# The number of finished macro IDs kept in a controller's state
+FINISHED_MACRO_LOG_SIZE = 256
+
+
+def finished_macros_since(finished_macros, latest_cursor, cursor):
+    """Gets the macros that finished after a given cursor from a
+    finished macro log snapshot (see FinishedMacroLog).
+
+    :param finished_macros: The finished macro IDs, oldest first
+    :type finished_macros: list
+    :param latest_cursor: The cursor of the last finished macro
+    :type latest_cursor: int
+    :param cursor: The cursor to read from
+    :type cursor: int
+    :return: The latest cursor and the IDs of the macros that
+    finished after the given cursor, oldest first. If more macros
+    finished than the log holds, only the retained IDs are returned.
+    :rtype: tuple
+    """
+
+    count = latest_cursor - cursor
+    if count <= 0:
+        return latest_cursor, []
+    return latest_cursor, list(finished_macros[-count:])
+
+
+class FinishedMacroLog():
+    """A bounded log of finished macro IDs. Every finished macro is
+    assigned an increasing cursor, allowing readers to ask for the
+    macros that finished since a cursor they last saw. Only the most
+    recent entries are kept, and membership checks are O(1).
+    """
+
+    def __init__(self, size=FINISHED_MACRO_LOG_SIZE):
+
+        # (cursor, macro ID) pairs, oldest first
+        self._entries = deque(maxlen=size)
+        # The latest cursor of every retained macro ID
+        self._cursors = {}
+        self.cursor = 0
+
+    def __contains__(self, macro_id):
+
+        return macro_id in self._cursors
+
+    def __len__(self):
+
+        return len(self._entries)
+
+    def append(self, macro_id):
+        """Records a macro as finished.
+
+        :param macro_id: The ID of the finished macro
+        :type macro_id: str
+        :return: The cursor assigned to the macro
+        :rtype: int
+        """
+
+        entries = self._entries
+        if len(entries) == entries.maxlen:
+            cursor, evicted = entries[0]
+            # Only forget the ID if it wasn't recorded again since
+            if self._cursors.get(evicted) == cursor:
+                del self._cursors[evicted]
+
+        self.cursor += 1
+        entries.append((self.cursor, macro_id))
+        self._cursors[macro_id] = self.cursor
+
+        return self.cursor
+
+    def ids(self):
+        """Gets the retained finished macro IDs.
+
+        :return: The finished macro IDs, oldest first
+        :rtype: list
+        """
+
+        return [macro_id for _, macro_id in self._entries]
+
+    def since(self, cursor):
+        """Gets the macros that finished after a given cursor.
+
+        :param cursor: The cursor to read from
+        :type cursor: int
+        :return: The latest cursor and the IDs of the macros that
+        finished after the given cursor, oldest first
+        :rtype: tuple
+        """
+
+        return finished_macros_since(self.ids(), self.cursor, cursor)
+
+
 class InputParser():
 
     # Left Stick calibration values
@@ -79,14 +387,16 @@ class InputParser():
 
         self.protocol = protocol
 
-        # Buffers a list of unparsed macros
+        # Buffers a list of compiled macros
         self.macro_buffer = []
+        # Compiled registered macros, keyed by handle
+        self.registered_macros = {}
 
-        # Keeps track of the entire current
-        # list of macro commands.
+        # Keeps track of the remaining compiled
+        # steps of the current macro.
         self.current_macro = None
         self.current_macro_id = None
-        # Keeps track of the macro commands being
+        # Keeps track of the compiled macro step being
         # input over a period of time.
         self.current_macro_commands = None
 
@@ -96,19 +406,56 @@ class InputParser():
         # The start time for the current macro commands
         self.macro_timer_start = 0
 
-        self.controller_input = None
+        # The packed direct input for the current frame
+        self.controller_input = DIRECT_INPUT_IDLE
 
         # Whether or not input has been entered
         # that would close the "Change Grip/Order" menu
         self.exited_grip_order_menu = False
 
+        # An optional callable that is passed the ID of
+        # every macro that finishes or is stopped.
+        self.on_macro_finished = None
+
+        # The most recently finished macros
+        self.finished_macros = FinishedMacroLog()
+
+    def register_macro(self, handle, macro):
+        """Compiles a macro and registers it under a handle, so it can
+        be buffered by handle without being sent or compiled again.
+
+        :param handle: The handle of the macro
+        :type handle: int
+        :param macro: The macro string
+        :type macro: string
+        """
+
+        # Doesn't have any info
+        if len(macro) < 4:
+            self.registered_macros[handle] = None
+            return
+
+        self.registered_macros[handle] = self.compile_macro(macro)
+
     def buffer_macro(self, macro, macro_id):
 
+        # Registered macros are already compiled
+        if type(macro) is int:
+            program = self.registered_macros.get(macro)
+            if program is None:
+                self.finish_macro(macro_id)
+            else:
+                self.macro_buffer.append([program, macro_id])
+            return
+
         # Doesn't have any info
         if len(macro) < 4:
+            self.finish_macro(macro_id)
             return
 
-        self.macro_buffer.append([macro, macro_id])
+        # Compile the macro up front so that the per-frame work
+        # is reduced to reading precomputed report bytes.
+        self.macro_buffer.append([self.compile_macro(macro), macro_id])
 
     def stop_macro(self, macro_id, state=None):
 
@@ -125,19 +472,46 @@ class InputParser():
             for i in range(0, len(self.macro_buffer)):
                 if macro_id == self.macro_buffer[i][1]:
                     del self.macro_buffer[i]
+                    break
 
         # Ensure the stopped macro is added to the finished
         # macros so that any blocking parties listening can
         # continue.
-        if state:
-            finished = state["finished_macros"]
-            finished.append(macro_id)
-            state["finished_macros"] = finished
+        self.finish_macro(macro_id, state=state)
 
         return
 
+    def finish_macro(self, macro_id, state=None):
+        """Records a macro as finished, publishes the finished macro
+        log to the state and notifies the macro finished callback,
+        if set.
+
+        :param macro_id: The ID of the finished macro
+        :type macro_id: str
+        :param state: The controller state, defaults to None
+        :type state: dict, optional
+        """
+
+        cursor = self.finished_macros.append(macro_id)
+        if state is not None:
+            # A single bounded write, without reading the state back
+            state.update({
+                "finished_macros": self.finished_macros.ids(),
+                "finished_macros_cursor": cursor,
+            })
+
+        if self.on_macro_finished:
+            self.on_macro_finished(macro_id)
+
     def clear_macros(self):
 
+        # Notify any waiting parties of the cleared macros
+        if self.on_macro_finished:
+            if self.current_macro_id is not None:
+                self.on_macro_finished(self.current_macro_id)
+            for macro in self.macro_buffer:
+                self.on_macro_finished(macro[1])
+
         self.current_macro = None
         self.current_macro_id = None
         self.current_macro_commands = None
@@ -148,11 +522,19 @@ class InputParser():
         return
 
     def set_controller_input(self, controller_input):
+        """Sets the direct input for the next frame.
+
+        :param controller_input: An input packet dictionary or an input
+        packed with pack_controller_input
+        :type controller_input: dict or int
+        """
 
+        if type(controller_input) is dict:
+            controller_input = pack_controller_input(controller_input)
         self.controller_input = controller_input
-    
+
     def commands_queued(self):
-        check = dumps(self.controller_input) != dumps(DIRECT_INPUT_IDLE_PACKET)
+        check = bool(self.controller_input)
         check = check or self.macro_buffer
         check = check or self.current_macro
         check = check or self.current_macro_commands
@@ -166,40 +548,36 @@ class InputParser():
         :rtype: bool
         """
         if (self.current_macro_commands is not None):
-            if len(self.current_macro_commands) < 2:
-                return False
-            else:
-                return True
-        elif dumps(self.controller_input) != dumps(DIRECT_INPUT_IDLE_PACKET):
+            return not self.is_wait_step(self.current_macro_commands)
+        elif self.controller_input:
             return True
         else:
             return False
 
     def set_protocol_input(self, state=None):
 
-        # Act on direct input if we're not getting idle packets
-        if dumps(self.controller_input) != dumps(DIRECT_INPUT_IDLE_PACKET):
+        # Act on direct input if we're not getting idle packets.
+        # Idle input always packs to 0.
+        if self.controller_input:
             self.parse_controller_input(self.controller_input)
-            self.controller_input = None
+            self.controller_input = DIRECT_INPUT_IDLE
 
         elif (self.macro_buffer or self.current_macro or
               self.current_macro_commands):
             # Check if we can start on a new macro.
             if not self.current_macro and self.macro_buffer:
-                # Preprocess command lines of current macro
+                # Macros are compiled when buffered and
+                # expanded one step at a time.
                 macro = self.macro_buffer.pop(0)
-                self.current_macro = self.parse_macro(macro[0])
+                self.current_macro = MacroExecutor(macro[0])
                 self.current_macro_id = macro[1]
 
             # Check if we can load the next set of commands
             if not self.current_macro_commands and self.current_macro:
-                self.current_macro_commands = (
-                    self.current_macro.pop(0).strip(" ").split(" "))
+                self.current_macro_commands = self.current_macro.next_step()
 
-                # Timing metadata extraction
-                timer_length = self.current_macro_commands[-1]
-                timer_length = timer_length[0:len(timer_length)-1]
-                self.macro_timer_length = float(timer_length)
+                # Timing metadata is the last element of a compiled step
+                self.macro_timer_length = self.current_macro_commands[5]
                 self.macro_timer_start = perf_counter()
 
             self.set_macro_input(self.current_macro_commands)
@@ -209,305 +587,252 @@ class InputParser():
             if time_delta > self.macro_timer_length:
                 self.current_macro_commands = None
                 # Check if we're done the current macro
-                if not self.current_macro and state:
-                    finished = state["finished_macros"]
-                    finished.append(self.current_macro_id)
-                    state["finished_macros"] = finished
+                if not self.current_macro and self.current_macro_id is not None:
+                    self.finish_macro(self.current_macro_id, state=state)
+                    self.current_macro = None
+                    self.current_macro_id = None
 
     def parse_controller_input(self, controller_input):
 
+        if type(controller_input) is dict:
+            controller_input = pack_controller_input(controller_input)
         # Check for input validity
-        if type(controller_input) != dict:
+        elif type(controller_input) is not int:
             return
 
+        upper_byte = controller_input & 0xFF
+        shared_byte = (controller_input >> 8) & 0xFF
+        lower_byte = (controller_input >> 16) & 0xFF
+
         # Check if the Grip/Order menu would be closed
         if not self.exited_grip_order_menu and (
-                controller_input["A"] or controller_input["B"] or controller_input["HOME"]):
+                upper_byte & GRIP_MENU_UPPER_MASK or
+                shared_byte & GRIP_MENU_SHARED_MASK):
             self.exited_grip_order_menu = True
 
-        # Arrays representing the 3 button bytes in the
-        # standard input report as binary.
-        upper = ['0'] * 8
-        shared = ['0'] * 8
-        lower = ['0'] * 8
-        # Upper Byte
-        if controller_input["Y"]:
-            upper[7] = '1'
-        if controller_input["X"]:
-            upper[6] = '1'
-        if controller_input["B"]:
-            upper[5] = '1'
-        if controller_input["A"]:
-            upper[4] = '1'
-        if controller_input["JCL_SR"]:
-            upper[3] = '1'
-        if controller_input["JCL_SL"]:
-            upper[2] = '1'
-        if controller_input["R"]:
-            upper[1] = '1'
-        if controller_input["ZR"]:
-            upper[0] = '1'
-
-        # Shared byte
-        if controller_input["MINUS"]:
-            shared[6] = '1'
-        if controller_input["PLUS"]:
-            shared[7] = '1'
-        if controller_input["R_STICK"]["PRESSED"]:
-            shared[5] = '1'
-        if controller_input["L_STICK"]["PRESSED"]:
-            shared[4] = '1'
-        if controller_input["HOME"]:
-            shared[3] = '1'
-        if controller_input["CAPTURE"]:
-            shared[2] = '1'
-
-        # Lower byte
-        if controller_input["DPAD_DOWN"]:
-            lower[7] = '1'
-        if controller_input["DPAD_UP"]:
-            lower[6] = '1'
-        if controller_input["DPAD_RIGHT"]:
-            lower[5] = '1'
-        if controller_input["DPAD_LEFT"]:
-            lower[4] = '1'
-        if controller_input["JCR_SR"]:
-            lower[3] = '1'
-        if controller_input["JCR_SL"]:
-            lower[2] = '1'
-        if controller_input["L"]:
-            lower[1] = '1'
-        if controller_input["ZL"]:
-            lower[0] = '1'
-
         # Analog Stick Positions
         stick_left = self.stick_ratio_to_calibrated_position(
-            controller_input["L_STICK"]["X_VALUE"] / 100,
-            controller_input["L_STICK"]["Y_VALUE"] / 100,
+            _unpack_axis(controller_input, DIRECT_INPUT_LX_SHIFT) / 100,
+            _unpack_axis(controller_input, DIRECT_INPUT_LY_SHIFT) / 100,
             "L_STICK"
         )
         stick_right = self.stick_ratio_to_calibrated_position(
-            controller_input["R_STICK"]["X_VALUE"] / 100,
-            controller_input["R_STICK"]["Y_VALUE"] / 100,
+            _unpack_axis(controller_input, DIRECT_INPUT_RX_SHIFT) / 100,
+            _unpack_axis(controller_input, DIRECT_INPUT_RY_SHIFT) / 100,
             "R_STICK"
         )
 
-        # Converting binary strings to ints
-        upper_byte = int("".join(upper), 2)
-        shared_byte = int("".join(shared), 2)
-        lower_byte = int("".join(lower), 2)
-
         self.protocol.set_button_inputs(upper_byte, shared_byte, lower_byte)
         self.protocol.set_left_stick_inputs(stick_left)
         self.protocol.set_right_stick_inputs(stick_right)
 
         return controller_input
 
-    def parse_macro(self, macro):
+    def compile_macro(self, macro):
+        """Compiles a macro string into a program of steps that can be
+        written directly into the input report.
+
+        Each step is a tuple in the form of (upper, shared, lower,
+        left_stick, right_stick, duration), where the first three values
+        are the button bytes of the input report, the stick values are
+        either None (untouched) or the 3 calibrated stick bytes and the
+        duration is the length of the step in seconds.
+
+        LOOP blocks are kept as MacroLoop nodes and are expanded lazily
+        by a MacroExecutor. HOLD blocks are merged into the steps of
+        their body.
+
+        :param macro: The macro string
+        :type macro: string
+        :return: The compiled macro program
+        :rtype: list
+        """
 
         parsed = macro.split("\n")
         parsed = list(filter(lambda s: not s.strip() == "", parsed))
         parsed = list(filter(lambda s: not s.strip().startswith("#"), parsed))
-        parsed = self.parse_loops(parsed)
-        parsed = self.parse_holds(parsed)
 
-        return parsed
+        # Identical lines (common with holds) are only compiled once
+        return self.compile_block(parsed, {})
+
+    def compile_block(self, macro, compiled_lines):
+        """Compiles a list of macro lines at a single level of indentation.
 
-    def parse_loops(self, macro):
-        parsed = []
+        :param macro: The lines of the macro block
+        :type macro: list
+        :param compiled_lines: A cache of already compiled lines
+        :type compiled_lines: dict
+        :return: The compiled macro program
+        :rtype: list
+        """
+
+        program = []
         i = 0
         while i < len(macro):
             line = macro[i]
             if line.startswith("LOOP"):
                 loop_count = int(line.split(" ")[1])
-                loop_buffer = []
-
-                # Detect delimiter and record
-                if i + 1 < len(macro):
-                    if macro[i+1].startswith("\t"):
-                        loop_delimiter = "\t"
-                    elif macro[i+1].startswith("    "):
-                        loop_delimiter = "    "
-                    else:
-                        loop_delimiter = "  "
-                else:
-                    # Loop with no body - just ignore or break
-                    # Existing code would crash here likely so we fix it
-                    loop_delimiter = None
-
-                if loop_delimiter:
-                    # Gather looping commands
-                    for j in range(i+1, len(macro)):
-                        loop_line = macro[j]
-                        if loop_line.startswith(loop_delimiter):
-                            # Replace the first instance of the delimiter
-                            loop_line = loop_line.replace(loop_delimiter, "", 1)
-                            loop_buffer.append(loop_line)
-                        # Set the new position if we either encounter the end
-                        # of the loop or we reach the end of the macro
-                        else:
-                            i = j - 1
-                            break
-                        if j+1 >= len(macro):
-                            i = j
-
-                    # Recursively gather other loops if present
-                    if any(s.startswith("LOOP") for s in loop_buffer):
-                        loop_buffer = self.parse_loops(loop_buffer)
-                    # Multiply out the loop and concatenate
-                    parsed = parsed + (loop_buffer * loop_count)
-            else:
-                parsed.append(line)
-            i += 1
-
-        return parsed
+                loop_buffer, i = self.gather_block(macro, i)
+                body = self.compile_block(loop_buffer, compiled_lines)
+                # Loops without any steps are dropped
+                if body and loop_count > 0:
+                    program.append(MacroLoop(loop_count, body))
 
-    def parse_holds(self, macro):
-        parsed = []
-        i = 0
-        while i < len(macro):
-            line = macro[i]
-            if line.strip().startswith("HOLD "):
+            elif line.strip().startswith("HOLD "):
                 held_input = line.strip()[5:].strip()
-                hold_buffer = []
-
-                # Detect delimiter and record
-                if i + 1 < len(macro):
-                    next_line = macro[i+1]
-                    if next_line.startswith("\t"):
-                        hold_delimiter = "\t"
-                    elif next_line.startswith("    "):
-                        hold_delimiter = "    "
-                    elif next_line.startswith("  "):
-                        hold_delimiter = "  "
-                    else:
-                        hold_delimiter = None
-                else:
-                    hold_delimiter = None
-
-                if hold_delimiter:
-                    # Gather holding commands
-                    for j in range(i+1, len(macro)):
-                        hold_line = macro[j]
-                        if hold_line.startswith(hold_delimiter):
-                            # Replace the first instance of the delimiter
-                            hold_line = hold_line.replace(hold_delimiter, "", 1)
-                            hold_buffer.append(hold_line)
-                        else:
-                            i = j - 1
-                            break
-                        if j+1 >= len(macro):
-                            i = j
-
-                # Recursively process buffer
-                if hold_buffer:
-                    # Expand loops inside the hold block first
-                    hold_buffer = self.parse_loops(hold_buffer)
-                    # Then process nested holds
-                    hold_buffer = self.parse_holds(hold_buffer)
-                    
-                    # Apply held input
-                    for k in range(len(hold_buffer)):
-                        hold_buffer[k] = held_input + " " + hold_buffer[k]
-                    
+                hold_buffer, i = self.gather_block(macro, i)
+                body = self.compile_block(hold_buffer, compiled_lines)
+                if body:
+                    held = self.compile_macro_line(f"{held_input} 0.05s")
                     # Insert setup frame
-                    parsed.append(f"{held_input} 0.05s")
-                    parsed.extend(hold_buffer)
+                    program.append(held)
+                    program.extend(self.apply_held_input(held, body))
                     # Insert cooldown frame
-                    parsed.append(f"{held_input} 0.05s")
+                    program.append(held)
+
             else:
-                parsed.append(line)
+                step = compiled_lines.get(line)
+                if step is None:
+                    step = self.compile_macro_line(line)
+                    compiled_lines[line] = step
+                program.append(step)
             i += 1
-        
-        return parsed
 
-    def set_macro_input(self, macro_input):
+        return program
 
-        # Checking if this is a wait macro command
-        if len(macro_input) < 2:
-            return
+    def gather_block(self, macro, i):
+        """Gathers the indented lines belonging to the LOOP or HOLD
+        statement at the given index.
 
-        # Check if the Grip/Order menu would be closed
-        if not self.exited_grip_order_menu and (
-                'A' in macro_input or 'B' in macro_input or 'HOME' in macro_input):
-            self.exited_grip_order_menu = True
+        :param macro: The lines of the macro block
+        :type macro: list
+        :param i: The index of the LOOP/HOLD statement
+        :type i: int
+        :return: The block's lines with one level of indentation removed
+        and the index of the last line in the block
+        :rtype: tuple
+        """
 
-        # Arrays representing the 3 button bytes in the
-        # standard input report as binary.
-        upper = ['0'] * 8
-        shared = ['0'] * 8
-        lower = ['0'] * 8
-        # Analog stick byte placeholders
+        block = []
+
+        # Detect delimiter and record
+        delimiter = None
+        if i + 1 < len(macro):
+            next_line = macro[i+1]
+            if next_line.startswith("\t"):
+                delimiter = "\t"
+            elif next_line.startswith("    "):
+                delimiter = "    "
+            elif next_line.startswith("  "):
+                delimiter = "  "
+
+        if delimiter:
+            for j in range(i+1, len(macro)):
+                block_line = macro[j]
+                if not block_line.startswith(delimiter):
+                    break
+                # Replace the first instance of the delimiter
+                block.append(block_line.replace(delimiter, "", 1))
+                i = j
+
+        return block, i
+
+    def apply_held_input(self, held, program):
+        """Applies a held input to every step within a compiled program.
+        Held buttons are combined with each step's buttons, while a step's
+        own stick positions take priority over held stick positions.
+
+        :param held: The compiled step of the held input
+        :type held: tuple
+        :param program: The compiled macro program
+        :type program: list
+        :return: A new compiled program with the held input applied
+        :rtype: list
+        """
+
+        applied = []
+        for node in program:
+            if type(node) is MacroLoop:
+                applied.append(MacroLoop(
+                    node.count, self.apply_held_input(held, node.body)))
+            else:
+                applied.append((
+                    held[0] | node[0],
+                    held[1] | node[1],
+                    held[2] | node[2],
+                    node[3] if node[3] is not None else held[3],
+                    node[4] if node[4] is not None else held[4],
+                    node[5]))
+
+        return applied
+
+    def compile_macro_line(self, line):
+        """Compiles a single line of a macro (a set of inputs followed
+        by a duration) into a macro step.
+
+        :param line: The macro line. Eg: "A B 0.1s"
+        :type line: string
+        :return: The compiled macro step
+        :rtype: tuple
+        """
+
+        macro_input = line.strip(" ").split(" ")
+
+        # Timing metadata extraction
+        timer_length = macro_input[-1]
+        duration = float(timer_length[0:len(timer_length)-1])
+
+        button_bytes = [0x00] * 3
         stick_left = None
         stick_right = None
         for i in range(0, len(macro_input)-1):
             button = macro_input[i]
-            # Upper Byte
-            if button == "Y":
-                upper[7] = '1'
-            elif button == "X":
-                upper[6] = '1'
-            elif button == "B":
-                upper[5] = '1'
-            elif button == "A":
-                upper[4] = '1'
-            elif button == "JCL_SR":
-                upper[3] = '1'
-            elif button == "JCL_SL":
-                upper[2] = '1'
-            elif button == "R":
-                upper[1] = '1'
-            elif button == "ZR":
-                upper[0] = '1'
-
-            # Shared byte
-            elif button == "MINUS":
-                shared[7] = '1'
-            elif button == "PLUS":
-                shared[6] = '1'
-            elif button == "R_STICK_PRESS":
-                shared[5] = '1'
-            elif button == "L_STICK_PRESS":
-                shared[4] = '1'
-            elif button == "HOME":
-                shared[3] = '1'
-            elif button == "CAPTURE":
-                shared[2] = '1'
-
-            # Lower byte
-            elif button == "DPAD_DOWN":
-                lower[7] = '1'
-            elif button == "DPAD_UP":
-                lower[6] = '1'
-            elif button == "DPAD_RIGHT":
-                lower[5] = '1'
-            elif button == "DPAD_LEFT":
-                lower[4] = '1'
-            elif button == "JCR_SR":
-                lower[3] = '1'
-            elif button == "JCR_SL":
-                lower[2] = '1'
-            elif button == "L":
-                lower[1] = '1'
-            elif button == "ZL":
-                lower[0] = '1'
-
+            bit = BUTTON_BITS.get(button)
+            if bit is not None:
+                button_bytes[bit[0]] |= bit[1]
             # Analog Stick Positions
             elif button.startswith("L_STICK@"):
                 stick_left = self.parse_macro_stick_position(button)
             elif button.startswith("R_STICK@"):
                 stick_right = self.parse_macro_stick_position(button)
 
-        # Converting binary strings to ints
-        upper_byte = int("".join(upper), 2)
-        shared_byte = int("".join(shared), 2)
-        lower_byte = int("".join(lower), 2)
-
-        self.protocol.set_button_inputs(upper_byte, shared_byte, lower_byte)
         if stick_left:
-            self.protocol.set_left_stick_inputs(stick_left)
+            stick_left = bytes(stick_left)
         if stick_right:
-            self.protocol.set_right_stick_inputs(stick_right)
+            stick_right = bytes(stick_right)
+
+        return (button_bytes[0], button_bytes[1], button_bytes[2],
+                stick_left, stick_right, duration)
+
+    def is_wait_step(self, step):
+        """Checks if a compiled macro step sets no input.
+
+        :param step: A compiled macro step
+        :type step: tuple
+        :return: True if the step only waits, otherwise False
+        :rtype: bool
+        """
+
+        return (not (step[0] or step[1] or step[2]) and
+                step[3] is None and step[4] is None)
+
+    def set_macro_input(self, step):
+
+        # Checking if this is a wait macro command
+        if step is None or self.is_wait_step(step):
+            return
+
+        # Check if the Grip/Order menu would be closed
+        if not self.exited_grip_order_menu and (
+                step[0] & GRIP_MENU_UPPER_MASK or
+                step[1] & GRIP_MENU_SHARED_MASK):
+            self.exited_grip_order_menu = True
+
+        self.protocol.set_button_inputs(step[0], step[1], step[2])
+        if step[3]:
+            self.protocol.set_left_stick_inputs(step[3])
+        if step[4]:
+            self.protocol.set_right_stick_inputs(step[4])
 
     def parse_macro_stick_position(self, stick_pos):
 
@@ -0,0 +1,173 @@
+class Histogram():
+    """A log-linear histogram of durations, in the style of an HDR
+    histogram. Durations are recorded in microseconds into buckets
+    that are linear within each power of two, keeping the relative
+    error of every bucket within about 6% at a fixed memory cost.
+
+    Recording a duration is a handful of integer operations, so
+    histograms can be kept on the controllers' hot paths.
+    """
+
+    # Each power of two is split into 2 ** SUB_BUCKET_BITS buckets
+    SUB_BUCKET_BITS = 4
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    # Durations above 2 ** 26 microseconds (~67 s) are clamped
+    MAX_VALUE = (1 << 26) - 1
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self):
+
+        self.counts = [0] * (self.bucket_index(self.MAX_VALUE) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def bucket_index(cls, value):
+        """Gets the bucket a value in microseconds is counted in.
+
+        :param value: The value in microseconds
+        :type value: int
+        :return: The index of the bucket
+        :rtype: int
+        """
+
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS - 1
+        if shift <= 0:
+            return value
+        return (shift << cls.SUB_BUCKET_BITS) + (value >> shift)
+
+    @classmethod
+    def bucket_bounds(cls, index):
+        """Gets the range of values counted in a bucket.
+
+        :param index: The index of the bucket
+        :type index: int
+        :return: The lowest and highest values in microseconds
+        :rtype: tuple
+        """
+
+        if index < 2 * cls.SUB_BUCKETS:
+            return index, index
+        shift = (index >> cls.SUB_BUCKET_BITS) - 1
+        mantissa = (index & (cls.SUB_BUCKETS - 1)) + cls.SUB_BUCKETS
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, duration):
+        """Records a duration.
+
+        :param duration: The duration in seconds
+        :type duration: float
+        """
+
+        value = int(duration * 1000000)
+        if value < 0:
+            value = 0
+        elif value > self.MAX_VALUE:
+            value = self.MAX_VALUE
+
+        self.counts[self.bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile):
+        """Gets the value at a percentile of the recorded durations.
+
+        :param percentile: The percentile, from 0 to 100
+        :type percentile: float
+        :return: The highest value in the percentile's bucket,
+        in seconds
+        :rtype: float
+        """
+
+        if not self.count:
+            return 0
+
+        target = max(1, round(self.count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_bounds(index)[1], self.max) / 1000000
+
+        return self.max / 1000000
+
+    def snapshot(self):
+        """Gets a summary of the recorded durations.
+
+        :return: The count, min, max, mean and percentiles of the
+        durations in seconds, and the non-empty buckets as a list of
+        (upper bound in seconds, count) pairs
+        :rtype: dict
+        """
+
+        snapshot = {
+            "count": self.count,
+            "min": (self.min or 0) / 1000000,
+            "max": self.max / 1000000,
+            "mean": self.total / self.count / 1000000 if self.count else 0,
+        }
+        for percentile in self.PERCENTILES:
+            snapshot[f"p{percentile:g}"] = self.percentile(percentile)
+        snapshot["buckets"] = [
+            ((self.bucket_bounds(index)[1] + 1) / 1000000, count)
+            for index, count in enumerate(self.counts) if count]
+
+        return snapshot
+
+
+class ControllerMetrics():
+    """Latency histograms and event counters for a single controller.
+
+    Histograms:
+    - frame_period: The time between the starts of scheduled frames
+    - processing_time: The time taken to build a frame's report
+    - send_latency: The time taken to send a report to the Switch
+    - subcommand_rtt: The time from receiving a subcommand to
+      sending its reply
+
+    Counters:
+    - blocking_io_errors: Reports dropped due to a full send buffer
+    - skipped_sends: Reports not sent since they were unchanged
+    - reconnects: Attempts to recover a lost connection
+    - coalesced_inputs: Direct inputs replaced by a newer input
+      before a frame could apply them
+    """
+
+    HISTOGRAMS = ("frame_period", "processing_time",
+                  "send_latency", "subcommand_rtt")
+    COUNTERS = ("blocking_io_errors", "skipped_sends", "reconnects",
+                "coalesced_inputs")
+
+    def __init__(self):
+
+        self.frame_period = Histogram()
+        self.processing_time = Histogram()
+        self.send_latency = Histogram()
+        self.subcommand_rtt = Histogram()
+
+        self.blocking_io_errors = 0
+        self.skipped_sends = 0
+        self.reconnects = 0
+        self.coalesced_inputs = 0
+
+    def snapshot(self):
+        """Gets a snapshot of all metrics.
+
+        :return: The histogram snapshots and counters, keyed by name
+        :rtype: dict
+        """
+
+        snapshot = {}
+        for name in self.HISTOGRAMS:
+            snapshot[name] = getattr(self, name).snapshot()
+        for name in self.COUNTERS:
+            snapshot[name] = getattr(self, name)
+
+        return snapshot
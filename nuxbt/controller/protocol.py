@@ -3,7 +3,6 @@ import random
 from time import perf_counter
 
 from .controller import ControllerTypes
-from .utils import replace_subarray
 
 
 class SwitchResponses(Enum):
@@ -41,6 +40,14 @@ class ControllerProtocol():
         }
     }
     VIBRATOR_BYTES = [0xA0, 0xB0, 0xC0, 0x90]
+    SPI_FLASH_SIZE = 0x80000
+    # Cached SPI flash images, keyed by controller type and colours
+    SPI_FLASH_IMAGES = {}
+    IMU_DATA = bytes([
+        0x75, 0xFD, 0xFD, 0xFF, 0x09, 0x10, 0x21, 0x00, 0xD5, 0xFF,
+        0xE0, 0xFF, 0x72, 0xFD, 0xF9, 0xFF, 0x0A, 0x10, 0x22, 0x00,
+        0xD5, 0xFF, 0xE0, 0xFF, 0x76, 0xFD, 0xFC, 0xFF, 0x09, 0x10,
+        0x23, 0x00, 0xD5, 0xFF, 0xE0, 0xFF])
 
     def __init__(self, controller_type, bt_address, report_size=50,
                  colour_body=None, colour_buttons=None):
@@ -69,9 +76,15 @@ class ControllerProtocol():
         else:
             raise ValueError("Unknown controller type specified")
 
-        self.report = None
+        # Reports are written in place into one of two preallocated
+        # buffers. The buffers are swapped on every get_report call,
+        # so a returned report stays intact until the next call.
         self.report_size = report_size
-        self.set_empty_report()
+        self._empty_report = bytes([0xA1]) + bytes(report_size - 1)
+        self.report = bytearray(self._empty_report)
+        self._report_view = memoryview(self.report)
+        self._next_report = bytearray(self._empty_report)
+        self._next_report_view = memoryview(self._next_report)
 
         # Input report mode
         self.mode = None
@@ -128,83 +141,80 @@ class ControllerProtocol():
         else:
             self.colour_buttons = colour_buttons
 
+        # A reusable parser for the Switch's messages and the
+        # handlers for each subcommand, keyed by subcommand ID.
+        self._message = SwitchReportParser()
+        self._subcommand_handlers = {
+            0x02: self.request_device_info,
+            0x08: self.set_shipment,
+            0x10: self.spi_read,
+            0x03: self.set_mode,
+            0x04: self.set_trigger_buttons,
+            0x40: self.toggle_imu,
+            0x48: self.enable_vibration,
+            0x30: self.set_player_lights,
+            0x22: self.set_nfc_ir_state,
+            0x21: self.set_nfc_ir_config,
+        }
+
+        # SPI flash images are shared by all controllers
+        # of the same type and colours
+        flash_key = (self.controller_type, tuple(self.colour_body),
+                     tuple(self.colour_buttons))
+        self.spi_flash = self.SPI_FLASH_IMAGES.get(flash_key)
+        if self.spi_flash is None:
+            self.spi_flash = self.create_spi_flash()
+            self.SPI_FLASH_IMAGES[flash_key] = self.spi_flash
+
     def get_report(self):
+        """Gets the current input report and starts a new, empty one.
 
-        report = bytes(self.report)
-        # Clear report
+        :return: A view of the report. The view is only valid until
+        the next call, after which its buffer is reused.
+        :rtype: memoryview
+        """
+
+        report = self._report_view
+        # Swap buffers and clear the new current report
+        self.report, self._next_report = self._next_report, self.report
+        self._report_view, self._next_report_view = (
+            self._next_report_view, self._report_view)
         self.set_empty_report()
         return report
 
     def process_commands(self, data):
 
+        # Nothing was received from the Switch
+        if not data:
+            self.set_full_input_report()
+            return
+
         # Parsing the Switch's message
-        message = SwitchReportParser(data)
+        message = self._message
+        message.parse(data)
 
         # Responding to the parsed message
-        if message.response == SwitchResponses.REQUEST_DEVICE_INFO:
-            self.device_info_queried = True
-            self.set_subcommand_reply()
-            self.set_device_info()
-
-        elif message.response == SwitchResponses.SET_SHIPMENT:
-            self.set_subcommand_reply()
-            self.set_shipment()
-
-        elif message.response == SwitchResponses.SPI_READ:
-            self.set_subcommand_reply()
-            self.spi_read(message)
-
-        elif message.response == SwitchResponses.SET_MODE:
-            self.set_subcommand_reply()
-            self.set_mode(message)
-
-        elif message.response == SwitchResponses.TRIGGER_BUTTONS:
-            self.set_subcommand_reply()
-            self.set_trigger_buttons()
-
-        elif message.response == SwitchResponses.TOGGLE_IMU:
-            self.set_subcommand_reply()
-            self.toggle_imu(message)
-
-        elif message.response == SwitchResponses.ENABLE_VIBRATION:
-            self.set_subcommand_reply()
-            self.enable_vibration()
-
-        elif message.response == SwitchResponses.SET_PLAYER:
-            self.set_subcommand_reply()
-            self.set_player_lights(message)
-
-        elif message.response == SwitchResponses.SET_NFC_IR_STATE:
-            self.set_subcommand_reply()
-            self.set_nfc_ir_state()
-
-        elif message.response == SwitchResponses.SET_NFC_IR_CONFIG:
+        handler = self._subcommand_handlers.get(message.subcommand_id)
+        if handler:
             self.set_subcommand_reply()
-            self.set_nfc_ir_config()
-
-        # Bad Packet handling statements
-        elif message.response == SwitchResponses.UNKNOWN_SUBCOMMAND:
-            # Currently set so that the controller ignores any unknown
-            # subcommands. This is better than sending a NACK response
-            # since we'd just get stuck in an infinite loop arguing
-            # with the Switch.
-            self.set_full_input_report()
-
-        elif message.response == SwitchResponses.NO_DATA:
+            handler(message)
+        else:
+            # Unknown subcommands and bad packets are ignored. This is
+            # better than sending a NACK response since we'd just get
+            # stuck in an infinite loop arguing with the Switch.
             self.set_full_input_report()
 
-        elif message.response == SwitchResponses.TOO_SHORT:
-            self.set_full_input_report()
+    def request_device_info(self, message=None):
 
-        elif message.response == SwitchResponses.MALFORMED:
-            self.set_full_input_report()
+        self.device_info_queried = True
+        # The standard input report includes the controller's input
+        # once device info has been queried, so it's rewritten.
+        self.set_standard_input_report()
+        self.set_device_info()
 
     def set_empty_report(self):
 
-        empty_report = [0] * self.report_size
-        empty_report[0] = 0xA1
-
-        self.report = empty_report
+        self.report[:] = self._empty_report
 
     def set_subcommand_reply(self):
 
@@ -294,7 +304,7 @@ class ControllerProtocol():
         self.report[11] = right[1]
         self.report[12] = right[2]
 
-    def set_device_info(self):
+    def set_device_info(self, message=None):
 
         # ACK Reply
         self.report[14] = 0x82
@@ -328,7 +338,7 @@ class ControllerProtocol():
         # Controller colours location (read from SPI)
         self.report[27] = 0x01
 
-    def set_shipment(self):
+    def set_shipment(self, message=None):
 
         # ACK Reply
         self.report[14] = 0x80
@@ -354,17 +364,14 @@ class ControllerProtocol():
         if not self.imu_enabled:
             return
 
-        imu_data = [0x75, 0xFD, 0xFD, 0xFF, 0x09, 0x10, 0x21, 0x00, 0xD5, 0xFF,
-                    0xE0, 0xFF, 0x72, 0xFD, 0xF9, 0xFF, 0x0A, 0x10, 0x22, 0x00,
-                    0xD5, 0xFF, 0xE0, 0xFF, 0x76, 0xFD, 0xFC, 0xFF, 0x09, 0x10,
-                    0x23, 0x00, 0xD5, 0xFF, 0xE0, 0xFF]
-        replace_subarray(self.report, 14, 49, replace_arr=imu_data)
+        self.report[14:14 + len(self.IMU_DATA)] = self.IMU_DATA
 
     def spi_read(self, message):
 
-        addr_top = message.subcommand[2]
-        addr_bottom = message.subcommand[1]
-        read_length = message.subcommand[5]
+        subcommand = message.subcommand
+        address = (subcommand[1] | subcommand[2] << 8 |
+                   subcommand[3] << 16 | subcommand[4] << 24)
+        read_length = subcommand[5]
 
         # ACK byte
         self.report[14] = 0x90
@@ -373,12 +380,72 @@ class ControllerProtocol():
         self.report[15] = 0x10
 
         # Read address
-        self.report[16] = addr_bottom
-        self.report[17] = addr_top
+        self.report[16:20] = subcommand[1:5]
 
         # Read length
         self.report[20] = read_length
 
+        # Data read from the flash image. Reads past
+        # the end of flash return erased (0xFF) bytes.
+        read_length = min(read_length, self.report_size - 21)
+        data = self.spi_flash[address:address + read_length]
+        self.report[21:21 + len(data)] = data
+        self.report[21 + len(data):21 + read_length] = (
+            b"\xFF" * (read_length - len(data)))
+
+    def create_spi_flash(self):
+        """Creates an image of the controller's SPI flash memory
+        with the factory configuration and calibration the Switch
+        reads while pairing. All other addresses read as erased.
+
+        :return: The SPI flash image
+        :rtype: bytes
+        """
+
+        flash = bytearray(b"\xFF" * self.SPI_FLASH_SIZE)
+
+        # Serial number (0x6000)
+        # Left erased, which the Switch takes as no serial number
+
+        # Six-Axis motion sensor factory calibration (0x6020)
+        # 1: Acceleration origin position
+        # 2: Acceleration sensitivity coefficient
+        # 3: Gyro origin when still
+        # 4: Gyro sensitivity coefficient
+        flash[0x6020:0x6038] = bytes([
+            0xD3, 0xFF, 0xD5, 0xFF, 0x55, 0x01,  # 1
+            0x00, 0x40, 0x00, 0x40, 0x00, 0x40,  # 2
+            0x19, 0x00, 0xDD, 0xFF, 0xDC, 0xFF,  # 3
+            0x3B, 0x34, 0x3B, 0x34, 0x3B, 0x34])  # 4
+
+        # Factory analog stick calibration (0x603D)
+        # Sticks that aren't present are left erased
+        if not self.controller_type == ControllerTypes.JOYCON_R:
+            flash[0x603D:0x6046] = bytes([
+                0xBA, 0xF5, 0x62,
+                0x6F, 0xC8, 0x77,
+                0xED, 0x95, 0x5B])
+        if not self.controller_type == ControllerTypes.JOYCON_L:
+            flash[0x6046:0x604F] = bytes([
+                0x16, 0xD8, 0x7D,
+                0xF2, 0xB5, 0x5F,
+                0x86, 0x65, 0x5E])
+
+        # Colours (0x6050)
+        # Body colour
+        flash[0x6050:0x6053] = bytes(self.colour_body)
+        # Buttons colour
+        flash[0x6053:0x6056] = bytes(self.colour_buttons)
+        # Left/right grip colours (Pro controller) are left erased
+
+        # Six-Axis horizontal offsets (0x6080)
+        if self.controller_type == ControllerTypes.PRO_CONTROLLER:
+            flash[0x6080:0x6086] = bytes([0x50, 0xFD, 0x00, 0x00, 0xC6, 0x0F])
+        elif self.controller_type == ControllerTypes.JOYCON_L:
+            flash[0x6080:0x6086] = bytes([0x5E, 0x01, 0x00, 0x00, 0xF1, 0x0F])
+        else:
+            flash[0x6080:0x6086] = bytes([0x5E, 0x01, 0x00, 0x00, 0x0F, 0xF0])
+
         # Stick Parameters
         # Params are generally the same for all sticks
         # Notable difference is the deadzone (10% Joy-Con vs 15% Pro Con)
@@ -392,112 +459,16 @@ class ControllerProtocol():
         if not self.controller_type == ControllerTypes.PRO_CONTROLLER:
             params[3] = 0xAE
 
-        # Serial Number read
-        if addr_top == 0x60 and addr_bottom == 0x00:
-            # Switch will take this as no serial number
-            replace_subarray(self.report, 21, 16, 0xFF)
-
-        # Colours
-        elif addr_top == 0x60 and addr_bottom == 0x50:
-            # Body colour
-            replace_subarray(
-                self.report, 21, 3,
-                replace_arr=self.colour_body)
-            # Buttons colour
-            replace_subarray(
-                self.report, 24, 3,
-                replace_arr=self.colour_buttons)
-            # Left/right grip colours (Pro controller)
-            replace_subarray(self.report, 27, 7, 0xFF)
-
-        # Factory sensor/stick device parameters
-        elif addr_top == 0x60 and addr_bottom == 0x80:
-
-            # Six-Axis factory parameters
-            if self.controller_type == ControllerTypes.PRO_CONTROLLER:
-                self.report[21] = 0x50
-                self.report[22] = 0xFD
-                self.report[23] = 0x00
-                self.report[24] = 0x00
-                self.report[25] = 0xC6
-                self.report[26] = 0x0F
-            else:
-                self.report[21] = 0x5E
-                self.report[22] = 0x01
-                self.report[23] = 0x00
-                self.report[24] = 0x00
-                if self.controller_type == ControllerTypes.JOYCON_L:
-                    self.report[25] = 0xF1
-                    self.report[26] = 0x0F
-                else:
-                    self.report[25] = 0x0F
-                    self.report[26] = 0xF0
-
-            replace_subarray(self.report, 27, 18, replace_arr=params)
-
-        # Stick device parameters 2
-        elif addr_top == 0x60 and addr_bottom == 0x98:
-
-            # Setting same params since controllers always
-            # have duplicates of stick params 1 for stick params 2
-            replace_subarray(self.report, 21, 18, replace_arr=params)
-
-        # User analog stick calibration
-        elif addr_top == 0x80 and addr_bottom == 0x10:
-
-            # Fill report with null user calibration info
-            replace_subarray(self.report, 21, 24, 0xFF)
-
-        # Factory analog stick calibration
-        elif addr_top == 0x60 and addr_bottom == 0x3D:
-
-            # Left/right stick calibration
-            l_calibration = [0xBA, 0xF5, 0x62,
-                             0x6F, 0xC8, 0x77,
-                             0xED, 0x95, 0x5B]
-            r_calibration = [0x16, 0xD8, 0x7D,
-                             0xF2, 0xB5, 0x5F,
-                             0x86, 0x65, 0x5E]
-
-            # Left stick calibration
-            # If null, fill with 0xFF
-            if not self.controller_type == ControllerTypes.JOYCON_R:
-                replace_subarray(self.report, 21, 9, replace_arr=l_calibration)
-            else:
-                replace_subarray(self.report, 21, 9, value=0xFF)
-
-            # Right stick calibration
-            # If null, fill with 0xFF
-            if not self.controller_type == ControllerTypes.JOYCON_L:
-                replace_subarray(self.report, 30, 9, replace_arr=r_calibration)
-            else:
-                replace_subarray(self.report, 30, 9, value=0xFF)
-
-            # Spacer byte
-            self.report[39] = 0xFF
-
-            # Body colour
-            replace_subarray(
-                self.report, 40, 3,
-                replace_arr=self.colour_body)
-            # Buttons colour
-            replace_subarray(
-                self.report, 43, 3,
-                replace_arr=self.colour_buttons)
-
-        # Six-Axis motion sensor factor calibration
-        elif addr_top == 0x60 and addr_bottom == 0x20:
-
-            # 1: Acceleration origin position
-            # 2: Acceleration sensitivity coefficient
-            # 3: Gyro origin when still
-            # 4: Gyro sensitivity coefficient
-            sa_calibration = [0xD3, 0xFF, 0xD5, 0xFF, 0x55, 0x01,  # 1
-                              0x00, 0x40, 0x00, 0x40, 0x00, 0x40,  # 2
-                              0x19, 0x00, 0xDD, 0xFF, 0xDC, 0xFF,  # 3
-                              0x3B, 0x34, 0x3B, 0x34, 0x3B, 0x34]  # 4
-
-            replace_subarray(self.report, 21, 24, replace_arr=sa_calibration)
+        # Stick device parameters 1 and 2 (0x6086, 0x6098)
+        # Controllers always have duplicates of stick
+        # params 1 for stick params 2
+        flash[0x6086:0x6098] = bytes(params)
+        flash[0x6098:0x60AA] = bytes(params)
+
+        # User analog stick calibration (0x8010)
+        # Left erased, meaning no user calibration
+
+        return bytes(flash)
 
     def set_mode(self, message):
 
@@ -514,7 +485,7 @@ class ControllerProtocol():
         elif message.subcommand[1] == 0x3F:
             self.mode = "simpleHID"
 
-    def set_trigger_buttons(self):
+    def set_trigger_buttons(self, message=None):
 
         # ACK byte
         self.report[14] = 0x83
@@ -522,7 +493,7 @@ class ControllerProtocol():
         # Subcommand reply
         self.report[15] = 0x04
 
-    def enable_vibration(self):
+    def enable_vibration(self, message=None):
 
         # ACK Reply
         self.report[14] = 0x82
@@ -552,7 +523,7 @@ class ControllerProtocol():
         elif bitfield == 0x0F or bitfield == 0xF0:
             self.player_number = 4
 
-    def set_nfc_ir_state(self):
+    def set_nfc_ir_state(self, message=None):
 
         # ACK byte
         self.report[14] = 0x80
@@ -560,7 +531,7 @@ class ControllerProtocol():
         # Subcommand reply
         self.report[15] = 0x22
 
-    def set_nfc_ir_config(self):
+    def set_nfc_ir_config(self, message=None):
 
         # ACK byte
         self.report[14] = 0xA0
@@ -569,12 +540,15 @@ class ControllerProtocol():
         self.report[15] = 0x21
 
         # NFC/IR state data
-        params = [0x01, 0x00, 0xFF, 0x00, 0x08, 0x00, 0x1B, 0x01]
-        replace_subarray(self.report, 16, 8, replace_arr=params)
+        self.report[16:24] = b"\x01\x00\xFF\x00\x08\x00\x1B\x01"
         self.report[49] = 0xC8
 
 
 class SwitchReportParser():
+    """Parses messages from the Switch. A parser can be reused for
+    any number of messages and doesn't copy the message data. The
+    payload and subcommand are views into the parsed message.
+    """
 
     SUBCOMMANDS = {
         0x02: SwitchResponses.REQUEST_DEVICE_INFO,
@@ -589,30 +563,52 @@ class SwitchReportParser():
         0x21: SwitchResponses.SET_NFC_IR_CONFIG,
     }
 
-    def __init__(self, data, data_length=50):
+    # The location of the payload/subcommand split
+    SUBCOMMAND_OFFSET = 11
+
+    def __init__(self, data=None, data_length=50):
+
+        self.data_length = data_length
+        self.parse(data)
+
+    def parse(self, data):
+        """Parses a message from the Switch.
+
+        :param data: The message
+        :type data: bytes, bytearray or memoryview
+        :return: The type of the message
+        :rtype: SwitchResponses
+        """
+
+        self.data = data
+        self.subcommand_id = None
 
         # Non-data check
         if not data:
             self.response = SwitchResponses.NO_DATA
-            return
 
         # Report length check
-        if len(data) < data_length:
+        elif len(data) < self.data_length:
             self.response = SwitchResponses.TOO_SHORT
-            return
 
         # First byte check
-        if data[0] != 0xA2:
+        elif data[0] != 0xA2:
             self.response = SwitchResponses.MALFORMED
-            return
-
-        # Splitting data
-        self.payload = data[:11]
-        self.subcommand = data[11:]
-        self.subcommand_id = self.subcommand[0]
 
         # Parsing the subcommand
-        if self.subcommand[0] in self.SUBCOMMANDS.keys():
-            self.response = self.SUBCOMMANDS[self.subcommand[0]]
         else:
-            self.response = SwitchResponses.UNKNOWN_SUBCOMMAND
+            self.subcommand_id = data[self.SUBCOMMAND_OFFSET]
+            self.response = self.SUBCOMMANDS.get(
+                self.subcommand_id, SwitchResponses.UNKNOWN_SUBCOMMAND)
+
+        return self.response
+
+    @property
+    def payload(self):
+
+        return memoryview(self.data)[:self.SUBCOMMAND_OFFSET]
+
+    @property
+    def subcommand(self):
+
+        return memoryview(self.data)[self.SUBCOMMAND_OFFSET:]
@@ -0,0 +1,124 @@
+import time
+
+
+class FrameScheduler():
+    """Schedules frames against absolute deadlines. The deadline of
+    every frame is computed from the start time and the frame index,
+    so oversleeping or slow frames never push back later frames.
+
+    Frames that start less than a period late are run immediately to
+    catch up. When a frame starts a whole period or more late, the
+    missed frames are skipped rather than run back to back.
+
+    Sleeping may optionally be followed by a busy wait for the last
+    stretch before a deadline, trading CPU time for lower jitter.
+    """
+
+    def __init__(self, frequency=132, spin_time=0):
+        """Creates a frame scheduler.
+
+        :param frequency: The number of frames per second,
+        defaults to 132
+        :type frequency: int, optional
+        :param spin_time: The time in seconds before each deadline
+        that is busy waited instead of slept, defaults to 0
+        :type spin_time: float, optional
+        """
+
+        self.period = 1 / frequency
+        self.spin_time = spin_time
+
+        self.start_time = None
+        self.frame = 0
+        self.deadline = None
+
+        # Lateness of the last frame, in seconds
+        self.lateness = 0
+        self.skipped_frames = 0
+
+        # Lateness statistics since the last snapshot
+        self._window_frames = 0
+        self._window_lateness = 0
+        self._window_max_lateness = 0
+        self._window_skipped_frames = 0
+
+    def start(self):
+        """Starts scheduling with the first frame due immediately."""
+
+        self.start_time = time.perf_counter()
+        self.frame = 0
+        self.deadline = self.start_time
+
+    def time_until_deadline(self):
+        """Gets the time left until the next frame is due.
+
+        :return: The time left in seconds. Negative if the
+        deadline has passed.
+        :rtype: float
+        """
+
+        return self.deadline - time.perf_counter()
+
+    def wait(self):
+        """Blocks until the next frame is due."""
+
+        deadline = self.deadline
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+        if self.spin_time:
+            while time.perf_counter() < deadline:
+                pass
+
+    def next_frame(self):
+        """Begins the frame that is due and schedules the one after it.
+        Should be called at the start of every frame.
+
+        :return: How late the frame started, in seconds
+        :rtype: float
+        """
+
+        lateness = time.perf_counter() - self.deadline
+        if lateness < 0:
+            lateness = 0
+
+        if lateness >= self.period:
+            missed = int(lateness / self.period)
+            self.frame += missed
+            self.skipped_frames += missed
+            self._window_skipped_frames += missed
+
+        self.frame += 1
+        self.deadline = self.start_time + self.frame * self.period
+
+        self.lateness = lateness
+        self._window_frames += 1
+        self._window_lateness += lateness
+        if lateness > self._window_max_lateness:
+            self._window_max_lateness = lateness
+
+        return lateness
+
+    def snapshot(self):
+        """Gets the frame lateness statistics since the last snapshot
+        and starts a new statistics window.
+
+        :return: The number of frames run, the mean and max lateness
+        of the frames in seconds, and the number of skipped frames
+        :rtype: dict
+        """
+
+        frames = self._window_frames
+        snapshot = {
+            "frames": frames,
+            "mean_lateness": self._window_lateness / frames if frames else 0,
+            "max_lateness": self._window_max_lateness,
+            "skipped_frames": self._window_skipped_frames,
+        }
+
+        self._window_frames = 0
+        self._window_lateness = 0
+        self._window_max_lateness = 0
+        self._window_skipped_frames = 0
+
+        return snapshot
@@ -1,4 +1,5 @@
 import socket
+import selectors
 import fcntl
 import os
 import time
@@ -6,21 +7,54 @@ import queue
 import logging
 import traceback
 import atexit
+from contextlib import nullcontext
+from enum import IntEnum
 from threading import Thread
-import statistics as stat
 
 from .controller import Controller, ControllerTypes
-from ..bluez import BlueZ, find_devices_by_alias
+from ..bluez import BlueZ, find_devices_by_alias, get_signal_bus, get_device_index
+from ..bluez import SERVICE_NAME, DEVICE_INTERFACE, PROPERTIES_INTERFACE
 from .protocol import ControllerProtocol
 from .input import InputParser
+from .direct_input import DirectInputSlot
+from .scheduler import FrameScheduler
+from .metrics import ControllerMetrics
 from .utils import format_msg_controller, format_msg_switch
 
 
+class ControllerTasks(IntEnum):
+    """The types of tasks passed to a controller server's task queue.
+    Tasks are compact tuples of a task type and its arguments:
+
+    - (MACROS, [(macro, macro_id), ...]): Buffers a batch of macros.
+      Each macro is either a macro string or the handle of a
+      registered macro.
+    - (STOP_MACRO, macro_id): Stops a queued or running macro.
+    - (CLEAR_MACROS,): Clears all queued and running macros.
+    - (REGISTER_MACRO, handle, macro): Compiles a macro string and
+      registers it under an integer handle.
+    """
+
+    MACROS = 0
+    STOP_MACRO = 1
+    CLEAR_MACROS = 2
+    REGISTER_MACRO = 3
+
+
 class ControllerServer():
 
+    # The input report rate of the mainloop, in Hz
+    FREQUENCY = 132
+    # How often the connection reset watchdog checks if it should stop,
+    # in seconds
+    WATCHDOG_STOP_INTERVAL = 0.5
+    # The alias of the devices watched by the connection reset watchdog
+    SWITCH_ALIAS = "Nintendo Switch"
+
     def __init__(self, controller_type, adapter_path="/org/bluez/hci0",
-                 state=None, task_queue=None, lock=None, colour_body=None,
-                 colour_buttons=None):
+                 state=None, task_queue=None, lock=None, adapter_lock=None,
+                 colour_body=None, colour_buttons=None, direct_input_slot=None,
+                 macro_completion_queue=None, frame_spin_time=0):
 
         self.logger = logging.getLogger('nuxbt')
         # Cache logging level to increase performance on checks
@@ -34,21 +68,41 @@ class ControllerServer():
             self.state = {
                 "state": "",
                 "finished_macros": [],
+                "finished_macros_cursor": 0,
                 "errors": None,
                 "direct_input": None
             }
 
         self.task_queue = task_queue
 
+        # Shared memory slot for direct input. If unavailable, direct
+        # input is read from the state dictionary instead.
+        self.direct_input_slot = None
+        # The slot's sequence number as of the last frame
+        self.direct_input_sequence = 0
+        if direct_input_slot:
+            self.direct_input_slot = DirectInputSlot(name=direct_input_slot)
+
         self.controller_type = controller_type
         self.colour_body = colour_body
         self.colour_buttons = colour_buttons
 
-        if lock:
-            self.lock = lock
+        # The lock shared by all controllers is held while configuring
+        # the adapter over D-Bus. The adapter's own lock is held while
+        # waiting to pair or reconnect, so that a controller waiting for
+        # a Switch doesn't block the other adapters.
+        self.lock = lock if lock else nullcontext()
+        self.adapter_lock = adapter_lock if adapter_lock else nullcontext()
 
         self.reconnect_counter = 0
 
+        # Set once the controller is removed, aborting any connection
+        # attempt. The listening sockets are kept so that a pending
+        # accept can be aborted from another thread.
+        self.stopped = False
+        self._listening_sockets = []
+        self._crw_running = False
+
         # Intializing Bluetooth
         self.bt = BlueZ(adapter_path=adapter_path)
 
@@ -60,13 +114,32 @@ class ControllerServer():
             colour_buttons=self.colour_buttons)
 
         self.input = InputParser(self.protocol)
-
-        # Debug timekeeping storage array
-        self.times = []
+        # Notify the owner of the controller when macros finish
+        if macro_completion_queue:
+            self.input.on_macro_finished = macro_completion_queue.put
+
+        # Schedules mainloop frames at the controller's report rate
+        self.scheduler = FrameScheduler(
+            frequency=self.FREQUENCY, spin_time=frame_spin_time)
+        # Frames since the frame timing was last published
+        self.timing_frames = 0
+
+        # Latency histograms and event counters
+        self.metrics = ControllerMetrics()
+        # The start of the last scheduled frame
+        self.frame_start = None
+        # When the last message from the Switch was received
+        self.received_at = 0
+
+        # Messages from the Switch are received into a reusable buffer
+        self.recv_buffer = bytearray(self.protocol.report_size)
+        self.recv_view = memoryview(self.recv_buffer)
 
         # Initial reconnection overload protection
         self.tick = 1
-        self.cached_msg = ''
+        # The last sent report, minus the report ID and timer bytes
+        self.cached_msg = memoryview(
+            bytearray(b"\xFF" * self.protocol.report_size))[3:]
 
     def run(self, reconnect_address=None):
         """Runs the mainloop of the controller server.
@@ -76,33 +149,8 @@ class ControllerServer():
         :type reconnect_address: string or list, optional
         """
 
-        self.state["state"] = "initializing"
-
         try:
-            # If we have a lock, prevent other controllers
-            # from initializing at the same time and saturating the DBus,
-            # potentially causing a kernel panic.
-            if self.lock:
-                self.lock.acquire()
-            try:
-                self.controller.setup()
-
-                if reconnect_address:
-                    try:
-                        itr, ctrl = self.reconnect(reconnect_address)
-                    except OSError:
-                        itr, ctrl = self.connect()
-                else:
-                    itr, ctrl = self.connect()
-            finally:
-                if self.lock:
-                    self.lock.release()
-
-            self.switch_address = itr.getpeername()[0]
-            self.state["last_connection"] = self.switch_address
-
-            self.state["state"] = "connected"
-
+            itr, ctrl = self.connect_to_switch(reconnect_address)
             self.mainloop(itr, ctrl)
 
         except KeyboardInterrupt:
@@ -116,88 +164,329 @@ class ControllerServer():
                 self.logger.debug("Error during graceful shutdown:")
                 self.logger.debug(traceback.format_exc())
 
-    def mainloop(self, itr, ctrl):
+    def connect_to_switch(self, reconnect_address=None):
+        """Sets up the controller and connects to a Nintendo Switch.
 
-        duration_start = time.perf_counter()
-        while True:
-            # Start timing command processing
-            timer_start = time.perf_counter()
+        :param reconnect_address: The Bluetooth MAC address of a
+        previously connected to Nintendo Switch, defaults to None
+        :type reconnect_address: string or list, optional
+        :return: The interrupt and control sockets
+        :rtype: tuple
+        """
 
-            # Attempt to get output from Switch
-            try:
-                reply = itr.recv(50)
-                if len(reply) > 40:
-                    self.logger.debug(format_msg_switch(reply))
-            except BlockingIOError:
-                reply = None
+        self.state["state"] = "initializing"
+
+        # Servers are created before their process is forked, so the
+        # property cache's signal bus is only started once running
+        self.bt.enable_property_cache()
 
-            # Getting any inputs from the task queue
-            if self.task_queue:
+        # Prevent other controllers from initializing at the same
+        # time and saturating the DBus, potentially causing a kernel panic.
+        with self.lock:
+            self.controller.setup()
+
+        with self.adapter_lock:
+            if reconnect_address:
                 try:
-                    while True:
-                        msg = self.task_queue.get_nowait()
-                        if msg and msg["type"] == "macro":
-                            self.input.buffer_macro(
-                                msg["macro"], msg["macro_id"])
-                        elif msg and msg["type"] == "stop":
-                            self.input.stop_macro(
-                                msg["macro_id"], state=self.state)
-                        elif msg and msg["type"] == "clear":
-                            self.input.clear_macros()
-                except queue.Empty:
-                    pass
+                    itr, ctrl = self.reconnect(reconnect_address)
+                except OSError:
+                    itr, ctrl = self.connect()
+            else:
+                itr, ctrl = self.connect()
 
-            # Set Direct Input
-            if self.state["direct_input"]:
-                self.input.set_controller_input(self.state["direct_input"])
+        self.switch_address = itr.getpeername()[0]
+        self.state["last_connection"] = self.switch_address
 
-            self.protocol.process_commands(reply)
-            self.input.set_protocol_input(state=self.state)
+        self.state["state"] = "connected"
 
-            msg = self.protocol.get_report()
+        return itr, ctrl
 
-            if self.logger_level <= logging.DEBUG and reply and len(reply) > 45:
-                self.logger.debug(format_msg_controller(msg))
+    def mainloop(self, itr, ctrl):
+
+        scheduler = self.scheduler
+        selector = selectors.DefaultSelector()
+        selector.register(itr, selectors.EVENT_READ)
+
+        scheduler.start()
+        while True:
+            # Wait for the frame's deadline or a subcommand from the Switch
+            reply, frame_due = self.wait_for_frame(itr, selector)
+            if frame_due:
+                scheduler.next_frame()
 
             try:
-                # Cache the last packet to prevent overloading the switch
-                # with packets on the "Change Grip/Order" menu.
-                if msg[3:] != self.cached_msg:
-                    itr.sendall(msg)
-                    self.cached_msg = msg[3:]
-                # Send a blank packet every so often to keep the Switch
-                # from disconnecting from the controller.
-                elif self.tick >= 132:
-                    itr.sendall(msg)
-                    self.tick = 0
-            except BlockingIOError:
-                continue
+                self.process_frame(itr, reply, frame_due)
             except OSError as e:
                 # Attempt to reconnect to the Switch
                 itr, ctrl = self.save_connection(e)
+                selector.close()
+                selector = selectors.DefaultSelector()
+                selector.register(itr, selectors.EVENT_READ)
+                # Don't count the time spent reconnecting as lateness
+                scheduler.start()
+                self.frame_start = None
+
+            if not frame_due:
+                continue
+
+            self.publish_frame_timing()
+
+    def apply_pending_input(self):
+        """Applies the tasks and direct input received since the
+        last frame. Called once per scheduled frame.
+        """
+
+        # Getting any inputs from the task queue
+        if self.task_queue:
+            try:
+                while True:
+                    msg = self.task_queue.get_nowait()
+                    if not msg:
+                        continue
+                    task = msg[0]
+                    if task == ControllerTasks.MACROS:
+                        for macro, macro_id in msg[1]:
+                            self.input.buffer_macro(macro, macro_id)
+                    elif task == ControllerTasks.STOP_MACRO:
+                        self.input.stop_macro(msg[1], state=self.state)
+                    elif task == ControllerTasks.CLEAR_MACROS:
+                        self.input.clear_macros()
+                    elif task == ControllerTasks.REGISTER_MACRO:
+                        self.input.register_macro(msg[1], msg[2])
+            except queue.Empty:
+                pass
+
+        # Set Direct Input. Only the latest write to the slot is
+        # applied, any earlier writes since the last frame are coalesced.
+        if self.direct_input_slot:
+            sequence, packed_input = self.direct_input_slot.read()
+            writes = ((sequence - self.direct_input_sequence) & 0xFFFFFFFF) >> 1
+            if writes > 1:
+                self.metrics.coalesced_inputs += writes - 1
+            self.direct_input_sequence = sequence
+            self.input.set_controller_input(packed_input)
+        elif self.state["direct_input"]:
+            self.input.set_controller_input(self.state["direct_input"])
+
+    def process_frame(self, itr, reply, frame_due=True):
+        """Processes a single frame. Pending tasks and direct input
+        are applied, the Switch's message is responded to and the
+        resulting input report is sent.
+
+        :param itr: The interrupt socket
+        :type itr: socket.socket
+        :param reply: The last message received from the Switch,
+        or None
+        :type reply: bytes
+        :param frame_due: Whether the frame is due. Subcommands answered
+        before the frame is due only respond to the Switch, without
+        applying tasks and input or advancing the frame, defaults to True
+        :type frame_due: bool, optional
+        :raises OSError: If the input report couldn't be sent
+        """
+
+        start = time.perf_counter()
+        metrics = self.metrics
+
+        if frame_due:
+            self.apply_pending_input()
+
+        self.protocol.process_commands(reply)
+        if frame_due:
+            self.input.set_protocol_input(state=self.state)
+        else:
+            # Subcommands answered between frames repeat the input of
+            # the last report, so macros don't advance any faster
+            last_input = self.cached_msg[1:10]
+            self.protocol.set_button_inputs(*last_input[0:3])
+            self.protocol.set_left_stick_inputs(last_input[3:6])
+            self.protocol.set_right_stick_inputs(last_input[6:9])
+
+        msg = self.protocol.get_report()
+
+        if self.logger_level <= logging.DEBUG and reply and len(reply) > 45:
+            self.logger.debug(format_msg_controller(msg))
 
-            # Figure out how long it took to process commands
-            duration_end = time.perf_counter()
-            duration_elapsed = duration_end - duration_start
-            duration_start = duration_end
-            
-            sleep_time = 1/132 - duration_elapsed
-            if sleep_time >= 0:
-                time.sleep(sleep_time)
+        if frame_due:
             self.tick += 1
 
-            if self.logger_level <= logging.DEBUG:
-                self.times.append(duration_elapsed)
-                if len(self.times) > 100:
-                    self.times.pop()
-                mean_time = stat.mean(self.times)
+        send_start = time.perf_counter()
+        metrics.processing_time.record(send_start - start)
+        try:
+            # Cache the last packet to prevent overloading the switch
+            # with packets on the "Change Grip/Order" menu.
+            report = msg[3:]
+            if report != self.cached_msg:
+                itr.sendall(msg)
+                self.cached_msg[:] = report
+            # Send a blank packet every so often to keep the Switch
+            # from disconnecting from the controller.
+            elif self.tick > self.FREQUENCY:
+                itr.sendall(msg)
+                self.tick = 1
+            else:
+                metrics.skipped_sends += 1
+                return
+        except BlockingIOError:
+            # The socket's send buffer is full. The report is dropped
+            # and, since the cached packet wasn't updated, retried
+            # on the next frame.
+            metrics.blocking_io_errors += 1
+            return
+
+        sent = time.perf_counter()
+        metrics.send_latency.record(sent - send_start)
+        if reply and len(reply) > 45:
+            metrics.subcommand_rtt.record(sent - self.received_at)
+
+    def publish_frame_timing(self):
+        """Records the frame period and publishes the frame timing
+        statistics and metrics to the state roughly once a second.
+        Should be called once per scheduled frame.
+        """
 
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.metrics.frame_period.record(now - self.frame_start)
+        self.frame_start = now
+
+        self.timing_frames += 1
+        if self.timing_frames >= self.FREQUENCY:
+            metrics = self.metrics.snapshot()
+            metrics["skipped_frames"] = self.scheduler.skipped_frames
+            metrics["macro_queue_depth"] = (
+                len(self.input.macro_buffer) +
+                (self.input.current_macro_id is not None))
+            self.state.update({
+                "frame_timing": self.scheduler.snapshot(),
+                "metrics": metrics,
+            })
+            self.timing_frames = 0
+
+            if self.logger_level <= logging.DEBUG:
+                period = metrics["frame_period"]
                 self.logger.debug(
-                    f"Tick: {self.tick}, Mean Time: {str(1/mean_time)}")
+                    f"Frame period p50: {period['p50']:.6f}s, "
+                    f"p99: {period['p99']:.6f}s, "
+                    f"Frame rate: {1 / period['mean'] if period['mean'] else 0:.1f}Hz")
+
+    def receive(self, itr):
+        """Receives a message from the Switch into the reusable
+        receive buffer.
+
+        :param itr: The interrupt socket
+        :type itr: socket.socket
+        :raises BlockingIOError: If no message is available
+        :return: A view of the message. The view is only valid until
+        the next call, after which its buffer is reused.
+        :rtype: memoryview
+        """
 
+        length = itr.recv_into(self.recv_buffer)
+        self.received_at = time.perf_counter()
+        return self.recv_view[:length]
+
+    def wait_for_frame(self, itr, selector):
+        """Waits until the next frame is due, reading any messages the
+        Switch sends in the meantime. Subcommands are returned as soon
+        as they arrive so that they can be answered immediately.
+
+        :param itr: The interrupt socket
+        :type itr: socket.socket
+        :param selector: A selector with the interrupt socket
+        registered for reading
+        :type selector: selectors.BaseSelector
+        :return: The last message received from the Switch, or None,
+        and whether or not the frame is due. The frame isn't due if
+        the wait ended early because of a subcommand.
+        :rtype: tuple
+        """
+
+        scheduler = self.scheduler
+        reply = None
+        while True:
+            timeout = scheduler.time_until_deadline() - scheduler.spin_time
+            if not selector.select(max(timeout, 0)):
+                break
+
+            try:
+                reply = self.receive(itr)
+            except BlockingIOError:
+                continue
+
+            if self.logger_level <= logging.DEBUG and len(reply) > 40:
+                self.logger.debug(format_msg_switch(reply))
+
+            # An empty message means the connection was closed,
+            # which is handled when the frame's report fails to send.
+            if not reply or timeout <= 0:
+                break
+
+            # Subcommands are answered right away
+            if len(reply) > 45:
+                return reply, False
+
+        scheduler.wait()
+        return reply, True
+
+    def pair(self, itr):
+        """Exchanges messages with the Switch until the pairing
+        handshake completes, answering each message as it arrives.
+
+        :param itr: The non-blocking interrupt socket
+        :type itr: socket.socket
+        """
+
+        selector = selectors.DefaultSelector()
+        selector.register(itr, selectors.EVENT_READ)
+        try:
+            received_first_message = False
+            while True:
+                # Switch responds to packets slower during pairing
+                # Pairing cycle responds optimally on a 15Hz loop
+                if not received_first_message:
+                    timeout = 1
+                else:
+                    timeout = 1/15
+
+                # Wait for output from the Switch
+                reply = None
+                if selector.select(timeout):
+                    try:
+                        reply = self.receive(itr)
+                        if self.logger_level <= logging.DEBUG and len(reply) > 40:
+                            self.logger.debug(format_msg_switch(reply))
+                    except BlockingIOError:
+                        reply = None
+
+                if reply:
+                    received_first_message = True
+
+                self.protocol.process_commands(reply)
+                msg = self.protocol.get_report()
+
+                if self.logger_level <= logging.DEBUG and reply:
+                    self.logger.debug(format_msg_controller(msg))
+
+                try:
+                    itr.sendall(msg)
+                except BlockingIOError:
+                    # The send buffer is full. Wait for the next
+                    # message from the Switch before replying again.
+                    continue
+
+                # Exit pairing loop when player lights have been set and
+                # vibration has been enabled
+                if (reply and len(reply) > 45 and
+                        self.protocol.vibration_enabled and self.protocol.player_number):
+                    break
+        finally:
+            selector.close()
 
     def save_connection(self, error, state=None):
 
+        self.metrics.reconnects += 1
+
         while self.reconnect_counter < 2:
             try:
                 self.logger.debug("Attempting to reconnect")
@@ -208,53 +497,12 @@ class ControllerServer():
                     colour_body=self.colour_body,
                     colour_buttons=self.colour_buttons)
                 self.input.reassign_protocol(self.protocol)
-                if self.lock:
-                    self.lock.acquire()
-                try:
+                with self.adapter_lock:
                     itr, ctrl = self.reconnect(self.switch_address)
-
-                    received_first_message = False
-                    while True:
-                        # Attempt to get output from Switch
-                        try:
-                            reply = itr.recv(50)
-                            if self.logger_level <= logging.DEBUG and len(reply) > 40:
-                                self.logger.debug(format_msg_switch(reply))
-                        except BlockingIOError:
-                            reply = None
-
-                        if reply:
-                            received_first_message = True
-
-                        self.protocol.process_commands(reply)
-                        msg = self.protocol.get_report()
-
-                        if self.logger_level <= logging.DEBUG and reply:
-                            self.logger.debug(format_msg_controller(msg))
-
-                        try:
-                            itr.sendall(msg)
-                        except BlockingIOError:
-                            continue
-
-                        # Exit pairing loop when player lights have been set and
-                        # vibration has been enabled
-                        if (reply and len(reply) > 45 and
-                                self.protocol.vibration_enabled and self.protocol.player_number):
-                            break
-
-                        # Switch responds to packets slower during pairing
-                        # Pairing cycle responds optimally on a 15Hz loop
-                        if not received_first_message:
-                            time.sleep(1)
-                        else:
-                            time.sleep(1/15)
+                    self.pair(itr)
 
                     self.state["state"] = "connected"
                     return itr, ctrl
-                finally:
-                    if self.lock:
-                        self.lock.release()
             except OSError:
                 self.reconnect_counter += 1
                 self.logger.debug(error)
@@ -280,19 +528,17 @@ class ControllerServer():
         # we need to press the L/SL and R/SR buttons before
         # we can proceed with any input.
         if self.controller_type == ControllerTypes.PRO_CONTROLLER:
-            self.input.current_macro_commands = "L R 0.0s".strip(" ").split(" ")
+            self.input.current_macro_commands = (
+                self.input.compile_macro_line("L R 0.0s"))
         elif self.controller_type == ControllerTypes.JOYCON_L:
-            self.input.current_macro_commands = "JCL_SL JCL_SR 0.0s".strip(" ").split(" ")
+            self.input.current_macro_commands = (
+                self.input.compile_macro_line("JCL_SL JCL_SR 0.0s"))
         elif self.controller_type == ControllerTypes.JOYCON_R:
-            self.input.current_macro_commands = "JCR_SL JCR_SR 0.0s".strip(" ").split(" ")
+            self.input.current_macro_commands = (
+                self.input.compile_macro_line("JCR_SL JCR_SR 0.0s"))
 
-        if self.lock:
-            self.lock.acquire()
-        try:
+        with self.adapter_lock:
             itr, ctrl = self.connect()
-        finally:
-            if self.lock:
-                self.lock.release()
 
         self.state["state"] = "connected"
 
@@ -301,39 +547,93 @@ class ControllerServer():
         return itr, ctrl
 
     def connection_reset_watchdog(self):
+        """Watches for Switches that connect and disconnect while
+        waiting to pair, and resets their connections. Connection changes
+        are received as BlueZ PropertiesChanged signals, falling back to
+        polling if no signal bus is available.
+        """
+
+        signal_bus = get_signal_bus()
+        # Device aliases are looked up in the signal-driven device index
+        device_index = get_device_index()
+        if signal_bus is None or device_index is None:
+            self._poll_connection_reset_watchdog()
+            return
+
+        events = queue.Queue()
+
+        def on_properties_changed(interface, changed, invalidated, path=None):
+            if "Connected" in changed:
+                events.put((str(path), bool(changed["Connected"])))
+
+        match = signal_bus.add_signal_receiver(
+            on_properties_changed,
+            signal_name="PropertiesChanged",
+            dbus_interface=PROPERTIES_INTERFACE,
+            bus_name=SERVICE_NAME,
+            arg0=DEVICE_INTERFACE,
+            path_keyword="path")
+        try:
+            # Subscribing before the initial lookup ensures
+            # no connection change is missed
+            connected_devices = set(
+                self.bt.find_connected_devices(alias_filter=self.SWITCH_ALIAS))
+            connected_devices_count = {}
+            while self._crw_running:
+                try:
+                    path, connected = events.get(
+                        timeout=self.WATCHDOG_STOP_INTERVAL)
+                except queue.Empty:
+                    continue
+
+                # Only Switches are reset, never unrelated devices
+                with device_index.lock:
+                    properties = device_index.devices.get(path, {})
+                    alias = properties.get("Alias", "")
+                if alias.upper() != self.SWITCH_ALIAS.upper():
+                    continue
+
+                # Keep track of Switches that connect
+                if connected:
+                    connected_devices.add(path)
+                elif path in connected_devices:
+                    connected_devices.discard(path)
+                    self._count_disconnect(path, connected_devices_count)
+        finally:
+            match.remove()
+
+    def _poll_connection_reset_watchdog(self):
 
-        connected_devices = []
+        connected_devices = set()
         connected_devices_count = {}
         while self._crw_running:
-            paths = self.bt.find_connected_devices(alias_filter="Nintendo Switch")
+            paths = set(
+                self.bt.find_connected_devices(alias_filter=self.SWITCH_ALIAS))
             # Keep track of Switches that connect
-            if len(paths) > 0:
-                connected_devices = list(set(connected_devices + paths))
-            
+            connected_devices |= paths
+
             # Increment a counter if a Switch connected and disconnected
-            disconnected = list(set(connected_devices) - set(paths))
-            if len(disconnected) > 0:
-                for path in disconnected:
-                    if path not in connected_devices_count.keys():
-                        connected_devices_count[path] = 1
-                    else:
-                        connected_devices_count[path] += 1
-                connected_devices = list(set(connected_devices) - set(disconnected))
-            
-            # Delete Switches that connect/disconnect twice.
-            # This behaviour is characteristic of connection issues and is corrected
-            # by removing the Switch's connection to the system.
-            if len(connected_devices_count.keys()) > 0:
-                for key in connected_devices_count.keys():
-                    if connected_devices_count[key] >= 2:
-                        self.logger.debug(
-                            "A Nintendo Switch disconnected. Resetting Connection...")
-                        self.logger.debug(f"Removing {str(key)}")
-                        self.bt.remove_device(key)
-                        connected_devices_count[key] = 0
+            disconnected = connected_devices - paths
+            for path in disconnected:
+                self._count_disconnect(path, connected_devices_count)
+            connected_devices -= disconnected
 
             time.sleep(0.1)
 
+    def _count_disconnect(self, path, connected_devices_count):
+
+        connected_devices_count[path] = connected_devices_count.get(path, 0) + 1
+
+        # Delete Switches that connect/disconnect twice.
+        # This behaviour is characteristic of connection issues and is corrected
+        # by removing the Switch's connection to the system.
+        if connected_devices_count[path] >= 2:
+            self.logger.debug(
+                "A Nintendo Switch disconnected. Resetting Connection...")
+            self.logger.debug(f"Removing {str(path)}")
+            self.bt.remove_device(path)
+            connected_devices_count[path] = 0
+
     def connect(self):
         """Configures as a specified controller, pairs with a Nintendo Switch,
         and creates/accepts sockets for communication with the Switch.
@@ -356,6 +656,9 @@ class ControllerServer():
                     family=socket.AF_BLUETOOTH,
                     type=socket.SOCK_SEQPACKET,
                     proto=socket.BTPROTO_L2CAP)
+                self._listening_sockets = [s_ctrl, s_itr]
+                if self.stopped:
+                    raise ConnectionAbortedError("The controller was stopped")
 
                 # Setting up HID interrupt/control sockets
                 try:
@@ -368,13 +671,14 @@ class ControllerServer():
                 s_itr.listen(1)
                 s_ctrl.listen(1)
 
-                self.bt.set_discoverable(True)
+                with self.lock:
+                    self.bt.set_discoverable(True)
 
-                # WARNING:
-                # A device's class must be set **AFTER** discoverability
-                # is set. If it is set before or in a similar timeframe,
-                # the class will be reset to the default value.
-                self.bt.set_class("0x02508")
+                    # WARNING:
+                    # A device's class must be set **AFTER** discoverability
+                    # is set. If it is set before or in a similar timeframe,
+                    # the class will be reset to the default value.
+                    self.bt.set_class("0x02508")
 
                 self._crw_running = True
                 crw = Thread(target = self.connection_reset_watchdog)
@@ -395,47 +699,16 @@ class ControllerServer():
                 # for sending and receiving, instead of blocking.
                 fcntl.fcntl(itr, fcntl.F_SETFL, os.O_NONBLOCK)
 
-                # Mainloop
-                received_first_message = False
-                while True:
-                    # Attempt to get output from Switch
-                    try:
-                        reply = itr.recv(50)
-                        if self.logger_level <= logging.DEBUG and len(reply) > 40:
-                            self.logger.debug(format_msg_switch(reply))
-                    except BlockingIOError:
-                        reply = None
-
-                    if reply:
-                        received_first_message = True
-
-                    self.protocol.process_commands(reply)
-                    msg = self.protocol.get_report()
+                self.pair(itr)
 
-                    if self.logger_level <= logging.DEBUG and reply:
-                        self.logger.debug(format_msg_controller(msg))
-
-                    try:
-                        itr.sendall(msg)
-                    except BlockingIOError:
-                        continue
-
-                    # Exit pairing loop when player lights have been set and
-                    # vibration has been enabled
-                    if (reply and len(reply) > 45 and
-                            self.protocol.vibration_enabled and self.protocol.player_number):
-                        break
-
-                    # Switch responds to packets slower during pairing
-                    # Pairing cycle responds optimally on a 15Hz loop
-                    if not received_first_message:
-                        time.sleep(1)
-                    else:
-                        time.sleep(1/15)
-                
                 break
             except OSError as e:
+                if self.stopped:
+                    raise
                 self.logger.debug(e)
+            finally:
+                self._crw_running = False
+                self._close_listening_sockets()
 
         self.input.exited_grip_order_menu = False
 
@@ -507,5 +780,25 @@ class ControllerServer():
 
         return itr, ctrl
 
+    def stop(self):
+        """Stops the controller from waiting for a Switch to connect.
+        Its listening sockets are closed, aborting any pending accept,
+        and the connection reset watchdog is stopped.
+        """
+
+        self.stopped = True
+        self._crw_running = False
+        self._close_listening_sockets()
+
+    def _close_listening_sockets(self):
+
+        for sock in self._listening_sockets:
+            try:
+                # Closing alone doesn't wake a thread blocked in accept
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
     def _on_exit(self):
         self.bt.reset_address()
@@ -1,4 +1,7 @@
 from multiprocessing import Process, Lock, Queue, Manager
+from multiprocessing import resource_tracker
+from concurrent.futures import Future
+import threading
 import queue
 from enum import Enum
 import atexit
@@ -14,6 +17,11 @@ import dbus
 
 from .controller import ControllerServer
 from .controller import ControllerTypes
+from .controller import ControllerEngine
+from .controller import ControllerTasks
+from .controller.direct_input import DirectInputSlot
+from .controller.input import pack_controller_input
+from .controller.input import finished_macros_since
 from .bluez import BlueZ, find_objects, toggle_clean_bluez
 from .bluez import replace_mac_addresses
 from .bluez import find_devices_by_alias
@@ -116,6 +124,21 @@ class Sticks():
 class NuxbtCommands(Enum):
     """An enumeration containing the nuxbt message
     commands.
+
+    Messages are compact tuples of a command's value followed
+    by its arguments:
+
+    - (CREATE_CONTROLLER, controller_index, controller_type,
+      adapter_path, colour_body, colour_buttons, reconnect_address,
+      direct_input_slot)
+    - (INPUT_MACRO, controller_index, macro, macro_id)
+    - (INPUT_MACROS, controller_index, [(macro, macro_id), ...])
+    - (STOP_MACRO, controller_index, macro_id)
+    - (CLEAR_MACROS, controller_index)
+    - (REMOVE_CONTROLLER, controller_index)
+    - (REGISTER_MACRO, handle, macro)
+
+    Macros are either macro strings or registered macro handles.
     """
 
     CREATE_CONTROLLER = 0
@@ -125,6 +148,19 @@ class NuxbtCommands(Enum):
     CLEAR_ALL_MACROS = 4
     REMOVE_CONTROLLER = 5
     QUIT = 6
+    INPUT_MACROS = 7
+    REGISTER_MACRO = 8
+
+
+class MacroFuture(Future):
+    """A future that resolves with the ID of a submitted macro
+    once the macro finishes, or is stopped or cleared.
+    """
+
+    def __init__(self, macro_id):
+
+        super().__init__()
+        self.macro_id = macro_id
 
 
 class Nuxbt():
@@ -156,7 +192,8 @@ class Nuxbt():
         except Exception as e:
             self.logger.warning(f"Could not check BlueZ version: {e}")
 
-    def __init__(self, debug=False, log_file_path=None, disable_logging=False, log_to_file=False):
+    def __init__(self, debug=False, log_file_path=None, disable_logging=False,
+                 log_to_file=False, shared_engine=False, frame_spin_time=0):
         """Initializes the necessary multiprocessing resources and starts
         the multiprocessing processes.
 
@@ -168,6 +205,13 @@ class Nuxbt():
         :type log_file_path: str or bool, optional
         :param disable_logging: Routes all logging calls to a null log handler.
         :type disable_logging: bool, optional, defaults to False.
+        :param shared_engine: Runs all controllers in a single process
+        driven by one event loop, instead of one process per controller.
+        :type shared_engine: bool, optional, defaults to False.
+        :param frame_spin_time: The time in seconds before each frame
+        that controllers busy wait instead of sleeping, trading CPU time
+        for lower input report jitter.
+        :type frame_spin_time: float, optional, defaults to 0.
         """
 
 
@@ -176,6 +220,8 @@ class Nuxbt():
             log_file_path = True
         
         self.debug = debug
+        self.shared_engine = shared_engine
+        self.frame_spin_time = frame_spin_time
 
         create_logger(debug=debug, log_file_path=log_file_path, disable_logging=disable_logging)
         self.logger = logging.getLogger('nuxbt')
@@ -202,6 +248,21 @@ class Nuxbt():
         self._controller_counter = 0
         self._adapters_in_use = {}
         self._controller_adapter_lookup = {}
+        # Shared memory direct input slots, keyed by controller index
+        self._direct_input_slots = {}
+
+        # Controllers report the IDs of finished macros on this queue.
+        # A listener thread resolves the matching macro futures.
+        self._macro_completion_queue = Queue()
+        self._macro_futures = {}
+        self._macro_futures_lock = threading.Lock()
+        # Handles of registered macros, keyed by name
+        self._registered_macros = {}
+
+        # Start the shared memory resource tracker before any processes
+        # are spun up, so that all processes attaching to direct input
+        # slots share it and slots are only cleaned up by their creator.
+        resource_tracker.ensure_running()
 
         # Disable the BlueZ input plugin so we can use the
         # HID control/interrupt Bluetooth ports
@@ -227,6 +288,10 @@ class Nuxbt():
         self.agent_process.daemon = True # Daemonize to kill with parent
         self.agent_process.start()
 
+        self._macro_listener = threading.Thread(
+            target=self._macro_completion_listener, daemon=True)
+        self._macro_listener.start()
+
 
 
     def _on_exit(self):
@@ -241,6 +306,14 @@ class Nuxbt():
         # since it isn't daemonized.
         if hasattr(self, "controllers") and self.controllers.is_alive():
             self.controllers.terminate()
+
+        for slot in self._direct_input_slots.values():
+            try:
+                slot.close()
+                slot.unlink()
+            except Exception:
+                pass
+        self._direct_input_slots = {}
         
         try:
              self.manager.shutdown()
@@ -250,6 +323,38 @@ class Nuxbt():
         # Re-enable the BlueZ plugins, if we have permission
         # toggle_clean_bluez(False)
 
+    def _macro_completion_listener(self):
+        """Used as a daemon thread that resolves macro futures
+        as controllers report finished macros.
+        """
+
+        while True:
+            try:
+                macro_id = self._macro_completion_queue.get()
+            except (EOFError, OSError):
+                return
+
+            with self._macro_futures_lock:
+                future = self._macro_futures.pop(macro_id, None)
+            if future is not None and not future.done():
+                future.set_result(macro_id)
+
+    def _get_macro_future(self, macro_id):
+        """Gets the pending future for a macro ID, creating it if needed.
+
+        :param macro_id: The ID of a macro
+        :type macro_id: str
+        :return: The macro's future
+        :rtype: MacroFuture
+        """
+
+        with self._macro_futures_lock:
+            future = self._macro_futures.get(macro_id)
+            if future is None:
+                future = MacroFuture(macro_id)
+                self._macro_futures[macro_id] = future
+        return future
+
     def _command_manager(self, task_queue, state):
         """Used as the main multiprocessing Process that is launched
         on startup to handle the message passing and instantiation of
@@ -264,7 +369,10 @@ class Nuxbt():
         :type state: multiprocessing.Manager().dict
         """
 
-        cm = _ControllerManager(state, self._bluetooth_lock)
+        cm = _ControllerManager(
+            state, self._bluetooth_lock, self._macro_completion_queue,
+            shared_engine=self.shared_engine,
+            frame_spin_time=self.frame_spin_time)
         # Ensure a SystemExit exception is raised on SIGTERM
         # so that we can gracefully shutdown.
         signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
@@ -284,29 +392,22 @@ class Nuxbt():
                     msg = None
 
                 if msg:
-                    logger.debug(f"Received command: {msg['command']}")
-                    if msg["command"] == NuxbtCommands.CREATE_CONTROLLER:
-                        cm.create_controller(
-                            msg["arguments"]["controller_index"],
-                            msg["arguments"]["controller_type"],
-                            msg["arguments"]["adapter_path"],
-                            msg["arguments"]["colour_body"],
-                            msg["arguments"]["colour_buttons"],
-                            msg["arguments"]["reconnect_address"])
-                    elif msg["command"] == NuxbtCommands.INPUT_MACRO:
-                        cm.input_macro(
-                            msg["arguments"]["controller_index"],
-                            msg["arguments"]["macro"],
-                            msg["arguments"]["macro_id"])
-                    elif msg["command"] == NuxbtCommands.STOP_MACRO:
-                        cm.stop_macro(
-                            msg["arguments"]["controller_index"],
-                            msg["arguments"]["macro_id"])
-                    elif msg["command"] == NuxbtCommands.CLEAR_MACROS:
-                        cm.clear_macros(
-                            msg["arguments"]["controller_index"])
-                    elif msg["command"] == NuxbtCommands.REMOVE_CONTROLLER:
-                        index = msg["arguments"]["controller_index"]
+                    command = NuxbtCommands(msg[0])
+                    logger.debug(f"Received command: {command}")
+                    if command == NuxbtCommands.INPUT_MACROS:
+                        cm.input_macros(msg[1], msg[2])
+                    elif command == NuxbtCommands.INPUT_MACRO:
+                        cm.input_macros(msg[1], [(msg[2], msg[3])])
+                    elif command == NuxbtCommands.CREATE_CONTROLLER:
+                        cm.create_controller(*msg[1:])
+                    elif command == NuxbtCommands.STOP_MACRO:
+                        cm.stop_macro(msg[1], msg[2])
+                    elif command == NuxbtCommands.CLEAR_MACROS:
+                        cm.clear_macros(msg[1])
+                    elif command == NuxbtCommands.REGISTER_MACRO:
+                        cm.register_macro(msg[1], msg[2])
+                    elif command == NuxbtCommands.REMOVE_CONTROLLER:
+                        index = msg[1]
                         cm.clear_macros(index)
                         cm.remove_controller(index)
 
@@ -320,15 +421,15 @@ class Nuxbt():
         message into the task queue with the given macro.
 
         If block is set to True, this function waits until the
-        macro_id (generated on the submission of the macro)
-        shows up under the "finished_macros" list communicated
-        under the controllers shared state.
+        controller reports the macro_id (generated on the submission
+        of the macro) as finished.
 
         :param controller_index: The index of a given controller
         :type controller_index: int
         :param macro: The series of button presses and timings
-        to be passed to the controller
-        :type macro: string
+        to be passed to the controller, or the handle of a
+        registered macro (see register_macro)
+        :type macro: string or int
         :param block: A boolean variable indicating whether or not
         to block until the macro completes, defaults to True
         :type block: bool, optional
@@ -339,31 +440,141 @@ class Nuxbt():
         :rtype: str
         """
 
+        future = self.submit_macro(controller_index, macro)
+
+        if block:
+            future.result()
+
+        return future.macro_id
+
+    def submit_macro(self, controller_index, macro):
+        """Used to input a given macro on a specified controller
+        without blocking. The returned future resolves with the
+        macro's ID once the macro finishes, or is stopped or cleared.
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :param macro: The series of button presses and timings
+        to be passed to the controller, or the handle of a
+        registered macro (see register_macro)
+        :type macro: string or int
+        :raises ValueError: If the controller_index does not exist
+        or the macro handle isn't registered
+        :return: A future for the macro. The generated ID of the macro
+        is available under its macro_id attribute.
+        :rtype: MacroFuture
+        """
+
         if controller_index not in self.manager_state.keys():
             raise ValueError("Specified controller does not exist")
+        self._check_macro(macro)
 
         # Get a unique ID to identify the macro
         # so we can check when the controller is done inputting it
         macro_id = os.urandom(24).hex()
-        self.task_queue.put({
-            "command": NuxbtCommands.INPUT_MACRO,
-            "arguments": {
-                "controller_index": controller_index,
-                "macro": macro,
-                "macro_id": macro_id,
-            }
-        })
+        future = self._get_macro_future(macro_id)
+        self.task_queue.put((
+            NuxbtCommands.INPUT_MACRO.value, controller_index, macro, macro_id))
+
+        return future
+
+    def macros(self, controller_index, macros, block=True):
+        """Used to input a batch of macros on a specified controller.
+        The macros are queued in order and are passed to the controller
+        as a single message.
+
+        If block is set to True, this function waits until the
+        controller reports all of the macros as finished.
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :param macros: A list of macro strings and/or registered
+        macro handles (see register_macro)
+        :type macros: list
+        :param block: A boolean variable indicating whether or not
+        to block until the macros complete, defaults to True
+        :type block: bool, optional
+        :raises ValueError: If the controller_index does not exist
+        or a macro handle isn't registered
+        :return: The generated IDs of the passed macros, in order
+        :rtype: list
+        """
+
+        futures = self.submit_macros(controller_index, macros)
 
         if block:
-            while True:
-                finished = (self.manager_state
-                            [controller_index]["finished_macros"])
-                if macro_id in finished:
-                    break
+            for future in futures:
+                future.result()
 
-                time.sleep(1/120)  # Wait one Pro Controller cycle
+        return [future.macro_id for future in futures]
 
-        return macro_id
+    def submit_macros(self, controller_index, macros):
+        """Used to input a batch of macros on a specified controller
+        without blocking. The macros are queued in order and are passed
+        to the controller as a single message.
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :param macros: A list of macro strings and/or registered
+        macro handles (see register_macro)
+        :type macros: list
+        :raises ValueError: If the controller_index does not exist
+        or a macro handle isn't registered
+        :return: A future for each macro, in order
+        :rtype: list
+        """
+
+        if controller_index not in self.manager_state.keys():
+            raise ValueError("Specified controller does not exist")
+
+        # Every macro is checked before any future is created, since
+        # futures of a rejected batch would never be resolved
+        macros = list(macros)
+        for macro in macros:
+            self._check_macro(macro)
+
+        batch = []
+        futures = []
+        for macro in macros:
+            macro_id = os.urandom(24).hex()
+            batch.append((macro, macro_id))
+            futures.append(self._get_macro_future(macro_id))
+
+        self.task_queue.put((
+            NuxbtCommands.INPUT_MACROS.value, controller_index, batch))
+
+        return futures
+
+    def register_macro(self, name, macro):
+        """Registers a named macro with all current and future
+        controllers. Registered macros are sent to and compiled by
+        each controller once, and can then be submitted by their
+        handle in place of the macro string. Registering a macro
+        under an existing name replaces it.
+
+        :param name: The name of the macro
+        :type name: str
+        :param macro: The series of button presses and timings
+        to be registered
+        :type macro: string
+        :return: The handle of the registered macro
+        :rtype: int
+        """
+
+        handle = self._registered_macros.get(name)
+        if handle is None:
+            handle = len(self._registered_macros)
+            self._registered_macros[name] = handle
+
+        self.task_queue.put((
+            NuxbtCommands.REGISTER_MACRO.value, handle, macro))
+
+        return handle
+
+    def _check_macro(self, macro):
+
+        if type(macro) is int and macro not in self._registered_macros.values():
+            raise ValueError("Specified macro handle is not registered")
 
     def press_buttons(self, controller_index, buttons, down=0.1, up=0.1, block=True):
         """Used to press a given set of buttons on the controller for a
@@ -465,29 +676,18 @@ class Nuxbt():
         if controller_index not in self.manager_state.keys():
             raise ValueError("Specified controller does not exist")
 
-        self.task_queue.put({
-            "command": NuxbtCommands.STOP_MACRO,
-            "arguments": {
-                "controller_index": controller_index,
-                "macro_id": macro_id,
-            }
-        })
+        # Stopped macros are always reported as finished
+        future = self._get_macro_future(macro_id)
+        self.task_queue.put((
+            NuxbtCommands.STOP_MACRO.value, controller_index, macro_id))
 
         if block:
-            while True:
-                finished = (self.manager_state
-                            [controller_index]["finished_macros"])
-                if macro_id in finished:
-                    break
-
-                time.sleep(1/120)
+            future.result()
 
     def clear_macros(self, controller_index):
         """Clears all running and queued macros on a specified
-        controller.
-
-        WARNING: Any blocking macro calls will continue to run
-        forever if this command is run.
+        controller. Blocking macro calls for the cleared macros
+        return once the controller has cleared them.
 
         :param controller_index: The index of a given controller
         :type controller_index: int
@@ -497,12 +697,8 @@ class Nuxbt():
         if controller_index not in self.manager_state.keys():
             raise ValueError("Specified controller does not exist")
 
-        self.task_queue.put({
-            "command": NuxbtCommands.CLEAR_MACROS,
-            "arguments": {
-                "controller_index": controller_index,
-            }
-        })
+        self.task_queue.put((
+            NuxbtCommands.CLEAR_MACROS.value, controller_index))
 
     def clear_all_macros(self):
         """Clears all running and queued macros on all
@@ -512,26 +708,91 @@ class Nuxbt():
         for controller in self.manager_state.keys():
             self.clear_macros(controller)
 
+    def finished_macros_since(self, controller_index, cursor=0):
+        """Gets the macros that finished on a specified controller
+        after a given cursor. Pass the returned cursor to the next
+        call to only receive newly finished macros.
+
+        Only the most recently finished macros are retained by the
+        controller, so callers that fall far behind may miss macros.
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :param cursor: The cursor returned by the previous call,
+        defaults to 0
+        :type cursor: int, optional
+        :raises ValueError: If the controller_index does not exist
+        :return: The latest cursor and a list of the macro IDs that
+        finished after the given cursor, oldest first
+        :rtype: tuple
+        """
+
+        if controller_index not in self.manager_state.keys():
+            raise ValueError("Specified controller does not exist")
+
+        state = self.manager_state[controller_index].copy()
+        return finished_macros_since(
+            state["finished_macros"],
+            state.get("finished_macros_cursor", 0),
+            cursor)
+
+    def metrics(self, controller_index=None):
+        """Gets the latency histograms and event counters of the
+        controllers. Controllers publish their metrics roughly
+        once a second.
+
+        Each controller's metrics are a dict with the following keys:
+        - "frame_period", "processing_time", "send_latency" and
+          "subcommand_rtt": Histogram snapshots with the count, min,
+          max, mean and p50/p90/p99/p99.9 of the durations in seconds,
+          and the non-empty histogram buckets as (upper bound, count)
+          pairs
+        - "blocking_io_errors", "skipped_sends", "reconnects",
+          "coalesced_inputs" and "skipped_frames": Counters
+        - "macro_queue_depth": The number of running and queued macros
+
+        :param controller_index: The index of a given controller,
+        defaults to None for all controllers
+        :type controller_index: int, optional
+        :raises ValueError: If the controller_index does not exist
+        :return: The metrics of the given controller, or a dict of all
+        controllers' metrics keyed by index. Controllers that haven't
+        published metrics yet have metrics of None.
+        :rtype: dict
+        """
+
+        if controller_index is not None:
+            if controller_index not in self.manager_state.keys():
+                raise ValueError("Specified controller does not exist")
+            return self.manager_state[controller_index].get("metrics")
+
+        metrics = {}
+        for index in self.manager_state.keys():
+            metrics[index] = self.manager_state[index].get("metrics")
+        return metrics
+
     def set_controller_input(self, controller_index, input_packet):
-        """Sets the controllers buttons and analog sticks for 1 cycle.
-        This means that exactly 1 packet will be sent to the Switch with
-        input specified with this method. To keep a continuous input
-        stream of a desired input, packets must be set at a rate that
-        roughly matches the set controller. Eg: An emulated Pro Controller's
-        input must be set at roughly 120Hz and a Joy-Con's at 60Hz.
+        """Sets the controllers buttons and analog sticks. The input is
+        written into a shared memory slot that the controller reads
+        every cycle, so setting input does not require any IPC round
+        trips. The input remains set until it is replaced.
 
         :param controller_index: The index of the emulated controller
         :type controller_index: int
         :param input_packet: The input packet with the desired input. This
-        *must* be an instance of the create_input_packet method.
-        :type input_packet: dict
+        *must* be an instance of the create_input_packet method or an input
+        packed with nuxbt.controller.input.pack_controller_input.
+        :type input_packet: dict or int
         :raises ValueError: On bad controller index
         """
 
-        if controller_index not in self.manager_state.keys():
+        slot = self._direct_input_slots.get(controller_index)
+        if slot is None:
             raise ValueError("Specified controller does not exist")
 
-        self.manager_state[controller_index]["direct_input"] = input_packet
+        if type(input_packet) is dict:
+            input_packet = pack_controller_input(input_packet)
+        slot.write(input_packet)
 
     def create_input_packet(self):
         """Creates an input packet that is used to specify the input
@@ -583,65 +844,62 @@ class Nuxbt():
         :rtype: int
         """
         self.logger.info("Creating controller...")
-        if adapter_path:
-            if adapter_path not in self.get_available_adapters():
-                self.logger.error(f"Specified adapter {adapter_path} is unavailable")
-                raise ValueError("Specified adapter is unavailable")
-
-            if adapter_path in self._adapters_in_use.keys():
-                self.logger.error(f"Specified adapter {adapter_path} is in use")
-                raise ValueError("Specified adapter in use")
-        else:
-            # Get all adapters we can use
-            available = self.get_available_adapters()
-            if not available:
-                 self.logger.error("No available Bluetooth adapters found.")
-                 raise ValueError("No adapters available")
-                 
-            usable_adapters = list(
-                set(available) - set(self._adapters_in_use))
-            if len(usable_adapters) > 0:
-                # Use the first available adapter
-                adapter_path = usable_adapters[0]
-                self.logger.info(f"Using adapter: {adapter_path}")
+        available = self.get_available_adapters()
+
+        # Only the adapter claim is synchronized. Waiting for the
+        # controller happens outside of the lock, so that controllers
+        # on separate adapters can be brought up concurrently.
+        with self._controller_lock:
+            if adapter_path:
+                if adapter_path not in available:
+                    self.logger.error(f"Specified adapter {adapter_path} is unavailable")
+                    raise ValueError("Specified adapter is unavailable")
+
+                if adapter_path in self._adapters_in_use.keys():
+                    self.logger.error(f"Specified adapter {adapter_path} is in use")
+                    raise ValueError("Specified adapter in use")
             else:
-                self.logger.error("All available adapters are in use.")
-                raise ValueError("No adapters available")
-
-        controller_index = None
-        try:
-            self._controller_lock.acquire()
-            self.task_queue.put({
-                "command": NuxbtCommands.CREATE_CONTROLLER,
-                "arguments": {
-                    "controller_index": self._controller_counter,
-                    "controller_type": controller_type,
-                    "adapter_path": adapter_path,
-                    "colour_body": colour_body,
-                    "colour_buttons": colour_buttons,
-                    "reconnect_address": reconnect_address,
-                }
-            })
+                # Get all adapters we can use
+                if not available:
+                    self.logger.error("No available Bluetooth adapters found.")
+                    raise ValueError("No adapters available")
+
+                usable_adapters = list(
+                    set(available) - set(self._adapters_in_use))
+                if len(usable_adapters) > 0:
+                    # Use the first available adapter
+                    adapter_path = usable_adapters[0]
+                    self.logger.info(f"Using adapter: {adapter_path}")
+                else:
+                    self.logger.error("All available adapters are in use.")
+                    raise ValueError("No adapters available")
+
+            direct_input_slot = DirectInputSlot(create=True, lock=Lock())
+            self._direct_input_slots[self._controller_counter] = direct_input_slot
+            self.task_queue.put((
+                NuxbtCommands.CREATE_CONTROLLER.value,
+                self._controller_counter,
+                controller_type,
+                adapter_path,
+                colour_body,
+                colour_buttons,
+                reconnect_address,
+                direct_input_slot.name))
             controller_index = self._controller_counter
             self._controller_counter += 1
             self._adapters_in_use[adapter_path] = controller_index
             self._controller_adapter_lookup[controller_index] = adapter_path
 
-            # Block until the controller is ready
-            # This needs to be done to prevent race conditions
-            # on Bluetooth resources.
-            if type(controller_index) == int:
-                while True:
-                    if controller_index in self.manager_state.keys():
-                        state = self.manager_state[controller_index]
-                        if (state["state"] == "connecting" or
-                                state["state"] == "reconnecting" or
-                                state["state"] == "crashed"):
-                            break
-
-                    time.sleep(1/30)
-        finally:
-            self._controller_lock.release()
+        # Block until the controller has finished initializing
+        while True:
+            if controller_index in self.manager_state.keys():
+                state = self.manager_state[controller_index]
+                if (state["state"] == "connecting" or
+                        state["state"] == "reconnecting" or
+                        state["state"] == "crashed"):
+                    break
+
+            time.sleep(1/30)
 
         self.logger.info(f"Controller {controller_index} created successfully.")
         return controller_index
@@ -660,6 +918,10 @@ class Nuxbt():
                 try:
                     adapter_path = self._controller_adapter_lookup.pop(controller_index, None)
                     self._adapters_in_use.pop(adapter_path, None)
+                    slot = self._direct_input_slots.pop(controller_index, None)
+                    if slot:
+                        slot.close()
+                        slot.unlink()
                 except Exception:
                     pass
             raise ValueError("Specified controller does not exist")
@@ -671,12 +933,15 @@ class Nuxbt():
         finally:
             self._controller_lock.release()
 
-        self.task_queue.put({
-            "command": NuxbtCommands.REMOVE_CONTROLLER,
-            "arguments": {
-                "controller_index": controller_index,
-            }
-        })
+        self.task_queue.put((
+            NuxbtCommands.REMOVE_CONTROLLER.value, controller_index))
+
+        # The controller process keeps its mapping of the slot
+        # until it is terminated, so the slot can be unlinked now.
+        slot = self._direct_input_slots.pop(controller_index, None)
+        if slot:
+            slot.close()
+            slot.unlink()
 
     def wait_for_connection(self, controller_index):
         """Blocks until a given controller is connected
@@ -732,12 +997,22 @@ class Nuxbt():
                         "connected" or
                         "crashed"
                     "finished_macros":
-                        A list of UUIDs
+                        A list of the most recently finished macro IDs
+                    "finished_macros_cursor":
+                        The cursor of the last finished macro
                     "errors":
                         A string with the crash error
+                    "frame_timing":
+                        Frame lateness statistics of the controller's
+                        mainloop, updated roughly once a second
+                    "metrics":
+                        Latency histograms and event counters of the
+                        controller, updated roughly once a second
+                        (see Nuxbt.metrics)
                     "direct_input":
-                        A dictionary that represents all inputs
-                        being directly input into the controller.
+                        The initial input packet of the controller.
+                        Direct input set with set_controller_input
+                        is passed through shared memory instead.
                 }
         }
 
@@ -758,19 +1033,38 @@ class _ControllerManager():
     or macro clearing/stopping.
     """
 
-    def __init__(self, state, lock):
+    def __init__(self, state, lock, macro_completion_queue=None,
+                 shared_engine=False, frame_spin_time=0):
 
         self.state = state
         self.lock = lock
+        self.macro_completion_queue = macro_completion_queue
+        self.frame_spin_time = frame_spin_time
         self.controller_resources = Manager()
         self._controller_queues = {}
         self._children = {}
+        # The locks held by controllers while pairing, keyed by adapter path.
+        # The shared lock is only held while configuring adapters.
+        self._adapter_locks = {}
+        self._controller_adapters = {}
+
+        # Controllers are run by a single engine process if enabled
+        self.shared_engine = shared_engine
+        self._engine = None
+        self._engine_queue = None
+        self._controller_states = {}
+
+        # Registered macro strings, keyed by handle. These are
+        # registered with every controller as it is created.
+        self._registered_macros = {}
 
     def create_controller(self, index, controller_type, adapter_path,
                           colour_body=None, colour_buttons=None,
-                          reconnect_address=None):
+                          reconnect_address=None, direct_input_slot=None):
         """Instantiates a given controller as a multiprocessing
-        Process with a shared state dict and a task queue.
+        Process with a shared state dict and a task queue. If the
+        shared engine is enabled, the controller is run by the
+        engine process instead.
 
         Configuration options are available in the form of
         controller colours.
@@ -790,6 +1084,9 @@ class _ControllerManager():
         :param reconnect_address: The address of a Nintendo Switch
         to reconnect to, defaults to None
         :type reconnect_address: str, optional
+        :param direct_input_slot: The name of the shared memory slot
+        used for direct input, defaults to None
+        :type direct_input_slot: str, optional
         """
 
         controller_queue = Queue()
@@ -797,6 +1094,7 @@ class _ControllerManager():
         controller_state = self.controller_resources.dict()
         controller_state["state"] = "initializing"
         controller_state["finished_macros"] = []
+        controller_state["finished_macros_cursor"] = 0
         controller_state["errors"] = False
         controller_state["direct_input"] = json.loads(json.dumps(DIRECT_INPUT_PACKET))
         controller_state["colour_body"] = colour_body
@@ -805,46 +1103,121 @@ class _ControllerManager():
         controller_state["adapter_path"] = adapter_path
         controller_state["last_connection"] = None
 
+        self.state[index] = controller_state
+
+        if self.shared_engine:
+            self._start_engine()
+            # Keep the state referenced while the engine attaches to it
+            self._controller_states[index] = controller_state
+            self._engine_queue.put({
+                "command": "create",
+                "index": index,
+                "controller_type": controller_type,
+                "adapter_path": adapter_path,
+                "state": controller_state,
+                "colour_body": colour_body,
+                "colour_buttons": colour_buttons,
+                "direct_input_slot": direct_input_slot,
+                "reconnect_address": reconnect_address,
+                "frame_spin_time": self.frame_spin_time,
+            })
+            self._register_macros(index)
+            return
+
         self._controller_queues[index] = controller_queue
+        self._register_macros(index)
 
-        self.state[index] = controller_state
+        if adapter_path not in self._adapter_locks:
+            self._adapter_locks[adapter_path] = Lock()
+        self._controller_adapters[index] = adapter_path
 
         server = ControllerServer(controller_type,
                                   adapter_path=adapter_path,
                                   lock=self.lock,
+                                  adapter_lock=self._adapter_locks[adapter_path],
                                   state=controller_state,
                                   task_queue=controller_queue,
                                   colour_body=colour_body,
-                                  colour_buttons=colour_buttons)
+                                  colour_buttons=colour_buttons,
+                                  direct_input_slot=direct_input_slot,
+                                  macro_completion_queue=self.macro_completion_queue,
+                                  frame_spin_time=self.frame_spin_time)
         controller = Process(target=server.run, args=(reconnect_address,))
         controller.daemon = True
         self._children[index] = controller
         controller.start()
 
+    def _start_engine(self):
+        """Starts the shared controller engine process, if it
+        isn't running already.
+        """
+
+        if self._engine:
+            return
+
+        self._engine_queue = Queue()
+        engine = ControllerEngine(
+            self._engine_queue,
+            lock=self.lock,
+            macro_completion_queue=self.macro_completion_queue)
+        self._engine = Process(target=engine.run)
+        self._engine.daemon = True
+        self._engine.start()
+
+    def _put_task(self, index, task):
+
+        if self.shared_engine:
+            self._engine_queue.put({
+                "command": "task",
+                "index": index,
+                "task": task,
+            })
+        else:
+            self._controller_queues[index].put(task)
+
+    def _register_macros(self, index):
+
+        for handle, macro in self._registered_macros.items():
+            self._put_task(
+                index, (ControllerTasks.REGISTER_MACRO.value, handle, macro))
+
+    def register_macro(self, handle, macro):
+
+        self._registered_macros[handle] = macro
+        task = (ControllerTasks.REGISTER_MACRO.value, handle, macro)
+        for index in self.state.keys():
+            self._put_task(index, task)
+
     def input_macro(self, index, macro, macro_id):
 
-        self._controller_queues[index].put({
-            "type": "macro",
-            "macro": macro,
-            "macro_id": macro_id
-        })
+        self.input_macros(index, [(macro, macro_id)])
+
+    def input_macros(self, index, macros):
+
+        self._put_task(index, (ControllerTasks.MACROS.value, macros))
 
     def stop_macro(self, index, macro_id):
 
-        self._controller_queues[index].put({
-            "type": "stop",
-            "macro_id": macro_id,
-        })
+        self._put_task(index, (ControllerTasks.STOP_MACRO.value, macro_id))
 
     def clear_macros(self, index):
 
-        self._controller_queues[index].put({
-            "type": "clear",
-        })
+        self._put_task(index, (ControllerTasks.CLEAR_MACROS.value,))
 
     def remove_controller(self, index):
-        
-        self._children[index].terminate()
+
+        if self.shared_engine:
+            self._engine_queue.put({
+                "command": "remove",
+                "index": index,
+            })
+            self._controller_states.pop(index, None)
+        else:
+            self._children[index].terminate()
+            # A controller terminated while pairing never releases its
+            # adapter's lock, so the next controller gets a new one
+            adapter_path = self._controller_adapters.pop(index, None)
+            self._adapter_locks.pop(adapter_path, None)
         self.state.pop(index, None)
 
     def shutdown(self):
@@ -854,4 +1227,7 @@ class _ControllerManager():
             child = self._children[index]
             child.terminate()
 
+        if self._engine:
+            self._engine.terminate()
+
         self.controller_resources.shutdown()
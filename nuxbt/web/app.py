@@ -1,13 +1,18 @@
+import asyncio
 import json
 import os
-from threading import RLock
+from threading import RLock, Event
 import time
 from socket import gethostname
 
 from .cert import generate_cert
+from .metrics import MetricsCollector
+from .state import StatePublisher
+from .input import InputSequencer
 from ..nuxbt import Nuxbt, PRO_CONTROLLER
+from ..controller.input import unpack_controller_input
 from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from a2wsgi import WSGIMiddleware
 import uvicorn
 import socketio
@@ -233,6 +238,7 @@ app.config['SECRET_KEY'] = secret_key
 # Ensure async_mode is threading for uvicorn/standard WSGI compatibility without eventlet
 # Note: This limits SocketIO to long-polling when running under uvicorn + a2wsgi/WSGIMiddleware
 # unless a2wsgi handles websocket translation (which it does for uWSGI but maybe not generic).
+# See native_asgi below for an ASGI-native server with WebSocket support.
 sio = SocketIO(app, cookie=False, async_mode='threading', cors_allowed_origins='*')
 
 # Wrap Flask app with WSGIMiddleware to allow running with uvicorn (ASGI)
@@ -242,6 +248,35 @@ app_asgi = flask_asgi
 
 user_info_lock = RLock()
 USER_INFO = {}
+# The latest direct input received for each controller. Direct input
+# is passed to the controllers through shared memory and isn't
+# reflected in the nuxbt state, so it's echoed back from here.
+DIRECT_INPUTS = {}
+# Binary input events hold the controller index (1 byte), the 3 button
+# bytes of the input report, the left X/Y and right X/Y stick values
+# as signed bytes, and a little-endian 32-bit sequence number. The
+# button and stick bytes are a packed input (see pack_controller_input).
+# JSON input events are still accepted as a fallback.
+BINARY_INPUT_SIZE = 12
+# Binary input that arrives out of order is dropped
+input_sequencer = InputSequencer()
+# Metrics are collected in the background and served from a snapshot
+metrics_collector = MetricsCollector()
+
+# Controller state is read by a single background task and pushed to
+# subscribed clients as versioned diffs. The task sleeps while no one
+# is subscribed and is woken by changes made through the web app.
+# Changes made by the controller processes themselves (connection
+# state, finished macros) can't be notified, so they're polled for.
+STATE_ROOM = 'state'
+# The minimum time between publishes, limiting diffs to 10 Hz
+STATE_PUBLISH_INTERVAL = 0.1
+STATE_POLL_INTERVAL = 0.5
+state_publisher = StatePublisher()
+state_subscribers = set()
+state_subscribed = Event()
+state_changed = Event()
+state_task = None
 
 
 @app.route('/')
@@ -249,35 +284,174 @@ def index():
     return render_template('index.html')
 
 
-@sio.on('connect')
-def on_connect():
+@app.route('/metrics')
+def metrics():
+    return metrics_collector.snapshot(nuxbt), 200, {
+        'Content-Type': 'application/openmetrics-text; version=1.0.0; charset=utf-8'}
+
+
+def add_user(sid):
     with user_info_lock:
-        USER_INFO[request.sid] = {}
+        USER_INFO[sid] = {}
+
+
+def add_state_subscriber(sid):
+    with user_info_lock:
+        state_subscribers.add(sid)
+        state_subscribed.set()
+
+
+def remove_user(sid):
+    input_sequencer.forget(sid)
+    with user_info_lock:
+        state_subscribers.discard(sid)
+        if not state_subscribers:
+            state_subscribed.clear()
+        try:
+            index = USER_INFO[sid]["controller_index"]
+            nuxbt.remove_controller(index)
+            notify_state_change()
+        except KeyError:
+            pass
+
+
+def notify_state_change():
+    state_changed.set()
+
+
+def wait_for_state_change():
+    """Blocks while no one is subscribed to the state, and then until
+    a state change is notified or the poll interval passes.
+    """
+
+    state_subscribed.wait()
+    state_changed.wait(STATE_POLL_INTERVAL)
+    state_changed.clear()
+
+
+def shutdown_controller(index):
+    nuxbt.remove_controller(index)
+    DIRECT_INPUTS.pop(index, None)
+    notify_state_change()
+
+
+def create_user_controller(sid):
+    reconnect_addresses = nuxbt.get_switch_addresses()
+    index = nuxbt.create_controller(PRO_CONTROLLER, reconnect_address=reconnect_addresses)
+
+    with user_info_lock:
+        USER_INFO[sid]["controller_index"] = index
+    notify_state_change()
+
+    return index
+
 
+def apply_input(message):
+    message = json.loads(message)
+    index = message[0]
+    input_packet = message[1]
+    nuxbt.set_controller_input(index, input_packet)
+    DIRECT_INPUTS[index] = input_packet
+    metrics_collector.count_input_event(index)
+    notify_state_change()
 
-@sio.on('state')
-def on_state():
+
+def apply_binary_input(sid, message):
+    if len(message) != BINARY_INPUT_SIZE:
+        return
+    index = message[0]
+    sequence = int.from_bytes(message[8:12], "little")
+    if not input_sequencer.accept(sid, index, sequence):
+        metrics_collector.count_dropped_input_event(index)
+        return
+    # The input bytes are laid out as a little-endian packed input
+    packed_input = int.from_bytes(message[1:8], "little")
+    nuxbt.set_controller_input(index, packed_input)
+    DIRECT_INPUTS[index] = packed_input
+    metrics_collector.count_input_event(index)
+    notify_state_change()
+
+
+def start_macro(message):
+    message = json.loads(message)
+    index = message[0]
+    macro = message[1]
+    macro_id = nuxbt.macro(index, macro, block=False)
+    notify_state_change()
+    return macro_id
+
+
+def stop_all_macros():
+    if nuxbt:
+        nuxbt.clear_all_macros()
+        notify_state_change()
+
+
+def read_state():
     state_proxy = nuxbt.state.copy()
     state = {}
     for controller in state_proxy.keys():
         state[controller] = state_proxy[controller].copy()
-    emit('state', state)
+        if controller in DIRECT_INPUTS:
+            direct_input = DIRECT_INPUTS[controller]
+            if type(direct_input) is int:
+                direct_input = unpack_controller_input(direct_input)
+            state[controller]["direct_input"] = direct_input
+    return state
+
+
+def update_state():
+    return state_publisher.update(read_state())
+
+
+# Flask-SocketIO event handlers (threading mode)
+
+@sio.on('connect')
+def on_connect():
+    add_user(request.sid)
+
+
+def publish_state():
+    diff = update_state()
+    if diff:
+        sio.emit('state_diff', diff, to=STATE_ROOM)
+
+
+def run_state_publisher():
+    while True:
+        wait_for_state_change()
+        if nuxbt is not None:
+            try:
+                publish_state()
+            except Exception as e:
+                print("Failed to publish state:", e)
+        sio.sleep(STATE_PUBLISH_INTERVAL)
+
+
+@sio.on('subscribe_state')
+def on_subscribe_state():
+    global state_task
+    with user_info_lock:
+        if state_task is None:
+            state_task = sio.start_background_task(run_state_publisher)
+        add_state_subscriber(request.sid)
+
+    join_room(STATE_ROOM)
+    # Bring the state up to date before taking the snapshot, so the
+    # snapshot isn't a publishing interval behind
+    publish_state()
+    emit('state_snapshot', state_publisher.snapshot())
 
 
 @sio.on('disconnect')
 def on_disconnect():
     print("Disconnected")
-    with user_info_lock:
-        try:
-            index = USER_INFO[request.sid]["controller_index"]
-            nuxbt.remove_controller(index)
-        except KeyError:
-            pass
+    remove_user(request.sid)
 
 
 @sio.on('shutdown')
 def on_shutdown(index):
-    nuxbt.remove_controller(index)
+    shutdown_controller(index)
 
 
 @sio.on('web_create_pro_controller')
@@ -285,12 +459,7 @@ def on_create_controller():
     print("Create Controller")
 
     try:
-        reconnect_addresses = nuxbt.get_switch_addresses()
-        index = nuxbt.create_controller(PRO_CONTROLLER, reconnect_address=reconnect_addresses)
-
-        with user_info_lock:
-            USER_INFO[request.sid]["controller_index"] = index
-
+        index = create_user_controller(request.sid)
         emit('create_pro_controller', index)
     except Exception as e:
         emit('error', str(e))
@@ -299,33 +468,120 @@ def on_create_controller():
 @sio.on('input')
 def handle_input(message):
     # print("Webapp Input", time.perf_counter())
-    message = json.loads(message)
-    index = message[0]
-    input_packet = message[1]
-    nuxbt.set_controller_input(index, input_packet)
+    apply_input(message)
+
+
+@sio.on('binary_input')
+def handle_binary_input(message):
+    apply_binary_input(request.sid, message)
 
 
 @sio.on('macro')
 def handle_macro(message):
-    message = json.loads(message)
-    index = message[0]
-    macro = message[1]
-    macro_id = nuxbt.macro(index, macro, block=False)
-    return macro_id
-
+    return start_macro(message)
 
 
 @sio.on('stop_all_macros')
 def handle_stop_all_macros():
-    if nuxbt:
-        nuxbt.clear_all_macros()
+    stop_all_macros()
+
+
+# ASGI-native Socket.IO server. Clients connect over a persistent
+# WebSocket instead of HTTP long-polling and input events are handled
+# directly on the event loop. Anything that waits on the Nuxbt
+# processes is run in a worker thread. The Flask routes are mounted
+# behind it.
+asio = socketio.AsyncServer(async_mode='asgi', cookie=False, cors_allowed_origins='*')
+native_asgi = socketio.ASGIApp(asio, other_asgi_app=flask_asgi)
+async_state_task = None
+
+
+async def async_publish_state():
+    diff = await asyncio.to_thread(update_state)
+    if diff:
+        await asio.emit('state_diff', diff, to=STATE_ROOM)
+
+
+async def async_run_state_publisher():
+    while True:
+        await asyncio.to_thread(wait_for_state_change)
+        if nuxbt is not None:
+            try:
+                await async_publish_state()
+            except Exception as e:
+                print("Failed to publish state:", e)
+        await asio.sleep(STATE_PUBLISH_INTERVAL)
+
+
+@asio.on('connect')
+async def async_on_connect(sid, environ):
+    add_user(sid)
+
+
+@asio.on('subscribe_state')
+async def async_on_subscribe_state(sid):
+    global async_state_task
+    with user_info_lock:
+        if async_state_task is None:
+            async_state_task = asio.start_background_task(async_run_state_publisher)
+        add_state_subscriber(sid)
+
+    await asio.enter_room(sid, STATE_ROOM)
+    await async_publish_state()
+    await asio.emit('state_snapshot', state_publisher.snapshot(), to=sid)
+
+
+@asio.on('disconnect')
+async def async_on_disconnect(sid):
+    print("Disconnected")
+    await asyncio.to_thread(remove_user, sid)
+
+
+@asio.on('shutdown')
+async def async_on_shutdown(sid, index):
+    await asyncio.to_thread(shutdown_controller, index)
+
+
+@asio.on('web_create_pro_controller')
+async def async_on_create_controller(sid):
+    print("Create Controller")
+
+    try:
+        index = await asyncio.to_thread(create_user_controller, sid)
+        await asio.emit('create_pro_controller', index, to=sid)
+    except Exception as e:
+        await asio.emit('error', str(e), to=sid)
+
+
+@asio.on('input')
+async def async_handle_input(sid, message):
+    # Direct input is written to shared memory and never blocks
+    apply_input(message)
+
+
+@asio.on('binary_input')
+async def async_handle_binary_input(sid, message):
+    apply_binary_input(sid, message)
+
+
+@asio.on('macro')
+async def async_handle_macro(sid, message):
+    return await asyncio.to_thread(start_macro, message)
+
 
+@asio.on('stop_all_macros')
+async def async_handle_stop_all_macros(sid):
+    await asyncio.to_thread(stop_all_macros)
 
 
-def start_web_app(ip='0.0.0.0', port=8000, usessl=False, cert_path=None, debug=False):
+def start_web_app(ip='0.0.0.0', port=8000, usessl=False, cert_path=None, debug=False,
+                  native_socketio=False):
     global nuxbt
     if nuxbt is None:
         nuxbt = Nuxbt(debug=debug)
+    metrics_collector.start(nuxbt)
+    # The native server gives clients a WebSocket transport for input
+    server_app = native_asgi if native_socketio else app_asgi
 
     if usessl:
         if cert_path is None:
@@ -370,9 +626,9 @@ def start_web_app(ip='0.0.0.0', port=8000, usessl=False, cert_path=None, debug=F
 
         # Run with uvicorn
         # Note: uvicorn.run blocks.
-        uvicorn.run(app_asgi, host=ip, port=port, ssl_keyfile=key_path, ssl_certfile=cert_path)
+        uvicorn.run(server_app, host=ip, port=port, ssl_keyfile=key_path, ssl_certfile=cert_path)
     else:
-        uvicorn.run(app_asgi, host=ip, port=port)
+        uvicorn.run(server_app, host=ip, port=port)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import { useEffect, useState } from 'react';
 import { socket } from './socket';
-import type { AppState } from './types';
+import { applyDiff, checkDiff } from './state';
+import type { AppState, StateDiff, StateSnapshot } from './types';
 import { Plus, Gamepad2, AlertCircle, ArrowLeft, X } from 'lucide-react';
 import { ControllerVisual } from './components/ControllerVisual';
 import { ThemeToggle } from './components/ThemeToggle';
@@ -24,8 +25,30 @@ function App() {
   }, [activeTab]);
 
   useEffect(() => {
-    function onState(value: AppState) {
-      setControllers(value);
+    // The server pushes state diffs on top of a snapshot. Diffs received
+    // before the snapshot, or already included in it, are ignored.
+    let version: number | null = null;
+
+    function subscribe() {
+      version = null;
+      socket.emit('subscribe_state');
+    }
+
+    function onStateSnapshot(snapshot: StateSnapshot) {
+      version = snapshot.version;
+      setControllers(snapshot.state);
+    }
+
+    function onStateDiff(diff: StateDiff) {
+      const action = checkDiff(version, diff);
+      if (action === 'resync') {
+        // A diff was missed, so start over from a new snapshot
+        subscribe();
+        return;
+      }
+      if (action === 'ignore') return;
+      version = diff.version;
+      setControllers(previous => applyDiff(previous, diff));
     }
 
     function onControllerCreated(index: number) {
@@ -37,7 +60,9 @@ function App() {
       // Removed timeout, user wants persistent pop-up until closed
     }
 
-    socket.on('state', onState);
+    socket.on('connect', subscribe);
+    socket.on('state_snapshot', onStateSnapshot);
+    socket.on('state_diff', onStateDiff);
     socket.on('error', onError);
     socket.on('create_pro_controller', onControllerCreated);
 
@@ -47,19 +72,18 @@ function App() {
     window.addEventListener('error', handleGlobalError);
     window.addEventListener('unhandledrejection', handlePromiseError);
 
-    const pollInterval = setInterval(() => {
-        if (socket.connected) {
-            socket.emit('state');
-        }
-    }, 100);
+    if (socket.connected) {
+        subscribe();
+    }
 
     return () => {
-      socket.off('state', onState);
+      socket.off('connect', subscribe);
+      socket.off('state_snapshot', onStateSnapshot);
+      socket.off('state_diff', onStateDiff);
       socket.off('error', onError);
       socket.off('create_pro_controller', onControllerCreated);
       window.removeEventListener('error', handleGlobalError);
       window.removeEventListener('unhandledrejection', handlePromiseError);
-      clearInterval(pollInterval);
     };
   }, []);
 
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import type { DirectInputPacket, KeyMap } from '../types';
-import { socket } from '../socket';
+import { sendInput } from '../input';
 import { ArrowUp, ArrowDown, ArrowLeft, ArrowRight } from 'lucide-react';
 import { DEFAULT_KEYBINDS } from '../defaults';
 
@@ -51,7 +51,7 @@ export const ControllerInput: React.FC<Props> = ({ index }) => {
     // Only update if changed (deep compare simplified)
     if (JSON.stringify(newInput) !== JSON.stringify(inputRef.current)) {
         setInput(newInput);
-        socket.emit('input', JSON.stringify([parseInt(index), newInput]));
+        sendInput(parseInt(index), newInput);
     }
   };
 
@@ -1,6 +1,6 @@
 import React, { useRef, useEffect } from 'react';
 import type { DirectInputPacket } from '../types';
-import { socket } from '../socket';
+import { sendInput } from '../input';
 import proControllerSvg from '../assets/pro-controller.svg';
 
 interface Props {
@@ -127,7 +127,7 @@ export const ControllerVisual: React.FC<Props> = ({ index, input, setInput }) =>
         const newStr = JSON.stringify(packet);
         if (newStr !== lastInputRef.current) {
             setInput(packet);
-            socket.emit('input', JSON.stringify([parseInt(index), packet]));
+            sendInput(parseInt(index), packet);
             lastInputRef.current = newStr;
         }
 
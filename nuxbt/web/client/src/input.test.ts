@@ -0,0 +1,92 @@
+import { describe, it, expect, vi } from 'vitest'
+import { BINARY_INPUT_SIZE, encodeInput, nextSequence } from './input'
+import type { DirectInputPacket } from './types'
+
+vi.mock('./socket', () => ({
+  socket: {
+    emit: vi.fn(),
+  },
+}))
+
+function createPacket(fields: Partial<DirectInputPacket> = {}): DirectInputPacket {
+  return {
+    L_STICK: { PRESSED: false, X_VALUE: 0, Y_VALUE: 0 },
+    R_STICK: { PRESSED: false, X_VALUE: 0, Y_VALUE: 0 },
+    DPAD_UP: false,
+    DPAD_LEFT: false,
+    DPAD_RIGHT: false,
+    DPAD_DOWN: false,
+    L: false,
+    ZL: false,
+    R: false,
+    ZR: false,
+    JCL_SR: false,
+    JCL_SL: false,
+    JCR_SR: false,
+    JCR_SL: false,
+    PLUS: false,
+    MINUS: false,
+    HOME: false,
+    CAPTURE: false,
+    Y: false,
+    X: false,
+    B: false,
+    A: false,
+    ...fields,
+  }
+}
+
+describe('encodeInput', () => {
+  it('encodes an idle packet', () => {
+    const buffer = encodeInput(3, createPacket(), 7)
+
+    expect(buffer.byteLength).toBe(BINARY_INPUT_SIZE)
+    expect(Array.from(new Uint8Array(buffer))).toEqual(
+      [3, 0, 0, 0, 0, 0, 0, 0, 7, 0, 0, 0])
+  })
+
+  it('sets button bits', () => {
+    const packet = createPacket({
+      A: true,
+      ZR: true,
+      HOME: true,
+      MINUS: true,
+      DPAD_DOWN: true,
+      ZL: true,
+      L_STICK: { PRESSED: true, X_VALUE: 0, Y_VALUE: 0 },
+      R_STICK: { PRESSED: true, X_VALUE: 0, Y_VALUE: 0 },
+    })
+    const bytes = new Uint8Array(encodeInput(0, packet, 0))
+
+    expect(bytes[1]).toBe(0x08 | 0x80)
+    expect(bytes[2]).toBe(0x10 | 0x01 | 0x04 | 0x08)
+    expect(bytes[3]).toBe(0x01 | 0x80)
+  })
+
+  it('clamps and rounds stick values to int8', () => {
+    const packet = createPacket({
+      L_STICK: { PRESSED: false, X_VALUE: 250, Y_VALUE: -250 },
+      R_STICK: { PRESSED: false, X_VALUE: 49.6, Y_VALUE: -100 },
+    })
+    const view = new DataView(encodeInput(0, packet, 0))
+
+    expect(view.getInt8(4)).toBe(100)
+    expect(view.getInt8(5)).toBe(-100)
+    expect(view.getInt8(6)).toBe(50)
+    expect(view.getInt8(7)).toBe(-100)
+  })
+
+  it('encodes the sequence as a little-endian uint32', () => {
+    const view = new DataView(encodeInput(0, createPacket(), 0xFFFFFFFF))
+
+    expect(view.getUint32(8, true)).toBe(0xFFFFFFFF)
+    expect(view.getUint8(8)).toBe(0xFF)
+  })
+})
+
+describe('nextSequence', () => {
+  it('wraps around after the largest uint32', () => {
+    expect(nextSequence(41)).toBe(42)
+    expect(nextSequence(0xFFFFFFFF)).toBe(0)
+  })
+})
@@ -0,0 +1,66 @@
+import { socket } from './socket';
+import type { DirectInputPacket } from './types';
+
+// Sends input as a compact binary event. Set to false to fall back to
+// JSON input events.
+export const USE_BINARY_INPUT = true;
+
+// Locations of each button within the 3 button bytes of the
+// controller's input report (upper, shared and lower byte)
+const BUTTON_BITS: [keyof DirectInputPacket, number, number][] = [
+  ['Y', 0, 0x01], ['X', 0, 0x02], ['B', 0, 0x04], ['A', 0, 0x08],
+  ['JCL_SR', 0, 0x10], ['JCL_SL', 0, 0x20], ['R', 0, 0x40], ['ZR', 0, 0x80],
+  ['MINUS', 1, 0x01], ['PLUS', 1, 0x02], ['HOME', 1, 0x10], ['CAPTURE', 1, 0x20],
+  ['DPAD_DOWN', 2, 0x01], ['DPAD_UP', 2, 0x02], ['DPAD_RIGHT', 2, 0x04], ['DPAD_LEFT', 2, 0x08],
+  ['JCR_SR', 2, 0x10], ['JCR_SL', 2, 0x20], ['L', 2, 0x40], ['ZL', 2, 0x80],
+];
+const R_STICK_PRESS_BIT = 0x04;
+const L_STICK_PRESS_BIT = 0x08;
+
+export const BINARY_INPUT_SIZE = 12;
+
+let sequence = 0;
+
+// Sequence numbers are uint32s, wrapping around to 0
+export function nextSequence(seq: number): number {
+  return (seq + 1) >>> 0;
+}
+
+function toAxis(value: number): number {
+  return Math.max(-100, Math.min(100, Math.round(value)));
+}
+
+// Layout: controller index, 3 button bytes, left X/Y and right X/Y
+// stick values as int8, then a little-endian uint32 sequence number
+export function encodeInput(index: number, packet: DirectInputPacket, seq: number): ArrayBuffer {
+  const buffer = new ArrayBuffer(BINARY_INPUT_SIZE);
+  const view = new DataView(buffer);
+  const buttons = [0, 0, 0];
+
+  for (const [button, byte, bit] of BUTTON_BITS) {
+    if (packet[button]) buttons[byte] |= bit;
+  }
+  if (packet.R_STICK.PRESSED) buttons[1] |= R_STICK_PRESS_BIT;
+  if (packet.L_STICK.PRESSED) buttons[1] |= L_STICK_PRESS_BIT;
+
+  view.setUint8(0, index);
+  view.setUint8(1, buttons[0]);
+  view.setUint8(2, buttons[1]);
+  view.setUint8(3, buttons[2]);
+  view.setInt8(4, toAxis(packet.L_STICK.X_VALUE));
+  view.setInt8(5, toAxis(packet.L_STICK.Y_VALUE));
+  view.setInt8(6, toAxis(packet.R_STICK.X_VALUE));
+  view.setInt8(7, toAxis(packet.R_STICK.Y_VALUE));
+  view.setUint32(8, seq, true);
+
+  return buffer;
+}
+
+export function sendInput(index: number, packet: DirectInputPacket) {
+  if (USE_BINARY_INPUT) {
+    sequence = nextSequence(sequence);
+    socket.emit('binary_input', encodeInput(index, packet, sequence));
+  } else {
+    socket.emit('input', JSON.stringify([index, packet]));
+  }
+}
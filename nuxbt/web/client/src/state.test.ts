@@ -0,0 +1,85 @@
+import { describe, it, expect } from 'vitest'
+import { applyDiff, checkDiff } from './state'
+import type { AppState, ControllerState, StateDiff } from './types'
+
+function createController(fields: Partial<ControllerState> = {}): ControllerState {
+  return {
+    state: 'connecting',
+    finished_macros: [],
+    errors: false,
+    direct_input: {} as ControllerState['direct_input'],
+    type: 'Pro Controller',
+    ...fields,
+  }
+}
+
+function createDiff(version: number, fields: Partial<StateDiff> = {}): StateDiff {
+  return { version, changed: {}, removed: [], ...fields }
+}
+
+describe('checkDiff', () => {
+  it('ignores diffs before a snapshot is received', () => {
+    expect(checkDiff(null, createDiff(1))).toBe('ignore')
+  })
+
+  it('ignores diffs already included in the snapshot', () => {
+    expect(checkDiff(5, createDiff(4))).toBe('ignore')
+    expect(checkDiff(5, createDiff(5))).toBe('ignore')
+  })
+
+  it('applies the next version', () => {
+    expect(checkDiff(5, createDiff(6))).toBe('apply')
+  })
+
+  it('resyncs when a version is missed', () => {
+    expect(checkDiff(5, createDiff(7))).toBe('resync')
+  })
+})
+
+describe('applyDiff', () => {
+  it('merges changed fields and removes controllers', () => {
+    const state: AppState = {
+      '0': createController(),
+      '1': createController({ state: 'crashed' }),
+    }
+
+    const next = applyDiff(state, createDiff(2, {
+      changed: { '0': { state: 'connected' }, '2': createController() },
+      removed: [1],
+    }))
+
+    expect(Object.keys(next)).toEqual(['0', '2'])
+    expect(next['0']).toEqual(createController({ state: 'connected' }))
+    // The previous state is left untouched for React
+    expect(state['0'].state).toBe('connecting')
+    expect(state['1']).toBeDefined()
+  })
+
+  it('applies a sequence of diffs, resyncing after a missed version', () => {
+    let version: number | null = 1
+    let state: AppState = { '0': createController() }
+    let resyncs = 0
+
+    const diffs = [
+      createDiff(2, { changed: { '0': { state: 'connected' } } }),
+      // Version 3 was missed
+      createDiff(4, { removed: ['0'] }),
+      createDiff(5, { changed: { '1': createController() } }),
+    ]
+    for (const diff of diffs) {
+      const action = checkDiff(version, diff)
+      if (action === 'resync') {
+        version = null
+        resyncs++
+      } else if (action === 'apply') {
+        version = diff.version
+        state = applyDiff(state, diff)
+      }
+    }
+
+    expect(resyncs).toBe(1)
+    expect(version).toBeNull()
+    expect(state['0'].state).toBe('connected')
+    expect(state['1']).toBeUndefined()
+  })
+})
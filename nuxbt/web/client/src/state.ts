@@ -0,0 +1,23 @@
+import type { AppState, StateDiff } from './types';
+
+export type DiffAction = 'ignore' | 'apply' | 'resync';
+
+// Decides what to do with a diff given the version of the current state.
+// Diffs received before the snapshot, or already included in it, are
+// ignored, and a gap in versions means a diff was missed.
+export function checkDiff(version: number | null, diff: StateDiff): DiffAction {
+  if (version === null || diff.version <= version) return 'ignore';
+  if (diff.version !== version + 1) return 'resync';
+  return 'apply';
+}
+
+export function applyDiff(state: AppState, diff: StateDiff): AppState {
+  const next: AppState = { ...state };
+  for (const [index, fields] of Object.entries(diff.changed)) {
+    next[index] = { ...next[index], ...fields };
+  }
+  for (const index of diff.removed) {
+    delete next[index];
+  }
+  return next;
+}
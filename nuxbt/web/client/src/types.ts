@@ -1,6 +1,7 @@
 export interface ControllerState {
   state: 'initializing' | 'connecting' | 'reconnecting' | 'connected' | 'crashed';
   finished_macros: string[];
+  finished_macros_cursor?: number;
   errors: string | boolean;
   direct_input: DirectInputPacket;
   type: string;
@@ -49,6 +50,17 @@ export interface StickState {
 
 export type AppState = Record<string, ControllerState>;
 
+export interface StateSnapshot {
+  version: number;
+  state: AppState;
+}
+
+export interface StateDiff {
+  version: number;
+  changed: Record<string, Partial<ControllerState>>;
+  removed: (string | number)[];
+}
+
 export interface KeyMap {
   keyboard: Record<string, string>; // Action -> Key Code
   gamepad: {
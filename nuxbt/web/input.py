@@ -0,0 +1,57 @@
+from threading import Lock
+
+
+class InputSequencer():
+    """Orders the input events of web clients by their sequence
+    numbers. Input is latest-wins, so an event that arrives after a
+    newer event from the same client is stale and is dropped rather
+    than applied.
+
+    Sequence numbers are unsigned 32-bit integers tracked per client
+    and controller, and are compared with wrap-around.
+    """
+
+    SEQUENCE_MASK = 0xFFFFFFFF
+    # Sequence numbers up to half the range ahead are considered newer
+    WINDOW = 1 << 31
+
+    def __init__(self):
+
+        # The latest sequence number, keyed by (client ID, controller index)
+        self._sequences = {}
+        self._lock = Lock()
+
+    def accept(self, sid, index, sequence):
+        """Checks if an input event is newer than the client's last
+        accepted event for a controller, and if so, accepts it.
+
+        :param sid: The client's session ID
+        :type sid: str
+        :param index: The index of the controller
+        :type index: int
+        :param sequence: The sequence number of the input event
+        :type sequence: int
+        :return: Whether or not the input should be applied
+        :rtype: bool
+        """
+
+        key = (sid, index)
+        with self._lock:
+            last = self._sequences.get(key)
+            if last is not None:
+                ahead = (sequence - last) & self.SEQUENCE_MASK
+                if ahead == 0 or ahead >= self.WINDOW:
+                    return False
+            self._sequences[key] = sequence
+            return True
+
+    def forget(self, sid):
+        """Forgets a client's sequence numbers.
+
+        :param sid: The client's session ID
+        :type sid: str
+        """
+
+        with self._lock:
+            for key in [key for key in self._sequences if key[0] == sid]:
+                del self._sequences[key]
@@ -0,0 +1,277 @@
+import time
+import logging
+from threading import Lock, Thread
+
+from ..controller.metrics import Histogram
+
+
+# Upper bounds of the exported histogram buckets, in seconds
+EXPORT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.007,
+                  0.0075, 0.008, 0.01, 0.015, 0.025, 0.05, 0.1, 0.25,
+                  0.5, 1.0)
+
+CONTROLLER_STATES = ("initializing", "connecting", "reconnecting",
+                     "connected", "crashed")
+
+CONTROLLER_HISTOGRAMS = {
+    "frame_period": "Time between the starts of controller frames",
+    "processing_time": "Time taken to build a frame's input report",
+    "send_latency": "Time taken to send an input report to the Switch",
+    "subcommand_rtt": "Time from receiving a subcommand to sending its reply",
+}
+
+CONTROLLER_COUNTERS = {
+    "blocking_io_errors": "Input reports dropped due to a full send buffer",
+    "skipped_sends": "Input reports not sent since they were unchanged",
+    "reconnects": "Attempts to recover a lost connection to the Switch",
+    "skipped_frames": "Frames skipped after falling a whole frame behind",
+    "coalesced_inputs": "Direct inputs replaced before a frame applied them",
+}
+
+
+class MetricsCollector():
+    """Collects the metrics of a Nuxbt instance into an OpenMetrics
+    text snapshot. The controllers' shared state is read once per
+    interval on a background thread, so serving the snapshot doesn't
+    touch the Manager proxies.
+    """
+
+    def __init__(self, interval=1.0):
+
+        self.logger = logging.getLogger('nuxbt')
+        self.interval = interval
+
+        # Latency of reading a controller's state through the Manager
+        self.ipc_latency = Histogram()
+
+        # Socket.IO input events received and dropped for arriving
+        # out of order, keyed by controller index
+        self._input_events = {}
+        self._dropped_input_events = {}
+        self._input_events_lock = Lock()
+
+        self._snapshot = None
+        self._thread = None
+        # Whether the last collection failed, to avoid logging
+        # the same failure every interval
+        self._failing = False
+
+    def count_input_event(self, index):
+        """Counts a Socket.IO input event for a controller.
+
+        :param index: The index of the controller
+        :type index: int
+        """
+
+        with self._input_events_lock:
+            self._input_events[index] = self._input_events.get(index, 0) + 1
+
+    def count_dropped_input_event(self, index):
+        """Counts a Socket.IO input event for a controller that was
+        dropped for arriving out of order.
+
+        :param index: The index of the controller
+        :type index: int
+        """
+
+        with self._input_events_lock:
+            self._dropped_input_events[index] = (
+                self._dropped_input_events.get(index, 0) + 1)
+
+    def start(self, nuxbt):
+        """Starts collecting metrics on a background thread.
+
+        :param nuxbt: The Nuxbt instance to collect metrics from
+        :type nuxbt: Nuxbt
+        """
+
+        if self._thread:
+            return
+
+        self._thread = Thread(target=self._run, args=(nuxbt,), daemon=True)
+        self._thread.start()
+
+    def _run(self, nuxbt):
+
+        while True:
+            self._collect_safely(nuxbt)
+            time.sleep(self.interval)
+
+    def _collect_safely(self, nuxbt):
+        """Collects metrics, logging instead of raising on failure so
+        that the collector thread keeps running. The snapshot is stale
+        until a collection succeeds.
+        """
+
+        try:
+            self.collect(nuxbt)
+        except Exception:
+            if not self._failing:
+                self.logger.exception("Failed to collect metrics")
+            else:
+                self.logger.debug("Failed to collect metrics", exc_info=True)
+            self._failing = True
+        else:
+            if self._failing:
+                self.logger.info("Metrics collection recovered")
+            self._failing = False
+
+    def snapshot(self, nuxbt=None):
+        """Gets the latest metrics snapshot. If none has been collected
+        yet, one is collected from the given Nuxbt instance.
+
+        :param nuxbt: The Nuxbt instance to collect metrics from if
+        needed, defaults to None
+        :type nuxbt: Nuxbt, optional
+        :return: The metrics in the OpenMetrics text format
+        :rtype: str
+        """
+
+        if self._snapshot is None and nuxbt is not None:
+            self.collect(nuxbt)
+        return self._snapshot or "# EOF\n"
+
+    def collect(self, nuxbt):
+        """Reads the controllers' state and renders a new snapshot.
+
+        :param nuxbt: The Nuxbt instance to collect metrics from
+        :type nuxbt: Nuxbt
+        """
+
+        controllers = {}
+        state = nuxbt.state
+        for index in list(state.keys()):
+            start = time.perf_counter()
+            try:
+                controllers[index] = state[index].copy()
+            except (KeyError, AttributeError):
+                continue
+            self.ipc_latency.record(time.perf_counter() - start)
+
+        with self._input_events_lock:
+            input_events = dict(self._input_events)
+            dropped_input_events = dict(self._dropped_input_events)
+
+        self._snapshot = render_metrics(
+            controllers, input_events, dropped_input_events,
+            self.ipc_latency.snapshot())
+
+
+def format_labels(labels):
+
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def render_histogram(lines, name, snapshot, labels):
+    """Renders a histogram snapshot (see nuxbt.controller.metrics)
+    as cumulative OpenMetrics histogram samples.
+    """
+
+    buckets = snapshot["buckets"]
+    cumulative = 0
+    position = 0
+    for bound in EXPORT_BUCKETS:
+        while position < len(buckets) and buckets[position][0] <= bound:
+            cumulative += buckets[position][1]
+            position += 1
+        bucket_labels = dict(labels, le=f"{bound:g}")
+        lines.append(f"{name}_bucket{format_labels(bucket_labels)} {cumulative}")
+
+    bucket_labels = dict(labels, le="+Inf")
+    lines.append(
+        f"{name}_bucket{format_labels(bucket_labels)} {snapshot['count']}")
+    lines.append(f"{name}_count{format_labels(labels)} {snapshot['count']}")
+    lines.append(
+        f"{name}_sum{format_labels(labels)} "
+        f"{snapshot['mean'] * snapshot['count']:.9g}")
+
+
+def render_metrics(controllers, input_events, dropped_input_events,
+                   ipc_latency):
+    """Renders controller metrics in the OpenMetrics text format.
+
+    :param controllers: Copies of the controllers' state, keyed by index
+    :type controllers: dict
+    :param input_events: The number of Socket.IO input events received,
+    keyed by controller index
+    :type input_events: dict
+    :param dropped_input_events: The number of Socket.IO input events
+    dropped for arriving out of order, keyed by controller index
+    :type dropped_input_events: dict
+    :param ipc_latency: A histogram snapshot of the Manager IPC latency
+    :type ipc_latency: dict
+    :return: The rendered metrics
+    :rtype: str
+    """
+
+    lines = []
+
+    lines.append("# HELP nuxbt_controllers Number of controllers")
+    lines.append("# TYPE nuxbt_controllers gauge")
+    lines.append(f"nuxbt_controllers {len(controllers)}")
+
+    lines.append("# HELP nuxbt_controller_state Current state of each controller")
+    lines.append("# TYPE nuxbt_controller_state stateset")
+    for index, state in controllers.items():
+        for name in CONTROLLER_STATES:
+            labels = {"controller": index, "nuxbt_controller_state": name}
+            value = 1 if state.get("state") == name else 0
+            lines.append(f"nuxbt_controller_state{format_labels(labels)} {value}")
+
+    lines.append("# HELP nuxbt_macros_finished Macros finished or stopped")
+    lines.append("# TYPE nuxbt_macros_finished counter")
+    for index, state in controllers.items():
+        labels = format_labels({"controller": index})
+        finished = state.get("finished_macros_cursor", 0)
+        lines.append(f"nuxbt_macros_finished_total{labels} {finished}")
+
+    lines.append("# HELP nuxbt_macro_queue_depth Running and queued macros")
+    lines.append("# TYPE nuxbt_macro_queue_depth gauge")
+    for index, state in controllers.items():
+        metrics = state.get("metrics")
+        if metrics:
+            labels = format_labels({"controller": index})
+            lines.append(
+                f"nuxbt_macro_queue_depth{labels} {metrics['macro_queue_depth']}")
+
+    for name, description in CONTROLLER_COUNTERS.items():
+        lines.append(f"# HELP nuxbt_{name} {description}")
+        lines.append(f"# TYPE nuxbt_{name} counter")
+        for index, state in controllers.items():
+            metrics = state.get("metrics")
+            if metrics:
+                labels = format_labels({"controller": index})
+                lines.append(f"nuxbt_{name}_total{labels} {metrics[name]}")
+
+    for name, description in CONTROLLER_HISTOGRAMS.items():
+        lines.append(f"# HELP nuxbt_{name}_seconds {description}")
+        lines.append(f"# TYPE nuxbt_{name}_seconds histogram")
+        for index, state in controllers.items():
+            metrics = state.get("metrics")
+            if metrics:
+                render_histogram(lines, f"nuxbt_{name}_seconds",
+                                 metrics[name], {"controller": index})
+
+    lines.append("# HELP nuxbt_input_events Socket.IO input events received")
+    lines.append("# TYPE nuxbt_input_events counter")
+    for index, count in input_events.items():
+        labels = format_labels({"controller": index})
+        lines.append(f"nuxbt_input_events_total{labels} {count}")
+
+    lines.append("# HELP nuxbt_input_events_dropped Socket.IO input events "
+                 "dropped for arriving out of order")
+    lines.append("# TYPE nuxbt_input_events_dropped counter")
+    for index, count in dropped_input_events.items():
+        labels = format_labels({"controller": index})
+        lines.append(f"nuxbt_input_events_dropped_total{labels} {count}")
+
+    lines.append("# HELP nuxbt_manager_ipc_seconds Latency of reading a "
+                 "controller's state through the Manager")
+    lines.append("# TYPE nuxbt_manager_ipc_seconds histogram")
+    render_histogram(lines, "nuxbt_manager_ipc_seconds", ipc_latency, {})
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,79 @@
+from threading import Lock
+
+
+class StatePublisher():
+    """Tracks the state of a Nuxbt instance's controllers and turns
+    each change into a versioned diff, so clients can be sent only
+    what changed instead of polling for the full state.
+
+    A diff is a dictionary containing:
+    - version: The state version after the diff is applied
+    - changed: The changed keys of each changed controller's state,
+      keyed by controller index
+    - removed: The indices of the removed controllers
+
+    A client applies diffs in order on top of a snapshot, and
+    re-subscribes if it sees a gap in the versions.
+    """
+
+    # Keys that are served elsewhere (/metrics) and aren't published
+    EXCLUDED_KEYS = ("metrics",)
+
+    def __init__(self):
+
+        self.version = 0
+        self.state = {}
+        self._lock = Lock()
+
+    def update(self, state):
+        """Updates the tracked state.
+
+        :param state: Copies of the controllers' state, keyed by index
+        :type state: dict
+        :return: A diff from the previous state, or None if nothing
+        has changed
+        :rtype: dict or None
+        """
+
+        with self._lock:
+            changed = {}
+            new_state = {}
+            for index, controller_state in state.items():
+                controller_state = {
+                    key: value for key, value in controller_state.items()
+                    if key not in self.EXCLUDED_KEYS}
+                new_state[index] = controller_state
+
+                previous = self.state.get(index, {})
+                fields = {
+                    key: value for key, value in controller_state.items()
+                    if key not in previous or previous[key] != value}
+                if fields:
+                    changed[index] = fields
+
+            removed = [index for index in self.state if index not in state]
+            if not changed and not removed:
+                return None
+
+            self.state = new_state
+            self.version += 1
+
+            return {
+                "version": self.version,
+                "changed": changed,
+                "removed": removed,
+            }
+
+    def snapshot(self):
+        """Gets the full tracked state.
+
+        :return: The state version and the controllers' state,
+        keyed by index
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {
+                "version": self.version,
+                "state": self.state,
+            }
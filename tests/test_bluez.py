@@ -0,0 +1,310 @@
+import importlib.util
+import os
+import pytest
+from unittest.mock import MagicMock
+
+# nuxbt.bluez is mocked in conftest, so the real module is loaded from
+# its file against a mocked D-Bus
+BLUEZ_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "nuxbt", "bluez.py")
+
+
+class DBusException(Exception):
+    pass
+
+
+def load_bluez():
+    spec = importlib.util.spec_from_file_location("bluez_under_test", BLUEZ_PATH)
+    bluez = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bluez)
+    return bluez
+
+
+@pytest.fixture
+def bluez(monkeypatch):
+    bluez = load_bluez()
+    dbus = MagicMock()
+    dbus.exceptions.DBusException = DBusException
+    interface = MagicMock()
+    interface.GetAll.return_value = {
+        "Address": "aa:bb:cc:dd:ee:ff",
+        "Alias": "Pro Controller",
+        "Powered": True,
+        "Pairable": False,
+    }
+    dbus.Interface.return_value = interface
+
+    monkeypatch.setattr(bluez, "dbus", dbus)
+    monkeypatch.setattr(bluez, "get_signal_bus", lambda: MagicMock())
+    bluez.interface = interface
+    return bluez
+
+
+def create_cached_bluez(bluez):
+    bt = bluez.BlueZ()
+    bt.enable_property_cache()
+    return bt
+
+
+def test_properties_are_cached(bluez):
+    bt = create_cached_bluez(bluez)
+
+    assert bt.address == "AA:BB:CC:DD:EE:FF"
+    assert bt.alias == "Pro Controller"
+    assert bt.powered
+
+    bluez.interface.GetAll.assert_called_once_with(bluez.ADAPTER_INTERFACE)
+    bluez.interface.Get.assert_not_called()
+
+
+def test_properties_changed_updates_cache(bluez):
+    bt = create_cached_bluez(bluez)
+    bluez.interface.Get.return_value = False
+
+    bt._on_properties_changed(
+        bluez.ADAPTER_INTERFACE, {"Alias": "Joy-Con (L)"}, ["Powered"])
+
+    assert bt.alias == "Joy-Con (L)"
+    assert not bt.powered
+    bluez.interface.Get.assert_called_once_with(bluez.ADAPTER_INTERFACE, "Powered")
+
+
+def test_reset_adapter_invalidates_cache(bluez, monkeypatch):
+    bt = create_cached_bluez(bluez)
+    monkeypatch.setattr(bluez, "hci_command", MagicMock())
+
+    bt.reset_adapter()
+    bt.address
+
+    assert bluez.interface.GetAll.call_count == 2
+
+
+def test_set_properties_skips_matching_values(bluez):
+    bt = create_cached_bluez(bluez)
+
+    bt.set_properties({
+        "Powered": True,
+        "Pairable": True,
+        "Alias": "Joy-Con (R)",
+    })
+
+    set_names = [call.args[1] for call in bluez.interface.Set.call_args_list]
+    assert set_names == ["Pairable", "Alias"]
+    assert bt.pairable
+    assert bt.alias == "Joy-Con (R)"
+
+
+def test_set_properties_raises_errors(bluez):
+    bt = create_cached_bluez(bluez)
+    bluez.interface.Set.side_effect = DBusException("Pairable")
+
+    with pytest.raises(DBusException):
+        bt.set_properties({"Pairable": True})
+    assert not bt.pairable
+
+
+def test_properties_are_not_cached_without_signal_bus(bluez, monkeypatch):
+    monkeypatch.setattr(bluez, "get_signal_bus", lambda: None)
+    bluez.interface.Get.return_value = "aa:bb:cc:dd:ee:ff"
+    bt = bluez.BlueZ()
+
+    bt.address
+    bt.address
+
+    assert bluez.interface.Get.call_count == 2
+    bluez.interface.GetAll.assert_not_called()
+
+
+def managed_objects(bluez):
+    return {
+        "/org/bluez/hci0": {bluez.ADAPTER_INTERFACE: {}},
+        "/org/bluez/hci0/dev_1": {bluez.DEVICE_INTERFACE: {
+            "Address": "98:b6:e9:00:00:01", "Alias": "Nintendo Switch"}},
+        "/org/bluez/hci0/dev_2": {bluez.DEVICE_INTERFACE: {
+            "Address": "98:b6:e9:00:00:02", "Alias": "Nintendo Switch"}},
+        "/org/bluez/hci0/dev_3": {bluez.DEVICE_INTERFACE: {
+            "Address": "00:11:22:33:44:55", "Alias": "Headphones"}},
+    }
+
+
+def test_find_devices_by_alias_uses_one_call(bluez):
+    bluez.interface.GetManagedObjects.return_value = managed_objects(bluez)
+
+    addresses, paths = bluez.find_devices_by_alias(
+        "nintendo switch", return_path=True, created_bus=MagicMock())
+
+    assert addresses == ["98:B6:E9:00:00:01", "98:B6:E9:00:00:02"]
+    assert paths == ["/org/bluez/hci0/dev_1", "/org/bluez/hci0/dev_2"]
+    bluez.interface.GetManagedObjects.assert_called_once()
+    bluez.interface.Get.assert_not_called()
+
+
+def test_find_device_by_address(bluez):
+    bluez.interface.GetManagedObjects.return_value = managed_objects(bluez)
+    bt = bluez.BlueZ()
+
+    assert bt.find_device_by_address("00:11:22:33:44:55") == "/org/bluez/hci0/dev_3"
+    assert bt.find_device_by_address("00:00:00:00:00:00") is None
+
+
+def test_disconnect_devices_by_alias(bluez):
+    bluez.interface.GetManagedObjects.return_value = managed_objects(bluez)
+
+    bluez.disconnect_devices_by_alias("Headphones", created_bus=MagicMock())
+
+    bluez.interface.Disconnect.assert_called_once()
+
+
+class TestDeviceIndex:
+
+    def test_signals_update_index(self, bluez):
+        index = bluez.DeviceIndex()
+
+        index.add("/dev_1", {"Address": "aa:aa:aa:aa:aa:aa", "Alias": "AA"})
+        index.update("/dev_1", {"Alias": "Nintendo Switch"})
+
+        assert index.find_by_alias("AA") == ([], [])
+        assert index.find_by_alias("Nintendo Switch") == (
+            ["AA:AA:AA:AA:AA:AA"], ["/dev_1"])
+
+        index.remove("/dev_1")
+
+        assert index.find_by_address("aa:aa:aa:aa:aa:aa") is None
+        assert index.devices == {}
+        assert index.by_alias == {}
+
+    def test_cached_index_tracks_signals(self, bluez):
+        signal_bus = MagicMock()
+        bluez.get_signal_bus = lambda: signal_bus
+        bluez.interface.GetManagedObjects.return_value = managed_objects(bluez)
+
+        index = bluez.get_device_index()
+        handlers = {call.kwargs["signal_name"]: call.args[0]
+                    for call in signal_bus.add_signal_receiver.call_args_list}
+        handlers["InterfacesAdded"]("/org/bluez/hci0/dev_4", {
+            bluez.DEVICE_INTERFACE: {
+                "Address": "98:b6:e9:00:00:04", "Alias": "Nintendo Switch"}})
+        handlers["InterfacesRemoved"](
+            "/org/bluez/hci0/dev_1", [bluez.DEVICE_INTERFACE])
+
+        assert bluez.get_device_index() is index
+        assert bluez.find_devices_by_alias("Nintendo Switch", cached=True) == [
+            "98:B6:E9:00:00:02", "98:B6:E9:00:00:04"]
+        bluez.interface.GetManagedObjects.assert_called_once()
+
+
+@pytest.fixture
+def hci_socket(bluez, monkeypatch):
+    sock = MagicMock()
+    sock_module = MagicMock()
+    sock_module.timeout = TimeoutError
+    sock_module.socket.return_value = sock
+    monkeypatch.setattr(bluez, "socket", sock_module)
+    return sock
+
+
+def command_complete(opcode, params):
+    return bytes([0x04, 0x0E, 3 + len(params), 1]) + \
+        opcode.to_bytes(2, "little") + params
+
+
+class TestHCI:
+
+    def test_read_device_class(self, bluez, hci_socket):
+        read_class = 0x03 << 10 | 0x0023
+        hci_socket.recv.side_effect = [
+            # Events for other commands are skipped
+            command_complete(0x0C03, bytes([0])),
+            command_complete(read_class, bytes([0, 0x08, 0x25, 0x00])),
+        ]
+        bt = bluez.BlueZ()
+
+        assert bt.device_class == "0x002508"
+        hci_socket.bind.assert_called_once_with((0,))
+        hci_socket.send.assert_called_once_with(bytes([0x01, 0x23, 0x0C, 0]))
+
+    def test_write_bd_address(self, bluez, hci_socket, monkeypatch):
+        write_address = 0x3F << 10 | 0x0001
+        hci_socket.recv.return_value = command_complete(write_address, bytes([0]))
+        ioctl = MagicMock()
+        monkeypatch.setattr(bluez.fcntl, "ioctl", ioctl)
+
+        bluez.replace_mac_addresses(["/org/bluez/hci1"], ["98:B6:E9:01:02:03"])
+
+        hci_socket.bind.assert_called_once_with((1,))
+        hci_socket.send.assert_called_once_with(
+            bytes([0x01, 0x01, 0xFC, 6, 0x03, 0x02, 0x01, 0xE9, 0xB6, 0x98]))
+        assert [call.args[1:] for call in ioctl.call_args_list] == [
+            (bluez.HCIDEVDOWN, 1), (bluez.HCIDEVUP, 1)]
+
+    def test_command_failure(self, bluez, hci_socket):
+        reset = 0x03 << 10 | 0x0003
+        hci_socket.recv.return_value = bytes([0x04, 0x0F, 4, 0x0C, 1]) + \
+            reset.to_bytes(2, "little")
+
+        with pytest.raises(Exception, match="status 0x0c"):
+            bluez.hci_command("hci0", *bluez.HCI_RESET)
+
+    def test_command_timeout(self, bluez, hci_socket):
+        hci_socket.recv.side_effect = TimeoutError
+
+        with pytest.raises(TimeoutError):
+            bluez.hci_command("hci0", *bluez.HCI_RESET)
+        hci_socket.close.assert_called_once()
+
+
+def test_signal_bus_is_only_started_after_fork(bluez, monkeypatch):
+    get_signal_bus = MagicMock()
+    monkeypatch.setattr(bluez, "get_signal_bus", get_signal_bus)
+
+    # Servers create their BlueZ object before forking
+    bt = bluez.BlueZ()
+    bt.address
+    get_signal_bus.assert_not_called()
+
+    # Simulate running in the forked controller process
+    monkeypatch.setattr(bluez.os, "getpid", lambda: -1)
+    bt.enable_property_cache()
+    bt.set_properties({"Powered": True, "Pairable": True})
+
+    get_signal_bus.assert_called_once()
+    assert bt._signal_pid == -1
+    set_names = [call.args[1] for call in bluez.interface.Set.call_args_list]
+    assert set_names == ["Pairable"]
+
+
+def test_cache_is_reattached_after_fork(bluez, monkeypatch):
+    parent_bus, child_bus = MagicMock(), MagicMock()
+    signal_buses = iter([parent_bus, child_bus])
+    monkeypatch.setattr(bluez, "get_signal_bus", lambda: next(signal_buses))
+    bt = create_cached_bluez(bluez)
+    bt.address
+
+    # Simulate running in a forked child process
+    bt._signal_pid = -1
+    bt.address
+
+    assert bt.signal_bus is child_bus
+    child_bus.add_signal_receiver.assert_called_once()
+    assert bluez.interface.GetAll.call_count == 2
+
+
+def test_no_signal_bus_in_forked_child(monkeypatch):
+    bluez = load_bluez()
+    monkeypatch.setattr(bluez, "_signal_bus", MagicMock())
+    monkeypatch.setattr(bluez, "_signal_bus_pid", -1)
+
+    # The parent's main loop thread owns the default main context
+    assert bluez.get_signal_bus() is None
+
+
+def test_find_connected_devices_filters_alias(bluez):
+    objects = managed_objects(bluez)
+    for interfaces in objects.values():
+        interfaces.get(bluez.DEVICE_INTERFACE, {})["Connected"] = True
+    bluez.interface.GetManagedObjects.return_value = objects
+    bt = bluez.BlueZ()
+
+    assert bt.find_connected_devices(alias_filter="Nintendo Switch") == [
+        "/org/bluez/hci0/dev_1", "/org/bluez/hci0/dev_2"]
+    assert len(bt.find_connected_devices()) == 3
@@ -41,7 +41,8 @@ def test_help(runner):
 def test_webapp_command(runner, mock_start_web_app):
     result = runner.invoke(main, ['webapp', '-i', '127.0.0.1', '-p', '5000', '--usessl'])
     assert result.exit_code == 0
-    mock_start_web_app.assert_called_once_with(ip='127.0.0.1', port=5000, usessl=True, cert_path=None, debug=False)
+    mock_start_web_app.assert_called_once_with(ip='127.0.0.1', port=5000, usessl=True, cert_path=None, debug=False,
+                                               native_socketio=False)
 
 def test_demo_command(runner, mock_nuxbt):
     # Mocking behavior for demo
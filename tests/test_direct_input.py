@@ -0,0 +1,37 @@
+from threading import Lock
+
+from nuxbt.controller.direct_input import DirectInputSlot
+from nuxbt.controller.input import DIRECT_INPUT_IDLE
+
+
+class TestDirectInputSlot:
+
+    def test_read_write(self):
+        slot = DirectInputSlot(create=True, lock=Lock())
+        reader = DirectInputSlot(name=slot.name)
+        try:
+            assert reader.read() == (0, DIRECT_INPUT_IDLE)
+
+            slot.write(0x9C00000008)
+            assert reader.read() == (2, 0x9C00000008)
+
+            slot.write(DIRECT_INPUT_IDLE)
+            assert reader.read() == (4, DIRECT_INPUT_IDLE)
+        finally:
+            reader.close()
+            slot.close()
+            slot.unlink()
+
+    def test_torn_read_returns_last_value(self):
+        slot = DirectInputSlot(create=True)
+        try:
+            slot.write(0x08)
+            assert slot.read() == (2, 0x08)
+
+            # Simulate a writer stuck mid-write
+            slot.SEQUENCE.pack_into(slot.shm.buf, 0, 3)
+            slot.INPUT.pack_into(slot.shm.buf, slot.INPUT_OFFSET, 0x04)
+            assert slot.read() == (2, 0x08)
+        finally:
+            slot.close()
+            slot.unlink()
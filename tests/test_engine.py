@@ -0,0 +1,234 @@
+import queue
+import socket
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from nuxbt.controller.engine import ControllerEngine
+from nuxbt.controller.scheduler import FrameScheduler
+from nuxbt.controller.server import ControllerServer
+
+
+class FakeServer:
+
+    def __init__(self):
+        self.scheduler = FrameScheduler(frequency=50)
+        self.logger_level = 100
+        self.input = MagicMock()
+        self.state = {}
+        self.frames = queue.Queue()
+        self.exited = False
+        self.stopped = False
+        self.due_frames = []
+
+    def receive(self, itr):
+        return itr.recv(50)
+
+    def process_frame(self, itr, reply, frame_due=True):
+        self.frames.put(reply)
+        self.due_frames.append(frame_due)
+
+    def publish_frame_timing(self):
+        pass
+
+    def stop(self):
+        self.stopped = True
+
+    def _on_exit(self):
+        self.exited = True
+
+
+@pytest.fixture
+def engine():
+    engine = ControllerEngine(queue.Queue())
+    thread = threading.Thread(target=engine.run, daemon=True)
+    thread.start()
+    while engine._wake_writer is None:
+        time.sleep(0.001)
+    engine.test_sockets = []
+    yield engine
+    for sock in engine.test_sockets:
+        sock.close()
+
+
+def add_controller(engine, index):
+    server = FakeServer()
+    itr, switch = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    itr.setblocking(False)
+    engine.test_sockets += [itr, switch]
+    ctrl = MagicMock()
+    engine._servers[index] = server
+    engine._post(engine._add_connection, index, itr, ctrl)
+    return server, switch
+
+
+def test_frames_run_per_controller(engine):
+    first, _ = add_controller(engine, 0)
+    second, _ = add_controller(engine, 1)
+
+    for server in (first, second):
+        for _ in range(3):
+            assert server.frames.get(timeout=1) is None
+
+
+def test_subcommand_answered_immediately(engine):
+    server, switch = add_controller(engine, 0)
+    assert server.frames.get(timeout=1) is None
+
+    subcommand = bytes([0xA2] + [0] * 10 + [0x02] + [0] * 38)
+    switch.send(subcommand)
+
+    assert server.frames.get(timeout=0.015) == subcommand
+    assert server.due_frames[-1] is False
+
+
+def test_short_message_passed_to_next_frame(engine):
+    server, switch = add_controller(engine, 0)
+    assert server.frames.get(timeout=1) is None
+
+    switch.send(bytes([0xA2, 0x10]))
+
+    assert server.frames.get(timeout=1) == bytes([0xA2, 0x10])
+
+
+def test_frames_spin_before_deadline(engine):
+    server, _ = add_controller(engine, 0)
+    scheduler = server.scheduler
+    scheduler.spin_time = 0.005
+    scheduler.wait = MagicMock(wraps=scheduler.wait)
+    assert server.frames.get(timeout=1) is None
+
+    for _ in range(3):
+        assert server.frames.get(timeout=1) is None
+    assert scheduler.wait.call_count >= 3
+
+
+def test_remove_controller(engine):
+    server, switch = add_controller(engine, 0)
+    assert server.frames.get(timeout=1) is None
+
+    engine.command_queue.put({"command": "remove", "index": 0})
+
+    deadline = time.perf_counter() + 1
+    while not server.exited and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    assert server.exited
+    server.input.clear_macros.assert_called_once()
+    assert 0 not in engine._connections
+
+
+def test_removed_controller_releases_adapter(monkeypatch):
+    servers = []
+
+    def create_server(**arguments):
+        server = MagicMock()
+        server.adapter_lock = arguments["adapter_lock"]
+        servers.append(server)
+        return server
+
+    monkeypatch.setattr('nuxbt.controller.engine.ControllerServer', create_server)
+    monkeypatch.setattr('nuxbt.controller.engine.Thread', MagicMock())
+    engine = ControllerEngine(queue.Queue())
+
+    engine._create_controller({"index": 0, "adapter_path": "/org/bluez/hci0"})
+    # The controller is removed while pairing, holding its adapter's lock
+    servers[0].adapter_lock.acquire()
+    engine._remove_controller(0)
+    engine._create_controller({"index": 1, "adapter_path": "/org/bluez/hci0"})
+
+    assert servers[1].adapter_lock is not servers[0].adapter_lock
+    assert not servers[1].adapter_lock.locked()
+
+
+class FakeL2CAPSocket:
+    """A listening L2CAP socket. Only one socket can be bound to a PSM
+    at a time, and accept blocks until the socket is shut down.
+    """
+
+    def __init__(self, bound, **kwargs):
+        self.bound = bound
+        self.psm = None
+        self.shut_down = threading.Event()
+
+    def bind(self, address):
+        if address[1] in self.bound:
+            raise OSError(98, "Address already in use")
+        self.psm = address[1]
+        self.bound[self.psm] = self
+
+    def listen(self, backlog):
+        pass
+
+    def accept(self):
+        self.shut_down.wait()
+        raise OSError(22, "Invalid argument")
+
+    def shutdown(self, how):
+        self.shut_down.set()
+
+    def close(self):
+        if self.bound.get(self.psm) is self:
+            del self.bound[self.psm]
+
+
+def create_pairing_server(bound, **arguments):
+    # Skip Bluetooth initialization
+    server = ControllerServer.__new__(ControllerServer)
+    server.logger = logging.getLogger('nuxbt')
+    server.state = arguments["state"]
+    server.lock = nullcontext()
+    server.adapter_lock = arguments["adapter_lock"]
+    server.bt = MagicMock()
+    server.controller = MagicMock()
+    server.input = MagicMock()
+    server.stopped = False
+    server._listening_sockets = []
+    server._crw_running = False
+    server.connection_reset_watchdog = lambda: None
+    return server
+
+
+def test_remove_controller_while_pairing(engine, monkeypatch):
+    bound = {}
+    sockets = SimpleNamespace(
+        socket=lambda **kwargs: FakeL2CAPSocket(bound, **kwargs),
+        AF_BLUETOOTH=31, SOCK_SEQPACKET=5, BTPROTO_L2CAP=0,
+        BDADDR_ANY="00:00:00:00:00:00", SHUT_RDWR=2)
+    monkeypatch.setattr('nuxbt.controller.server.socket', sockets)
+    monkeypatch.setattr(
+        'nuxbt.controller.engine.ControllerServer',
+        lambda **arguments: create_pairing_server(bound, **arguments))
+
+    def create(index):
+        state = {}
+        engine.command_queue.put({
+            "command": "create", "index": index, "state": state,
+            "adapter_path": "/org/bluez/hci0"})
+        wait_for(lambda: index in engine._servers and len(bound) == 2)
+        return engine._servers[index]
+
+    first = create(0)
+    first_sockets = dict(bound)
+    engine.command_queue.put({"command": "remove", "index": 0})
+    wait_for(lambda: not bound)
+
+    # The next controller on the adapter can wait for a Switch
+    second = create(1)
+    assert first.stopped
+    # A removed controller isn't reported as crashed
+    assert first.state["state"] == "connecting"
+    assert all(sock.shut_down.is_set() for sock in first_sockets.values())
+    assert set(sock.psm for sock in bound.values()) == {17, 19}
+    assert second._listening_sockets == [bound[17], bound[19]]
+
+
+def wait_for(condition, timeout=1):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.001)
@@ -0,0 +1,255 @@
+import json
+from unittest.mock import MagicMock
+
+from nuxbt.controller.input import InputParser, MacroExecutor
+from nuxbt.controller.input import DIRECT_INPUT_IDLE_PACKET, DIRECT_INPUT_IDLE
+from nuxbt.controller.input import pack_controller_input, unpack_controller_input
+from nuxbt.controller.input import FinishedMacroLog
+
+
+class TestMacroCompiler:
+
+    def test_compile_buttons(self):
+        parser = InputParser(MagicMock())
+
+        step = parser.compile_macro_line("A ZR HOME DPAD_LEFT 0.25s")
+
+        assert step[0] == 0x08 | 0x80
+        assert step[1] == 0x10
+        assert step[2] == 0x08
+        assert step[3] is None
+        assert step[4] is None
+        assert step[5] == 0.25
+
+    def test_compile_sticks(self):
+        parser = InputParser(MagicMock())
+
+        step = parser.compile_macro_line("L_STICK@-100+000 R_STICK@+000+100 1s")
+
+        assert step[:3] == (0, 0, 0)
+        assert list(step[3]) == parser.stick_ratio_to_calibrated_position(
+            -1, 0, "L_STICK")
+        assert list(step[4]) == parser.stick_ratio_to_calibrated_position(
+            0, 1, "R_STICK")
+        assert not parser.is_wait_step(step)
+
+    def test_compile_wait(self):
+        parser = InputParser(MagicMock())
+
+        step = parser.compile_macro_line("0.1s")
+
+        assert parser.is_wait_step(step)
+        assert step[5] == 0.1
+
+    def test_compile_macro_with_loop(self):
+        parser = InputParser(MagicMock())
+
+        program = parser.compile_macro("LOOP 3\n    B 0.1s\n    0.1s\n# Done\nA 0.1s")
+        steps = list(MacroExecutor(program))
+
+        assert len(steps) == 7
+        assert steps[0] == (0x04, 0, 0, None, None, 0.1)
+        assert parser.is_wait_step(steps[1])
+        assert steps[6] == (0x08, 0, 0, None, None, 0.1)
+
+    def test_executor_matches_expanded_macro(self):
+        parser = InputParser(MagicMock())
+
+        # Each macro and the lines it expands to
+        macros = [
+            ("LOOP 2\n\tHOLD L_STICK@+100+000\n\t\tR_STICK@-050+050 0.2s"
+             "\n\t\tX 0.1s\n\t0.3s",
+             ["L_STICK@+100+000 0.05s",
+              "L_STICK@+100+000 R_STICK@-050+050 0.2s",
+              "L_STICK@+100+000 X 0.1s",
+              "L_STICK@+100+000 0.05s",
+              "0.3s"] * 2),
+            ("LOOP 3\n    B 0.1s\n    LOOP 2\n        A 0.1s\n        0.1s\nHOME 1s",
+             ["B 0.1s"] + ["A 0.1s", "0.1s"] * 2 +
+             ["B 0.1s"] + ["A 0.1s", "0.1s"] * 2 +
+             ["B 0.1s"] + ["A 0.1s", "0.1s"] * 2 + ["HOME 1s"]),
+        ]
+        for macro, lines in macros:
+            expected = [parser.compile_macro_line(line) for line in lines]
+            steps = list(MacroExecutor(parser.compile_macro(macro)))
+            assert steps == expected
+
+    def test_executor_does_not_expand_loops(self):
+        parser = InputParser(MagicMock())
+
+        program = parser.compile_macro(
+            "LOOP 100000000\n    LOOP 100000000\n        A 0.1s\n        0.1s")
+        executor = MacroExecutor(program)
+
+        assert len(program) == 1
+        assert executor.next_step() == (0x08, 0, 0, None, None, 0.1)
+        assert parser.is_wait_step(executor.next_step())
+        assert executor.next_step() == (0x08, 0, 0, None, None, 0.1)
+        assert executor
+
+    def test_executor_empty_loop(self):
+        parser = InputParser(MagicMock())
+
+        executor = MacroExecutor(parser.compile_macro("LOOP 5\nA 0.1s"))
+
+        assert executor.next_step() == (0x08, 0, 0, None, None, 0.1)
+        assert not executor
+        assert executor.next_step() is None
+
+    def test_set_macro_input(self):
+        protocol = MagicMock()
+        parser = InputParser(protocol)
+
+        parser.set_macro_input(parser.compile_macro_line("B MINUS L 0.1s"))
+
+        protocol.set_button_inputs.assert_called_once_with(0x04, 0x01, 0x40)
+        protocol.set_left_stick_inputs.assert_not_called()
+        assert parser.exited_grip_order_menu
+
+    def test_macro_finishes(self):
+        protocol = MagicMock()
+        parser = InputParser(protocol)
+        state = {"finished_macros": []}
+
+        parser.buffer_macro("A 0.0s\n0.0s", "macro_id")
+        for _ in range(2):
+            parser.set_controller_input(DIRECT_INPUT_IDLE_PACKET)
+            parser.set_protocol_input(state=state)
+
+        protocol.set_button_inputs.assert_called_once_with(0x08, 0, 0)
+        assert state["finished_macros"] == ["macro_id"]
+        assert state["finished_macros_cursor"] == 1
+
+    def test_registered_macro(self):
+        parser = InputParser(MagicMock())
+        parser.register_macro(0, "A 0.1s")
+        parser.register_macro(1, "")
+        finished = []
+        parser.on_macro_finished = finished.append
+
+        parser.buffer_macro(0, "first")
+        parser.buffer_macro(0, "second")
+        parser.buffer_macro(1, "empty")
+        parser.buffer_macro(2, "unregistered")
+
+        assert [macro[1] for macro in parser.macro_buffer] == ["first", "second"]
+        # The compiled program is shared
+        assert parser.macro_buffer[0][0] is parser.macro_buffer[1][0]
+        assert finished == ["empty", "unregistered"]
+
+
+class TestFinishedMacroLog:
+
+    def test_membership_and_cursor(self):
+        log = FinishedMacroLog()
+
+        assert log.append("a") == 1
+        assert log.append("b") == 2
+
+        assert "a" in log
+        assert "c" not in log
+        assert log.since(0) == (2, ["a", "b"])
+        assert log.since(1) == (2, ["b"])
+        assert log.since(2) == (2, [])
+
+    def test_log_is_bounded(self):
+        log = FinishedMacroLog(size=3)
+
+        for i in range(10):
+            log.append(str(i))
+
+        assert len(log) == 3
+        assert log.ids() == ["7", "8", "9"]
+        assert "6" not in log
+        assert "9" in log
+        assert log.since(0) == (10, ["7", "8", "9"])
+        assert log.since(8) == (10, ["8", "9"])
+
+    def test_repeated_id_survives_eviction(self):
+        log = FinishedMacroLog(size=2)
+
+        log.append("a")
+        log.append("b")
+        log.append("a")
+        log.append("c")
+
+        assert "a" in log
+        assert "b" not in log
+
+
+class TestDirectInput:
+
+    def create_packet(self):
+        return json.loads(json.dumps(DIRECT_INPUT_IDLE_PACKET))
+
+    def test_idle_packet_packs_to_zero(self):
+        assert pack_controller_input(DIRECT_INPUT_IDLE_PACKET) == DIRECT_INPUT_IDLE
+
+    def test_pack_buttons_and_sticks(self):
+        packet = self.create_packet()
+        packet["A"] = True
+        packet["MINUS"] = True
+        packet["ZL"] = True
+        packet["R_STICK"]["PRESSED"] = True
+        packet["L_STICK"]["X_VALUE"] = -100
+        packet["R_STICK"]["Y_VALUE"] = 49.6
+
+        packed = pack_controller_input(packet)
+
+        assert packed & 0xFF == 0x08
+        assert (packed >> 8) & 0xFF == 0x01 | 0x04
+        assert (packed >> 16) & 0xFF == 0x80
+        assert (packed >> 24) & 0xFF == 0x9C
+        assert (packed >> 48) & 0xFF == 50
+
+    def test_unpack_round_trip(self):
+        packet = self.create_packet()
+        packet["X"] = True
+        packet["HOME"] = True
+        packet["DPAD_LEFT"] = True
+        packet["L_STICK"]["PRESSED"] = True
+        packet["L_STICK"]["Y_VALUE"] = -37
+        packet["R_STICK"]["X_VALUE"] = 100
+
+        assert unpack_controller_input(pack_controller_input(packet)) == packet
+
+    def test_direct_input_sets_protocol(self):
+        protocol = MagicMock()
+        parser = InputParser(protocol)
+        packet = self.create_packet()
+        packet["B"] = True
+        packet["L_STICK"]["Y_VALUE"] = 100
+
+        parser.set_controller_input(packet)
+        parser.set_protocol_input()
+
+        protocol.set_button_inputs.assert_called_once_with(0x04, 0, 0)
+        protocol.set_left_stick_inputs.assert_called_once_with(
+            parser.stick_ratio_to_calibrated_position(0, 1, "L_STICK"))
+        assert parser.exited_grip_order_menu
+        assert parser.controller_input == DIRECT_INPUT_IDLE
+
+    def test_idle_input_runs_macros(self):
+        protocol = MagicMock()
+        parser = InputParser(protocol)
+
+        parser.buffer_macro("X 1s", "macro_id")
+        parser.set_controller_input(self.create_packet())
+        parser.set_protocol_input()
+
+        protocol.set_button_inputs.assert_called_once_with(0x02, 0, 0)
+
+    def test_macro_finished_callback(self):
+        parser = InputParser(MagicMock())
+        finished = []
+        parser.on_macro_finished = finished.append
+
+        parser.buffer_macro("A 0.0s", "first")
+        parser.buffer_macro("B 1s", "second")
+        parser.buffer_macro("X 1s", "third")
+        parser.set_protocol_input()
+        parser.set_protocol_input()
+        parser.stop_macro("third")
+        parser.clear_macros()
+
+        assert finished == ["first", "third", "second"]
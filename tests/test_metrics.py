@@ -0,0 +1,69 @@
+import pytest
+
+from nuxbt.controller.metrics import Histogram, ControllerMetrics
+
+
+class TestHistogram:
+
+    def test_bucket_bounds_contain_values(self):
+        for value in list(range(0, 2000)) + [123456, 9999999, Histogram.MAX_VALUE]:
+            low, high = Histogram.bucket_bounds(Histogram.bucket_index(value))
+            assert low <= value <= high
+
+    def test_bucket_precision(self):
+        for value in (100, 7575, 1000000):
+            low, high = Histogram.bucket_bounds(Histogram.bucket_index(value))
+            assert (high - low) / low < 0.07
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for _ in range(99):
+            histogram.record(0.0075)
+        histogram.record(0.1)
+
+        assert histogram.count == 100
+        assert histogram.percentile(50) == pytest.approx(0.0075, rel=0.07)
+        assert histogram.percentile(99) == pytest.approx(0.0075, rel=0.07)
+        assert histogram.percentile(99.9) == pytest.approx(0.1)
+
+    def test_snapshot(self):
+        histogram = Histogram()
+        histogram.record(0.001)
+        histogram.record(0.003)
+
+        snapshot = histogram.snapshot()
+
+        assert snapshot["count"] == 2
+        assert snapshot["min"] == pytest.approx(0.001)
+        assert snapshot["max"] == pytest.approx(0.003)
+        assert snapshot["mean"] == pytest.approx(0.002)
+        assert sum(count for _, count in snapshot["buckets"]) == 2
+        assert snapshot["buckets"][-1][0] >= 0.003
+
+    def test_clamps_values(self):
+        histogram = Histogram()
+        histogram.record(-1)
+        histogram.record(1000)
+
+        assert histogram.min == 0
+        assert histogram.max == Histogram.MAX_VALUE
+
+    def test_empty_snapshot(self):
+        snapshot = Histogram().snapshot()
+
+        assert snapshot["count"] == 0
+        assert snapshot["p99"] == 0
+        assert snapshot["buckets"] == []
+
+
+def test_controller_metrics_snapshot():
+    metrics = ControllerMetrics()
+    metrics.frame_period.record(1 / 132)
+    metrics.skipped_sends += 2
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot["frame_period"]["count"] == 1
+    assert snapshot["send_latency"]["count"] == 0
+    assert snapshot["skipped_sends"] == 2
+    assert snapshot["reconnects"] == 0
@@ -7,7 +7,7 @@ if 'dbus' not in sys.modules:
     sys.modules['dbus'] = MagicMock()
 
 from nuxbt import Nuxbt, PRO_CONTROLLER
-from nuxbt.nuxbt import NuxbtCommands
+from nuxbt.nuxbt import NuxbtCommands, _ControllerManager
 
 class TestNuxbt:
     @pytest.fixture
@@ -69,7 +69,8 @@ class TestNuxbt:
             assert idx == 0
             # Retrieve item from queue to verify
             msg = nuxbt_instance.task_queue.get(timeout=1)
-            assert msg['command'] == NuxbtCommands.CREATE_CONTROLLER
+            assert msg[0] == NuxbtCommands.CREATE_CONTROLLER.value
+            assert msg[1] == 0
 
     def test_macro(self, nuxbt_instance):
         """Test inputting a macro."""
@@ -92,9 +93,7 @@ class TestNuxbt:
         # OR just use .get() since we are the consumer in this test.
         
         msg = nuxbt_instance.task_queue.get()
-        assert msg['command'] == NuxbtCommands.INPUT_MACRO
-        assert msg['arguments']['macro'] == macro_string
-        assert msg['arguments']['controller_index'] == 0
+        assert msg == (NuxbtCommands.INPUT_MACRO.value, 0, macro_string, macro_id)
 
     def test_macro_blocking(self, nuxbt_instance):
         """Test blocking macro wait."""
@@ -106,20 +105,128 @@ class TestNuxbt:
         original_put = nuxbt_instance.task_queue.put
         
         def side_effect_put(item, *args, **kwargs):
-            if item['command'] == NuxbtCommands.INPUT_MACRO:
-                macro_id_holder.append(item['arguments']['macro_id'])
             original_put(item, *args, **kwargs)
-            
-        def side_effect_sleep(*args):
-            # Simulate macro finishing
-            if macro_id_holder:
-                mid = macro_id_holder[0]
-                nuxbt_instance.manager_state[0] = {"state": "connected", "finished_macros": [mid]}
-
-        # Patch put to capture ID, patch sleep to update state
-        with patch.object(nuxbt_instance.task_queue, 'put', side_effect=side_effect_put), \
-             patch('time.sleep', side_effect=side_effect_sleep):
+            if item[0] == NuxbtCommands.INPUT_MACRO.value:
+                mid = item[3]
+                macro_id_holder.append(mid)
+                # Simulate the controller reporting the macro as finished
+                nuxbt_instance._macro_completion_queue.put(mid)
+
+        with patch.object(nuxbt_instance.task_queue, 'put', side_effect=side_effect_put):
              
             macro_string = "A 0.1s"
             result_id = nuxbt_instance.macro(0, macro_string, block=True)
             assert result_id == macro_id_holder[0]
+
+    def test_submit_macro(self, nuxbt_instance):
+        """Test that a submitted macro's future resolves on completion."""
+        nuxbt_instance.manager_state[0] = {"state": "connected", "finished_macros": []}
+
+        future = nuxbt_instance.submit_macro(0, "A 0.1s")
+        assert not future.done()
+
+        nuxbt_instance._macro_completion_queue.put(future.macro_id)
+        assert future.result(timeout=5) == future.macro_id
+        assert future.macro_id not in nuxbt_instance._macro_futures
+
+    def test_macros(self, nuxbt_instance):
+        """Test submitting a batch of macros as a single message."""
+        nuxbt_instance.manager_state[0] = {"state": "connected", "finished_macros": []}
+
+        macro_ids = nuxbt_instance.macros(0, ["A 0.1s", "B 0.1s"], block=False)
+
+        msg = nuxbt_instance.task_queue.get()
+        assert msg == (NuxbtCommands.INPUT_MACROS.value, 0,
+                       [("A 0.1s", macro_ids[0]), ("B 0.1s", macro_ids[1])])
+
+    def test_macros_blocking(self, nuxbt_instance):
+        """Test that a blocking batch waits for every macro."""
+        nuxbt_instance.manager_state[0] = {"state": "connected", "finished_macros": []}
+        futures = nuxbt_instance.submit_macros(0, ["A 0.1s", "B 0.1s"])
+
+        nuxbt_instance._macro_completion_queue.put(futures[1].macro_id)
+        assert futures[1].result(timeout=5)
+        assert not futures[0].done()
+
+        nuxbt_instance._macro_completion_queue.put(futures[0].macro_id)
+        assert futures[0].result(timeout=5)
+
+    def test_register_macro(self, nuxbt_instance):
+        """Test submitting a registered macro by its handle."""
+        nuxbt_instance.manager_state[0] = {"state": "connected", "finished_macros": []}
+
+        handle = nuxbt_instance.register_macro("jump", "A 0.1s")
+        assert nuxbt_instance.register_macro("jump", "B 0.1s") == handle
+        assert nuxbt_instance.register_macro("run", "B 1s") != handle
+        macro_ids = nuxbt_instance.macros(0, [handle, handle], block=False)
+
+        assert nuxbt_instance.task_queue.get() == (
+            NuxbtCommands.REGISTER_MACRO.value, handle, "A 0.1s")
+        assert nuxbt_instance.task_queue.get() == (
+            NuxbtCommands.REGISTER_MACRO.value, handle, "B 0.1s")
+        nuxbt_instance.task_queue.get()
+        assert nuxbt_instance.task_queue.get()[2] == [
+            (handle, macro_ids[0]), (handle, macro_ids[1])]
+        with pytest.raises(ValueError):
+            nuxbt_instance.macros(0, [99])
+
+    def test_submit_macros_unregistered_handle(self, nuxbt_instance):
+        """Test that a rejected batch doesn't leave pending futures."""
+        nuxbt_instance.manager_state[0] = {"state": "connected", "finished_macros": []}
+
+        with pytest.raises(ValueError):
+            nuxbt_instance.submit_macros(0, ["A 0.1s", "B 0.1s", 99])
+
+        assert nuxbt_instance._macro_futures == {}
+        assert nuxbt_instance.task_queue.empty()
+
+    def test_submit_macro_invalid_controller(self, nuxbt_instance):
+        """Test submitting a macro to a missing controller."""
+        with pytest.raises(ValueError):
+            nuxbt_instance.submit_macro(0, "A 0.1s")
+
+    def test_finished_macros_since(self, nuxbt_instance):
+        """Test reading finished macros from a cursor."""
+        nuxbt_instance.manager_state[0] = {
+            "state": "connected",
+            "finished_macros": ["a", "b", "c"],
+            "finished_macros_cursor": 5,
+        }
+
+        assert nuxbt_instance.finished_macros_since(0, 3) == (5, ["b", "c"])
+        assert nuxbt_instance.finished_macros_since(0, 5) == (5, [])
+        with pytest.raises(ValueError):
+            nuxbt_instance.finished_macros_since(1)
+
+    def test_metrics(self, nuxbt_instance):
+        """Test reading the controllers' published metrics."""
+        nuxbt_instance.manager_state[0] = {"state": "connected", "metrics": {"reconnects": 1}}
+        nuxbt_instance.manager_state[1] = {"state": "initializing"}
+
+        assert nuxbt_instance.metrics(0) == {"reconnects": 1}
+        assert nuxbt_instance.metrics() == {0: {"reconnects": 1}, 1: None}
+        with pytest.raises(ValueError):
+            nuxbt_instance.metrics(2)
+
+
+class TestControllerManager:
+
+    @pytest.mark.parametrize("shared_engine", [False, True])
+    def test_frame_spin_time_is_passed_to_servers(self, shared_engine):
+        """Test that the frame spin time reaches each controller server."""
+        with patch('nuxbt.nuxbt.Process'), \
+             patch('nuxbt.nuxbt.Manager'), \
+             patch('nuxbt.nuxbt.Queue'), \
+             patch('nuxbt.nuxbt.ControllerServer') as mock_server, \
+             patch('nuxbt.nuxbt.ControllerEngine'):
+
+            cm = _ControllerManager(
+                {}, MagicMock(), shared_engine=shared_engine,
+                frame_spin_time=0.002)
+            cm.create_controller(0, PRO_CONTROLLER, "/org/bluez/hci0")
+
+            if shared_engine:
+                command = cm._engine_queue.put.call_args.args[0]
+                assert command["frame_spin_time"] == 0.002
+            else:
+                assert mock_server.call_args.kwargs["frame_spin_time"] == 0.002
@@ -0,0 +1,141 @@
+from nuxbt.controller import ControllerProtocol, ControllerTypes
+from nuxbt.controller import SwitchReportParser, SwitchResponses
+
+
+def create_protocol(controller_type=ControllerTypes.PRO_CONTROLLER):
+    return ControllerProtocol(
+        controller_type, "7C:BB:8A:01:02:03",
+        colour_body=[0x11, 0x22, 0x33], colour_buttons=[0x44, 0x55, 0x66])
+
+
+class TestReport:
+
+    def test_report_is_reused(self):
+        protocol = create_protocol()
+        buffers = {id(protocol.report), id(protocol._next_report)}
+
+        for _ in range(4):
+            protocol.process_commands(None)
+            protocol.get_report()
+
+        assert {id(protocol.report), id(protocol._next_report)} == buffers
+
+    def test_report_is_cleared(self):
+        protocol = create_protocol()
+        protocol.set_button_inputs(0x08, 0x00, 0x00)
+
+        report = protocol.get_report()
+
+        assert len(report) == 50
+        assert report[4] == 0x08
+        assert protocol.report == bytes([0xA1]) + bytes(49)
+
+    def test_report_valid_until_next_call(self):
+        protocol = create_protocol()
+        protocol.set_button_inputs(0x08, 0x00, 0x00)
+
+        report = protocol.get_report()
+        protocol.set_button_inputs(0x04, 0x00, 0x00)
+
+        assert report[4] == 0x08
+        assert protocol.get_report()[4] == 0x04
+
+
+def spi_read_message(address, length):
+    subcommand = bytes([0x10]) + address.to_bytes(4, "little") + bytes([length])
+    return bytes([0xA2] + [0] * 10) + subcommand + bytes(50 - 11 - len(subcommand))
+
+
+class TestSPIRead:
+
+    def test_colours(self):
+        protocol = create_protocol()
+
+        protocol.process_commands(spi_read_message(0x6050, 0x0D))
+
+        assert protocol.report[14:16] == b"\x90\x10"
+        assert protocol.report[16:21] == bytes([0x50, 0x60, 0x00, 0x00, 0x0D])
+        assert protocol.report[21:34] == bytes(
+            [0x11, 0x22, 0x33, 0x44, 0x55, 0x66]) + b"\xFF" * 7
+
+    def test_missing_stick_calibration(self):
+        protocol = create_protocol(ControllerTypes.JOYCON_L)
+
+        protocol.process_commands(spi_read_message(0x603D, 0x19))
+
+        assert protocol.report[21:24] == bytes([0xBA, 0xF5, 0x62])
+        assert protocol.report[30:39] == b"\xFF" * 9
+        assert protocol.report[40:46] == bytes([0x11, 0x22, 0x33, 0x44, 0x55, 0x66])
+
+    def test_unknown_address(self):
+        protocol = create_protocol()
+
+        protocol.process_commands(spi_read_message(0x5000, 0x10))
+
+        assert protocol.report[21:37] == b"\xFF" * 16
+        assert protocol.report[37] == 0x00
+
+    def test_read_past_end_of_flash(self):
+        protocol = create_protocol()
+
+        protocol.process_commands(
+            spi_read_message(ControllerProtocol.SPI_FLASH_SIZE - 2, 0x1D))
+
+        assert protocol.report[21:50] == b"\xFF" * 29
+
+    def test_flash_image_is_shared(self):
+        first = create_protocol()
+        second = create_protocol()
+        other = create_protocol(ControllerTypes.JOYCON_R)
+
+        assert first.spi_flash is second.spi_flash
+        assert first.spi_flash is not other.spi_flash
+
+
+class TestSwitchReportParser:
+
+    def test_parse_subcommand(self):
+        parser = SwitchReportParser()
+        data = bytearray(spi_read_message(0x6050, 0x0D))
+
+        assert parser.parse(memoryview(data)) == SwitchResponses.SPI_READ
+        assert parser.subcommand_id == 0x10
+        assert parser.subcommand[1] == 0x50
+        assert len(parser.payload) == 11
+
+        # The message isn't copied
+        data[12] = 0x80
+        assert parser.subcommand[1] == 0x80
+
+    def test_parse_bad_messages(self):
+        parser = SwitchReportParser()
+
+        assert parser.parse(None) == SwitchResponses.NO_DATA
+        assert parser.parse(memoryview(b"")) == SwitchResponses.NO_DATA
+        assert parser.parse(b"\xA2\x10") == SwitchResponses.TOO_SHORT
+        assert parser.parse(bytes(50)) == SwitchResponses.MALFORMED
+        assert parser.subcommand_id is None
+
+        data = bytes([0xA2] + [0] * 10 + [0x99]) + bytes(38)
+        assert parser.parse(data) == SwitchResponses.UNKNOWN_SUBCOMMAND
+
+    def test_protocol_reuses_parser(self):
+        protocol = create_protocol()
+        parser = protocol._message
+
+        protocol.process_commands(spi_read_message(0x6050, 0x0D))
+        protocol.process_commands(None)
+
+        assert protocol._message is parser
+
+    def test_device_info_includes_input(self):
+        protocol = create_protocol()
+        protocol.button_status = [0x08, 0x00, 0x00]
+        data = bytes([0xA2] + [0] * 10 + [0x02]) + bytes(38)
+
+        protocol.process_commands(data)
+
+        assert protocol.device_info_queried
+        assert protocol.report[1] == 0x21
+        assert protocol.report[4] == 0x08
+        assert protocol.report[14:16] == b"\x82\x02"
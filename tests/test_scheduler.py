@@ -0,0 +1,98 @@
+import pytest
+
+from nuxbt.controller import scheduler as scheduler_module
+from nuxbt.controller.scheduler import FrameScheduler
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+        self.step = 0
+        self.sleeps = []
+
+    def perf_counter(self):
+        self.now += self.step
+        return self.now
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.now += duration
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module.time, "perf_counter", clock.perf_counter)
+    monkeypatch.setattr(scheduler_module.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_deadlines_do_not_drift(clock):
+    scheduler = FrameScheduler(frequency=100)
+    scheduler.start()
+
+    for _ in range(50):
+        scheduler.wait()
+        scheduler.next_frame()
+        # Oversleep and processing time shouldn't accumulate
+        clock.now += 0.004
+
+    assert scheduler.deadline == pytest.approx(100.0 + 50 * 0.01)
+    assert scheduler.skipped_frames == 0
+    assert all(duration == pytest.approx(0.006) for duration in clock.sleeps)
+
+
+def test_late_frame_catches_up(clock):
+    scheduler = FrameScheduler(frequency=100)
+    scheduler.start()
+    scheduler.next_frame()
+
+    clock.now += 0.015
+    scheduler.wait()
+
+    assert scheduler.next_frame() == pytest.approx(0.005)
+    assert scheduler.skipped_frames == 0
+    assert scheduler.deadline == pytest.approx(100.02)
+
+
+def test_missed_frames_are_skipped(clock):
+    scheduler = FrameScheduler(frequency=100)
+    scheduler.start()
+    scheduler.next_frame()
+
+    clock.now += 0.035
+    scheduler.wait()
+
+    assert scheduler.next_frame() == pytest.approx(0.025)
+    assert scheduler.skipped_frames == 2
+    assert scheduler.deadline == pytest.approx(100.04)
+    assert scheduler.time_until_deadline() == pytest.approx(0.005)
+
+
+def test_spin_before_deadline(clock):
+    scheduler = FrameScheduler(frequency=100, spin_time=0.002)
+    scheduler.start()
+    scheduler.next_frame()
+
+    clock.step = 0.0005
+    scheduler.wait()
+
+    assert clock.sleeps == [pytest.approx(0.0075)]
+    assert clock.now >= scheduler.deadline
+
+
+def test_snapshot(clock):
+    scheduler = FrameScheduler(frequency=100)
+    scheduler.start()
+    scheduler.next_frame()
+    clock.now += 0.014
+    scheduler.next_frame()
+
+    snapshot = scheduler.snapshot()
+
+    assert snapshot["frames"] == 2
+    assert snapshot["max_lateness"] == pytest.approx(0.004)
+    assert snapshot["mean_lateness"] == pytest.approx(0.002)
+    assert snapshot["skipped_frames"] == 0
+    assert scheduler.snapshot()["frames"] == 0
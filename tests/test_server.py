@@ -0,0 +1,259 @@
+import queue
+import selectors
+import socket
+import time
+import logging
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from nuxbt.controller import ControllerProtocol, ControllerTypes
+from nuxbt.controller.direct_input import DirectInputSlot
+from nuxbt.controller.input import InputParser
+from nuxbt.controller.metrics import ControllerMetrics
+from nuxbt.controller.server import ControllerServer, ControllerTasks
+from nuxbt.controller.scheduler import FrameScheduler
+
+
+@pytest.fixture
+def server():
+    # Skip Bluetooth initialization
+    server = ControllerServer.__new__(ControllerServer)
+    server.logger = logging.getLogger('nuxbt')
+    server.logger_level = logging.WARNING
+    server.scheduler = FrameScheduler(frequency=20)
+    server.recv_buffer = bytearray(50)
+    server.recv_view = memoryview(server.recv_buffer)
+    return server
+
+
+@pytest.fixture
+def sockets():
+    itr, switch = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    itr.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(itr, selectors.EVENT_READ)
+    yield itr, switch, selector
+    selector.close()
+    itr.close()
+    switch.close()
+
+
+def test_wait_for_frame_times_out(server, sockets):
+    itr, switch, selector = sockets
+    server.scheduler.start()
+    server.scheduler.next_frame()
+
+    reply, frame_due = server.wait_for_frame(itr, selector)
+
+    assert reply is None
+    assert frame_due
+    assert server.scheduler.time_until_deadline() <= 0
+
+
+def test_wait_for_frame_wakes_on_subcommand(server, sockets):
+    itr, switch, selector = sockets
+    server.scheduler.start()
+    server.scheduler.next_frame()
+    subcommand = bytes([0xA2] + [0] * 10 + [0x02] + [0] * 38)
+
+    switch.send(subcommand)
+    start = time.perf_counter()
+    reply, frame_due = server.wait_for_frame(itr, selector)
+
+    assert reply == subcommand
+    assert not frame_due
+    assert time.perf_counter() - start < server.scheduler.period
+
+
+def test_wait_for_frame_keeps_short_messages(server, sockets):
+    itr, switch, selector = sockets
+    server.scheduler.start()
+    server.scheduler.next_frame()
+
+    switch.send(bytes([0xA2, 0x10]))
+    reply, frame_due = server.wait_for_frame(itr, selector)
+
+    assert reply == bytes([0xA2, 0x10])
+    assert frame_due
+
+
+def test_receive_reuses_buffer(server, sockets):
+    itr, switch, selector = sockets
+
+    switch.send(b"\xA2\x10\x01")
+    first = server.receive(itr)
+    assert first == b"\xA2\x10\x01"
+    assert first.obj is server.recv_buffer
+
+    switch.send(b"\xA2\x11")
+    assert server.receive(itr) == b"\xA2\x11"
+
+    with pytest.raises(BlockingIOError):
+        server.receive(itr)
+
+
+def setup_frame_processing(server):
+    server.protocol = ControllerProtocol(
+        ControllerTypes.PRO_CONTROLLER, "7C:BB:8A:01:02:03")
+    server.input = InputParser(server.protocol)
+    server.task_queue = None
+    server.direct_input_slot = None
+    server.direct_input_sequence = 0
+    server.state = {"direct_input": None}
+    server.tick = 1
+    server.cached_msg = memoryview(bytearray(b"\xFF" * 50))[3:]
+    server.metrics = ControllerMetrics()
+
+
+def test_process_frame_metrics(server, sockets):
+    itr, switch, selector = sockets
+    setup_frame_processing(server)
+
+    for _ in range(3):
+        server.process_frame(itr, None)
+
+    assert server.metrics.processing_time.count == 3
+    assert server.metrics.send_latency.count == 1
+    assert server.metrics.skipped_sends == 2
+    assert len(switch.recv(50)) == 50
+
+
+def test_direct_input_is_coalesced(server, sockets):
+    itr, switch, selector = sockets
+    setup_frame_processing(server)
+    slot = DirectInputSlot(create=True)
+    server.direct_input_slot = slot
+
+    try:
+        slot.write(0x01)
+        server.process_frame(itr, None)
+        slot.write(0x02)
+        slot.write(0x04)
+        slot.write(0x08)
+        server.process_frame(itr, None)
+        server.process_frame(itr, None)
+
+        assert server.metrics.coalesced_inputs == 2
+        assert switch.recv(50)[4] == 0x01
+        assert switch.recv(50)[4] == 0x08
+    finally:
+        slot.close()
+        slot.unlink()
+
+
+def test_subcommand_between_frames_holds_input(server, sockets):
+    itr, switch, selector = sockets
+    setup_frame_processing(server)
+    server.task_queue = queue.Queue()
+    server.task_queue.put((ControllerTasks.MACROS.value, [("A 0.1s", "a")]))
+    server.received_at = 0
+    server.process_frame(itr, None)
+    report = switch.recv(50)
+    assert report[4] & 0x08
+
+    server.task_queue.put((ControllerTasks.CLEAR_MACROS.value,))
+    subcommand = bytes([0xA2] + [0] * 10 + [0x02] + [0] * 38)
+    server.process_frame(itr, subcommand, frame_due=False)
+    reply = switch.recv(50)
+
+    # Neither the frame nor the macro advanced
+    assert server.tick == 2
+    assert server.input.current_macro_id == "a"
+    assert not server.task_queue.empty()
+    assert reply[1] == 0x21
+    assert reply[4:13] == report[4:13]
+
+
+def test_process_frame_tasks(server, sockets):
+    itr, switch, selector = sockets
+    setup_frame_processing(server)
+    server.task_queue = queue.Queue()
+
+    server.task_queue.put((ControllerTasks.REGISTER_MACRO.value, 0, "A 1s"))
+    server.task_queue.put((ControllerTasks.MACROS.value, [(0, "a"), ("B 1s", "b"), (0, "c")]))
+    server.task_queue.put((ControllerTasks.STOP_MACRO.value, "b"))
+    server.process_frame(itr, None)
+
+    assert server.input.current_macro_id == "a"
+    assert [macro[1] for macro in server.input.macro_buffer] == ["c"]
+
+    server.task_queue.put((ControllerTasks.CLEAR_MACROS.value,))
+    server.process_frame(itr, None)
+
+    assert server.input.current_macro_id is None
+
+
+def test_connection_reset_watchdog_counts_signals(server, monkeypatch):
+    signal_bus = MagicMock()
+    device_index = SimpleNamespace(lock=threading.Lock(), devices={
+        "/dev_1": {"Alias": "Nintendo Switch"},
+        "/dev_2": {"Alias": "Nintendo Switch"},
+        "/dev_3": {"Alias": "Nintendo Switch"},
+        "/dev_4": {"Alias": "Headphones"},
+    })
+    monkeypatch.setattr(
+        'nuxbt.controller.server.get_signal_bus', lambda: signal_bus)
+    monkeypatch.setattr(
+        'nuxbt.controller.server.get_device_index', lambda: device_index)
+    server.bt = MagicMock()
+    server.bt.find_connected_devices.return_value = ["/dev_1"]
+    server.WATCHDOG_STOP_INTERVAL = 0.01
+    server._crw_running = True
+
+    watchdog = threading.Thread(target=server.connection_reset_watchdog)
+    watchdog.start()
+    while not signal_bus.add_signal_receiver.called:
+        time.sleep(0.001)
+    on_properties_changed = signal_bus.add_signal_receiver.call_args.args[0]
+
+    # An already connected Switch flaps twice, a new one only once,
+    # and an unrelated device flapping twice is ignored
+    for path, connected in [("/dev_1", False), ("/dev_2", True),
+                            ("/dev_4", True), ("/dev_4", False),
+                            ("/dev_1", True), ("/dev_1", False),
+                            ("/dev_4", True), ("/dev_4", False),
+                            ("/dev_2", False), ("/dev_3", False)]:
+        on_properties_changed(
+            "org.bluez.Device1", {"Connected": connected}, [], path=path)
+    on_properties_changed("org.bluez.Device1", {"RSSI": -40}, [], path="/dev_2")
+    time.sleep(0.05)
+    server._crw_running = False
+    watchdog.join()
+
+    server.bt.remove_device.assert_called_once_with("/dev_1")
+    server.bt.find_connected_devices.assert_called_once_with(
+        alias_filter="Nintendo Switch")
+    signal_bus.add_signal_receiver.return_value.remove.assert_called_once()
+
+
+def test_pairing_only_holds_adapter_lock(server):
+    server.lock = threading.Lock()
+    server.adapter_lock = threading.Lock()
+    server.state = {}
+    server.controller = MagicMock()
+    server.bt = MagicMock()
+    itr = MagicMock()
+    itr.getpeername.return_value = ("98:B6:E9:00:00:01", 17)
+    held = []
+
+    def setup():
+        held.append(("setup", server.lock.locked(), server.adapter_lock.locked()))
+
+    def connect():
+        held.append(("connect", server.lock.locked(), server.adapter_lock.locked()))
+        return itr, MagicMock()
+
+    server.controller.setup.side_effect = setup
+    server.connect = connect
+
+    server.connect_to_switch()
+
+    # Waiting for a Switch mustn't block other adapters from initializing
+    assert held == [("setup", True, False), ("connect", False, True)]
+    assert not server.lock.locked() and not server.adapter_lock.locked()
+    assert server.state["state"] == "connected"
+    # The property cache is only started in the controller's process
+    server.bt.enable_property_cache.assert_called_once()
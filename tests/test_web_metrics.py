@@ -0,0 +1,99 @@
+import logging
+import pytest
+from unittest.mock import MagicMock, patch
+
+from nuxbt.controller.metrics import ControllerMetrics
+from nuxbt.web import app
+from nuxbt.web.metrics import MetricsCollector
+
+
+def create_state():
+    metrics = ControllerMetrics()
+    metrics.frame_period.record(0.0076)
+    metrics.frame_period.record(0.02)
+    metrics.reconnects = 2
+    snapshot = metrics.snapshot()
+    snapshot["skipped_frames"] = 3
+    snapshot["macro_queue_depth"] = 1
+
+    return {
+        0: {"state": "connected", "finished_macros_cursor": 5, "metrics": snapshot},
+        1: {"state": "connecting", "finished_macros_cursor": 0},
+    }
+
+
+@pytest.fixture
+def nuxbt():
+    nuxbt = MagicMock()
+    nuxbt.state = create_state()
+    return nuxbt
+
+
+def test_collect(nuxbt):
+    collector = MetricsCollector()
+    collector.count_input_event(0)
+    collector.count_input_event(0)
+    collector.count_dropped_input_event(0)
+
+    collector.collect(nuxbt)
+    lines = collector.snapshot().splitlines()
+
+    assert "nuxbt_controllers 2" in lines
+    assert 'nuxbt_controller_state{controller="0",nuxbt_controller_state="connected"} 1' in lines
+    assert 'nuxbt_controller_state{controller="1",nuxbt_controller_state="connected"} 0' in lines
+    assert 'nuxbt_macros_finished_total{controller="0"} 5' in lines
+    assert 'nuxbt_macro_queue_depth{controller="0"} 1' in lines
+    assert 'nuxbt_reconnects_total{controller="0"} 2' in lines
+    assert 'nuxbt_skipped_frames_total{controller="0"} 3' in lines
+    assert 'nuxbt_input_events_total{controller="0"} 2' in lines
+    assert 'nuxbt_input_events_dropped_total{controller="0"} 1' in lines
+    assert 'nuxbt_manager_ipc_seconds_count 2' in lines
+    assert lines[-1] == "# EOF"
+
+
+def test_histogram_buckets_are_cumulative(nuxbt):
+    collector = MetricsCollector()
+
+    collector.collect(nuxbt)
+    lines = collector.snapshot().splitlines()
+
+    assert 'nuxbt_frame_period_seconds_bucket{controller="0",le="0.0075"} 0' in lines
+    assert 'nuxbt_frame_period_seconds_bucket{controller="0",le="0.008"} 1' in lines
+    assert 'nuxbt_frame_period_seconds_bucket{controller="0",le="0.025"} 2' in lines
+    assert 'nuxbt_frame_period_seconds_bucket{controller="0",le="+Inf"} 2' in lines
+    assert 'nuxbt_frame_period_seconds_count{controller="0"} 2' in lines
+    # Controllers without published metrics are skipped
+    assert not any('controller="1"' in line for line in lines
+                   if line.startswith("nuxbt_frame_period"))
+
+
+def test_endpoint_serves_snapshot(nuxbt):
+    app.app.config['TESTING'] = True
+    collector = MetricsCollector()
+    collector.collect(nuxbt)
+    nuxbt.state = {}
+
+    with patch('nuxbt.web.app.metrics_collector', collector), \
+            patch('nuxbt.web.app.nuxbt', nuxbt), \
+            app.app.test_client() as client:
+        res = client.get('/metrics')
+
+    assert res.status_code == 200
+    assert res.content_type.startswith('application/openmetrics-text')
+    assert b"nuxbt_controllers 2" in res.data
+
+
+def test_collection_failures_are_logged(nuxbt, caplog):
+    collector = MetricsCollector()
+    broken = MagicMock()
+    type(broken).state = property(lambda self: 1 / 0)
+
+    with caplog.at_level(logging.DEBUG, logger='nuxbt'):
+        collector._collect_safely(broken)
+        collector._collect_safely(broken)
+        collector._collect_safely(nuxbt)
+
+    errors = [r for r in caplog.records if r.levelno == logging.ERROR]
+    assert len(errors) == 1
+    assert errors[0].exc_info[0] is ZeroDivisionError
+    assert "nuxbt_controllers 2" in collector.snapshot()
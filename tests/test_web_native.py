@@ -0,0 +1,150 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+from nuxbt.web import app
+from nuxbt.web.input import InputSequencer
+from nuxbt.web.state import StatePublisher
+
+
+@pytest.fixture
+def nuxbt():
+    nuxbt = MagicMock()
+    nuxbt.state = {0: {"state": "connected"}}
+    nuxbt.get_switch_addresses.return_value = []
+    nuxbt.create_controller.return_value = 0
+    nuxbt.macro.return_value = "macro_id"
+    with patch('nuxbt.web.app.nuxbt', nuxbt), \
+            patch('nuxbt.web.app.state_publisher', StatePublisher()), \
+            patch('nuxbt.web.app.async_state_task', True), \
+            patch('nuxbt.web.app.input_sequencer', InputSequencer()), \
+            patch.object(app.asio, 'emit') as emit, \
+            patch.object(app.asio, 'enter_room') as enter_room:
+        nuxbt.emit = emit
+        nuxbt.enter_room = enter_room
+        yield nuxbt
+    app.USER_INFO.pop("sid", None)
+    app.state_subscribers.discard("sid")
+
+
+def test_input(nuxbt):
+    packet = {"A": True}
+
+    asyncio.run(app.async_handle_input("sid", json.dumps([0, packet])))
+
+    nuxbt.set_controller_input.assert_called_once_with(0, packet)
+    assert app.DIRECT_INPUTS.pop(0) == packet
+
+
+def test_binary_input(nuxbt):
+    # A + HOME pressed, left stick fully left, sequence number 7
+    message = bytes([0, 0x08, 0x10, 0x00, 0x9C, 0, 0, 0]) + (7).to_bytes(4, "little")
+
+    asyncio.run(app.async_handle_binary_input("sid", message))
+
+    packed = nuxbt.set_controller_input.call_args.args[1]
+    assert packed == 0x08 | 0x10 << 8 | 0x9C << 24
+    direct_input = app.read_state()[0]["direct_input"]
+    assert direct_input["A"] and direct_input["HOME"]
+    assert direct_input["L_STICK"]["X_VALUE"] == -100
+    del app.DIRECT_INPUTS[0]
+
+
+def test_stale_binary_input_is_dropped(nuxbt):
+    def message(x_value, sequence):
+        return bytes([0, 0, 0, 0, x_value, 0, 0, 0]) + sequence.to_bytes(4, "little")
+
+    asyncio.run(app.async_handle_binary_input("sid", message(10, 5)))
+    asyncio.run(app.async_handle_binary_input("sid", message(20, 4)))
+    asyncio.run(app.async_handle_binary_input("sid", message(30, 5)))
+    # Sequences are tracked per client
+    asyncio.run(app.async_handle_binary_input("other", message(40, 1)))
+
+    applied = [call.args[1] >> 24 for call in nuxbt.set_controller_input.call_args_list]
+    assert applied == [10, 40]
+    del app.DIRECT_INPUTS[0]
+
+
+def test_bad_binary_input_is_ignored(nuxbt):
+    asyncio.run(app.async_handle_binary_input("sid", bytes(5)))
+
+    nuxbt.set_controller_input.assert_not_called()
+
+
+def test_create_controller(nuxbt):
+    asyncio.run(app.async_on_connect("sid", {}))
+    asyncio.run(app.async_on_create_controller("sid"))
+
+    assert app.USER_INFO["sid"]["controller_index"] == 0
+    nuxbt.emit.assert_called_once_with('create_pro_controller', 0, to="sid")
+
+    asyncio.run(app.async_on_disconnect("sid"))
+    nuxbt.remove_controller.assert_called_once_with(0)
+
+
+def test_macro(nuxbt):
+    macro_id = asyncio.run(app.async_handle_macro("sid", json.dumps([0, "A 0.1s"])))
+
+    assert macro_id == "macro_id"
+    nuxbt.macro.assert_called_once_with(0, "A 0.1s", block=False)
+
+
+def test_subscribe_state(nuxbt):
+    asyncio.run(app.async_on_subscribe_state("sid"))
+
+    nuxbt.enter_room.assert_called_once_with("sid", app.STATE_ROOM)
+    assert nuxbt.emit.call_args.args == (
+        'state_snapshot', {"version": 1, "state": {0: {"state": "connected"}}})
+    assert "sid" in app.state_subscribers
+
+
+def test_flask_routes_are_mounted():
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/metrics",
+        "raw_path": b"/metrics", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000),
+    }
+    with patch('nuxbt.web.app.nuxbt', None):
+        asyncio.run(app.native_asgi(scope, receive, send))
+
+    assert messages[0]["status"] == 200
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    assert body.endswith(b"# EOF\n")
+
+
+class TestInputSequencer:
+
+    def test_accepts_newer_sequences(self):
+        sequencer = InputSequencer()
+
+        assert sequencer.accept("sid", 0, 1)
+        assert sequencer.accept("sid", 0, 3)
+        assert not sequencer.accept("sid", 0, 2)
+        assert not sequencer.accept("sid", 0, 3)
+        assert sequencer.accept("sid", 1, 2)
+
+    def test_sequences_wrap_around(self):
+        sequencer = InputSequencer()
+
+        assert sequencer.accept("sid", 0, 0xFFFFFFFF)
+        assert sequencer.accept("sid", 0, 0)
+        assert not sequencer.accept("sid", 0, 0xFFFFFFFE)
+
+    def test_forget(self):
+        sequencer = InputSequencer()
+        sequencer.accept("sid", 0, 10)
+
+        sequencer.forget("sid")
+
+        assert sequencer.accept("sid", 0, 1)
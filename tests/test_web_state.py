@@ -0,0 +1,133 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+from nuxbt.web import app
+from nuxbt.web.state import StatePublisher
+
+
+class TestStatePublisher:
+
+    def test_first_update_contains_everything(self):
+        publisher = StatePublisher()
+
+        diff = publisher.update({0: {"state": "connecting", "errors": False}})
+
+        assert diff == {
+            "version": 1,
+            "changed": {0: {"state": "connecting", "errors": False}},
+            "removed": [],
+        }
+
+    def test_unchanged_state_publishes_nothing(self):
+        publisher = StatePublisher()
+        publisher.update({0: {"state": "connecting"}})
+
+        assert publisher.update({0: {"state": "connecting"}}) is None
+        assert publisher.version == 1
+
+    def test_diff_contains_changed_keys(self):
+        publisher = StatePublisher()
+        publisher.update({0: {"state": "connecting", "finished_macros": []}})
+
+        diff = publisher.update(
+            {0: {"state": "connected", "finished_macros": []}})
+
+        assert diff["version"] == 2
+        assert diff["changed"] == {0: {"state": "connected"}}
+
+    def test_removed_controllers(self):
+        publisher = StatePublisher()
+        publisher.update({0: {"state": "connected"}, 1: {"state": "connected"}})
+
+        diff = publisher.update({1: {"state": "connected"}})
+
+        assert diff["changed"] == {}
+        assert diff["removed"] == [0]
+        assert publisher.snapshot()["state"] == {1: {"state": "connected"}}
+
+    def test_metrics_are_excluded(self):
+        publisher = StatePublisher()
+        publisher.update({0: {"state": "connected", "metrics": {"reconnects": 0}}})
+
+        assert publisher.update(
+            {0: {"state": "connected", "metrics": {"reconnects": 1}}}) is None
+        assert "metrics" not in publisher.snapshot()["state"][0]
+
+
+@pytest.fixture
+def client():
+    nuxbt = MagicMock()
+    nuxbt.state = {0: {"state": "connecting"}}
+    with patch('nuxbt.web.app.nuxbt', nuxbt), \
+            patch('nuxbt.web.app.state_publisher', StatePublisher()), \
+            patch('nuxbt.web.app.state_task', True):
+        client = app.sio.test_client(app.app)
+        yield client, nuxbt
+        client.disconnect()
+
+
+def test_subscribe_and_receive_diffs(client):
+    client, nuxbt = client
+
+    client.emit('subscribe_state')
+    received = client.get_received()
+    assert received[-1]["name"] == 'state_snapshot'
+    snapshot = received[-1]["args"][0]
+    assert snapshot["version"] == 1
+    assert snapshot["state"] == {"0": {"state": "connecting"}}
+
+    nuxbt.state[0] = {"state": "connected"}
+    app.publish_state()
+    app.publish_state()
+    received = client.get_received()
+
+    assert len(received) == 1
+    assert received[0]["name"] == 'state_diff'
+    assert received[0]["args"][0] == {
+        "version": 2, "changed": {"0": {"state": "connected"}}, "removed": []}
+
+
+@pytest.fixture
+def state_events():
+    with patch('nuxbt.web.app.state_subscribed', threading.Event()), \
+            patch('nuxbt.web.app.state_changed', threading.Event()), \
+            patch('nuxbt.web.app.state_subscribers', set()):
+        yield
+
+
+def test_publisher_sleeps_without_subscribers(state_events):
+    waiter = threading.Thread(target=app.wait_for_state_change)
+    waiter.start()
+
+    app.notify_state_change()
+    waiter.join(0.05)
+    assert waiter.is_alive()
+
+    app.add_state_subscriber("sid")
+    waiter.join(1)
+    assert not waiter.is_alive()
+
+    app.remove_user("sid")
+    assert not app.state_subscribed.is_set()
+
+
+def test_changes_wake_publisher(state_events):
+    app.add_state_subscriber("sid")
+    app.notify_state_change()
+
+    start = time.perf_counter()
+    app.wait_for_state_change()
+
+    assert time.perf_counter() - start < app.STATE_POLL_INTERVAL
+    assert not app.state_changed.is_set()
+    app.remove_user("sid")
+
+
+def test_input_notifies_change(state_events):
+    with patch('nuxbt.web.app.nuxbt', MagicMock()):
+        app.apply_input('[0, {"A": true}]')
+
+    assert app.state_changed.is_set()
+    del app.DIRECT_INPUTS[0]